@@ -12,12 +12,18 @@ django.setup()
 # Импортируем после django.setup()
 from llm.middleware import JWTAuthMiddleware
 import llm.routing
+import posts.routing
 
 application = ProtocolTypeRouter(
     {
         "http": get_asgi_application(),
         "websocket": JWTAuthMiddleware(
-            AuthMiddlewareStack(URLRouter(llm.routing.websocket_urlpatterns))
+            AuthMiddlewareStack(
+                URLRouter(
+                    llm.routing.websocket_urlpatterns
+                    + posts.routing.websocket_urlpatterns
+                )
+            )
         ),
     }
 )
@@ -0,0 +1,61 @@
+"""
+Учет сообщений, отброшенных channel layer'ом из-за переполненных каналов.
+
+group_send штатных слоев не бросает ChannelFull: InMemoryChannelLayer
+глотает его внутри, channels_redis проверяет емкость в Lua-скрипте и только
+пишет в лог «N of M channels over capacity in group G». Поэтому потери
+считаются на уровне слоя:
+  - InMemoryChannelLayer — перед рассылкой по длине очередей участников
+    группы (слой однопоточный, проверка и отправка идут в одном шаге loop'а);
+  - channels_redis — обработчиком его INFO-записи (подключен в LOGGING).
+
+Счетчик общий для процессов через кеш: dropped_message_count().
+"""
+import logging
+
+from channels import layers
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DROPPED_KEY = "realtime:dropped-messages"
+# Формат записи channels_redis.core о переполненных каналах группы
+REDIS_OVER_CAPACITY_MESSAGE = "%s of %s channels over capacity in group %s"
+
+
+def record_dropped(count):
+    cache.add(DROPPED_KEY, 0, None)
+    try:
+        cache.incr(DROPPED_KEY, count)
+    except ValueError:  # Ключ вытеснен между add и incr
+        cache.set(DROPPED_KEY, count, None)
+
+
+def dropped_message_count():
+    return cache.get(DROPPED_KEY, 0)
+
+
+class InMemoryChannelLayer(layers.InMemoryChannelLayer):
+    async def group_send(self, group, message):
+        full = [
+            channel
+            for channel in self.groups.get(group, {})
+            if channel in self.channels
+            and self.channels[channel].qsize() >= self.get_capacity(channel)
+        ]
+        if full:
+            logger.warning(f"{len(full)} channels over capacity in group {group}")
+            record_dropped(len(full))
+        await super().group_send(group, message)
+
+
+class DroppedMessagesHandler(logging.Handler):
+    """Считает потери по записям channels_redis о переполненных каналах."""
+
+    def emit(self, record):
+        if record.msg != REDIS_OVER_CAPACITY_MESSAGE:
+            return
+        try:
+            record_dropped(int(float(record.args[0])))
+        except (TypeError, ValueError, IndexError):
+            self.handleError(record)
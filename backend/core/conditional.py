@@ -0,0 +1,128 @@
+"""
+HTTP conditional GET (ETag / Last-Modified) для read-эндпоинтов.
+
+Валидаторы считаются без сериализации тела: из пары колонок (updated_at,
+счетчики) и «версий» коллекций в кеше. Версия — это время последнего
+изменения в наносекундах, ее поднимают сигналы (bump_versions) после
+коммита. Если кеш потерял ключ, версия просто становится «сейчас» — это
+лишний 200, но никогда не ложный 304.
+
+Обещание держится, только если версии общие для всех процессов: изменения
+приходят и из Celery, и из других web-воркеров. С кешем в локальной памяти
+(без CACHE_REDIS_URL) conditional GET выключен (CONDITIONAL_GET_ENABLED).
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+VERSION_KEY_PREFIX = "version:"
+
+
+def get_versions(*names):
+    """{name: версия} для коллекций; недостающие версии инициализируются."""
+    keys = {f"{VERSION_KEY_PREFIX}{name}": name for name in names}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: found.get(key, missing.get(key)) for key in keys}
+
+
+def store_versions(names):
+    now = time.time_ns()
+    cache.set_many({f"{VERSION_KEY_PREFIX}{name}": now for name in names}, None)
+
+
+def bump_versions(*names):
+    """
+    Поднимает версии после коммита текущей транзакции (вне транзакции —
+    сразу). До коммита читатель успел бы закешировать старое состояние под
+    уже новой версией.
+    """
+    transaction.on_commit(partial(store_versions, names))
+
+
+def version_to_datetime(version):
+    return datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
+
+
+def make_etag(*parts):
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Для GET/HEAD считает get_validators() сразу после аутентификации и
+    проверки прав и, если клиент прислал совпадающие If-None-Match /
+    If-Modified-Since, отвечает 304 до queryset'ов и сериализаторов. Иначе проставляет заголовки на обычный ответ.
+
+    `conditional_actions` ограничивает действия ViewSet'а (None — все GET).
+    get_validators() возвращает (etag, last_modified); любой из них может
+    быть None, если его нельзя дешево посчитать.
+    """
+
+    conditional_actions = None
+
+    def get_validators(self, request):
+        return None, None
+
+    def uses_conditional_get(self, request):
+        if not settings.CONDITIONAL_GET_ENABLED or request.method not in ("GET", "HEAD"):
+            return False
+        action = getattr(self, "action", None)
+        return self.conditional_actions is None or action in self.conditional_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_validators = None
+        if not self.uses_conditional_get(request):
+            return
+
+        etag, last_modified = self.get_validators(request)
+        etag = quote_etag(etag) if etag else None
+        if etag is None and last_modified is None:
+            return
+        self.conditional_validators = (etag, last_modified)
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is not None:
+            self.apply_validators(response)
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def apply_validators(self, response):
+        etag, last_modified = self.conditional_validators
+        if etag:
+            response.headers.setdefault("ETag", etag)
+        if last_modified:
+            response.headers.setdefault("Last-Modified", http_date(last_modified.timestamp()))
+        # Ответы зависят от пользователя: кешировать только на клиенте и всегда ревалидировать
+        patch_cache_control(response, private=True, no_cache=True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "conditional_validators", None) and response.status_code == 200:
+            self.apply_validators(response)
+        return response
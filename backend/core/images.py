@@ -0,0 +1,167 @@
+"""
+Фоновая обработка загруженных картинок (посты, аватары).
+
+Запрос только сохраняет оригинал и ставит статус PROCESSING; ресайз и
+перекодирование (imagekit ImageSpec) делает Celery-задача. Готовый файл
+подменяется условным UPDATE ... WHERE <поле> = <оригинал>: если пока шла
+обработка пользователь загрузил новую картинку, результат просто
+выбрасывается, и ответ API никогда не ссылается на полуготовый файл.
+
+Уменьшенные копии (renditions: несколько ширин в JPEG и WebP) генерируются
+той же задачей из обработанного файла до подмены, поэтому к моменту статуса
+READY они уже лежат в storage. Их имена детерминированы (imagekit считает
+хеш от исходного имени и параметров спеки), и URL строится без обращения
+к storage.
+"""
+import logging
+import os
+
+from django.core.files import File
+from django.db import models
+from django.utils.module_loading import import_string
+from imagekit import ImageSpec, register
+from imagekit.cachefiles import ImageCacheFile
+from imagekit.processors import ResizeToFit
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStatus(models.TextChoices):
+    NONE = "none", "Нет изображения"
+    PROCESSING = "processing", "Обрабатывается"
+    READY = "ready", "Готово"
+    FAILED = "failed", "Ошибка обработки"
+
+
+class RenditionSpec(ImageSpec):
+    """
+    Уменьшенная копия уже обработанного изображения. Optimistic-стратегия:
+    файл создается задачей заранее, а при обращении к URL его наличие
+    не проверяется.
+    """
+
+    width = None
+    format = "JPEG"
+    options = {"quality": 80}
+    cachefile_strategy = "imagekit.cachefiles.strategies.Optimistic"
+
+    @property
+    def processors(self):
+        return [ResizeToFit(width=self.width, height=self.width, upscale=False)]
+
+
+class RenditionSet:
+    """
+    Набор renditions одного поля: `widths` для каждого формата. Полный размер
+    в JPEG — это сам обработанный файл (`full_width`), его не дублируем.
+    Спеки регистрируются в imagekit как "<prefix>:<width>_<format>".
+    """
+
+    formats = ("JPEG", "WEBP")
+
+    def __init__(self, prefix, widths, full_width):
+        self.full_width = full_width
+        self.specs = {}
+        for image_format in self.formats:
+            widths_for_format = list(widths)
+            if image_format != "JPEG":
+                widths_for_format.append(full_width)
+            for width in widths_for_format:
+                spec = type(
+                    f"Rendition{width}{image_format.title()}",
+                    (RenditionSpec,),
+                    {"width": width, "format": image_format},
+                )
+                register.generator(f"{prefix}:{width}_{image_format.lower()}", spec)
+                self.specs[(image_format, width)] = spec
+
+    def generate(self, source):
+        for spec in self.specs.values():
+            ImageCacheFile(spec(source=source)).generate()
+
+    def names(self, source):
+        return [ImageCacheFile(spec(source=source)).name for spec in self.specs.values()]
+
+    def urls(self, source, build_url=None):
+        """
+        {"jpeg": {"160w": url, ...}, "webp": {...}} — готово для srcset.
+        `build_url` превращает относительный URL в абсолютный.
+        """
+        build_url = build_url or (lambda url: url)
+        entries = [("JPEG", self.full_width, source.url)] + [
+            (image_format, width, ImageCacheFile(spec(source=source)).url)
+            for (image_format, width), spec in self.specs.items()
+        ]
+        result = {image_format.lower(): {} for image_format in self.formats}
+        for image_format, width, url in sorted(entries, key=lambda entry: entry[1]):
+            result[image_format.lower()][f"{width}w"] = build_url(url)
+        return result
+
+
+def mark_image_upload(instance, field_name, status_field):
+    """
+    Вызывается из pre_save. Возвращает True, если в поле новый файл (еще не
+    сохраненный в storage или прикрепленный через core.uploads) — тогда
+    после коммита нужна обработка.
+    """
+    file = getattr(instance, field_name)
+    direct_uploads = getattr(instance, "_direct_upload_fields", set())
+    if not file:
+        setattr(instance, status_field, ImageStatus.NONE)
+        return False
+    # Ключ из прямой загрузки (core.uploads) — файл уже в storage, но тоже новый
+    if not file._committed or field_name in direct_uploads:
+        direct_uploads.discard(field_name)
+        setattr(instance, status_field, ImageStatus.PROCESSING)
+        return True
+    return False
+
+
+def processed_name(source_name, spec):
+    root, _ = os.path.splitext(source_name)
+    extension = "webp" if (spec.format or "").upper() == "WEBP" else "jpg"
+    return f"{root}_processed.{extension}"
+
+
+def process_image(
+    model, pk, field_name, status_field, spec_path, renditions=None, extra_updates=None
+):
+    """
+    Обрабатывает `field_name` объекта спекой `spec_path`, генерирует
+    `renditions` (RenditionSet) и атомарно подменяет файл. Возвращает True,
+    если подмена состоялась. `extra_updates` — дополнительные поля для того
+    же UPDATE.
+    """
+    instance = model.objects.filter(pk=pk).only("pk", field_name).first()
+    if instance is None:
+        return False
+    source = getattr(instance, field_name)
+    source_name = source.name
+    if not source_name:
+        return False
+
+    try:
+        spec = import_string(spec_path)(source=source)
+        content = spec.generate()
+        new_name = source.storage.save(processed_name(source_name, spec), content)
+        if renditions is not None:
+            # Имя как у будущего FieldFile: от него зависят имена renditions
+            with source.storage.open(new_name) as processed:
+                renditions.generate(File(processed, name=new_name))
+    except Exception as e:
+        logger.error(f"Image processing failed for {model.__name__} {pk}: {e}", exc_info=True)
+        model.objects.filter(pk=pk, **{field_name: source_name}).update(
+            **{status_field: ImageStatus.FAILED}
+        )
+        return False
+
+    swapped = model.objects.filter(pk=pk, **{field_name: source_name}).update(
+        **{field_name: new_name, status_field: ImageStatus.READY},
+        **(extra_updates or {}),
+    )
+    # Удаляем файлы, на которые больше никто не ссылается
+    source.storage.delete(source_name if swapped else new_name)
+    if not swapped and renditions is not None:
+        for name in renditions.names(File(None, name=new_name)):
+            source.storage.delete(name)
+    return bool(swapped)
@@ -0,0 +1,31 @@
+class MembershipLoader:
+    """
+    Per-request батч-загрузчик для проверок вида «объект входит в множество
+    пользователя» (лайкнул пост, подписан на автора и т.п.).
+
+    prime() догружает еще не проверенные ключи одним вызовом `fetch(keys)`,
+    contains() отвечает из памяти, а для неизвестного ключа догружает его сам.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.checked = set()
+        self.members = set()
+
+    def prime(self, keys):
+        missing = set(keys) - self.checked
+        if missing:
+            self.members |= set(self.fetch(missing))
+            self.checked |= missing
+
+    def contains(self, key):
+        self.prime([key])
+        return key in self.members
+
+
+def get_context_loader(context, name, factory):
+    """Один загрузчик на контекст сериализатора (т.е. на запрос)."""
+    loader = context.get(name)
+    if loader is None:
+        loader = context[name] = factory()
+    return loader
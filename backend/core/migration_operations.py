@@ -0,0 +1,29 @@
+"""
+Операции миграций, которые выполняются только на PostgreSQL.
+
+Состояние моделей (state_forwards) обновляется на любой СУБД, поэтому
+makemigrations остается консистентным, а тесты на SQLite просто пропускают
+GIN-индексы, расширения и прочий PostgreSQL-специфичный SQL.
+"""
+from django.db import migrations
+
+
+class PostgreSQLOnlyMixin:
+    def _is_postgresql(self, schema_editor):
+        return schema_editor.connection.vendor == "postgresql"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self._is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self._is_postgresql(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class AddPostgresIndex(PostgreSQLOnlyMixin, migrations.AddIndex):
+    pass
+
+
+class RunPostgresSQL(PostgreSQLOnlyMixin, migrations.RunSQL):
+    pass
@@ -0,0 +1,174 @@
+import base64
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def keyset_condition(field, position, pk, pk_field="pk"):
+    """
+    Условие «строго после курсора» при сортировке (field, pk) по убыванию.
+    Конъюнкт `field <= position` ограничивает диапазон индекса сверху; одно
+    OR планировщик в диапазон не превращает и сканирует все строки до курсора.
+    """
+    return Q(**{f"{field}__lte": position}) & (
+        Q(**{f"{field}__lt": position}) | Q(**{field: position, f"{pk_field}__lt": pk})
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация по (created_at, id): следующая страница выбирается условием
+    `(created_at, id) < (cursor)` по составному индексу, без COUNT(*) и OFFSET,
+    поэтому 200-я страница стоит столько же, сколько первая.
+
+    Поле сортировки берется из `view.keyset_field` (по умолчанию created_at);
+    поддерживаются поля даты/времени и числовые (например, trending_score).
+
+    Порядок всегда «новые первыми» по этому полю. Queryset, уже
+    отсортированный иначе (?ordering=, ранг полнотекстового поиска), отклоняется
+    с 400, а не пересортировывается молча: для такого порядка есть только
+    постраничная пагинация.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    unsupported_ordering_message = (
+        "Cursor pagination supports only the default newest-first ordering; "
+        "remove ordering/search parameters or use page pagination."
+    )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, value, pk):
+        value = value.isoformat() if hasattr(value, "isoformat") else repr(value)
+        raw = f"{value}|{pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request, model_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode()).decode()
+            value, pk = raw.rsplit("|", 1)
+            if isinstance(model_field, models.DateTimeField):
+                position = parse_datetime(value)
+            else:
+                position = model_field.to_python(value)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.field = getattr(view, "keyset_field", "created_at")
+        self.page_size = self.get_page_size(request)
+
+        ordering = queryset.query.order_by
+        if ordering and ordering[0] != f"-{self.field}":
+            raise serializers.ValidationError({"cursor": self.unsupported_ordering_message})
+        queryset = queryset.order_by(f"-{self.field}", "-pk")
+        model_field = queryset.model._meta.get_field(self.field)
+        cursor = self.decode_cursor(request, model_field)
+        if cursor is not None:
+            queryset = queryset.filter(keyset_condition(self.field, *cursor))
+
+        # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if self.page:
+            self.last_position = getattr(self.page[-1], self.field), self.page[-1].pk
+        return self.page
+
+    def paginate_positions(self, read_page, queryset, request, view=None):
+        """
+        Страница из уже упорядоченного источника (например, материализованной
+        ленты): read_page(limit, before) возвращает [(created_at, pk)] от новых
+        к старым строго после `before`. Из queryset'а объекты достаются только
+        по первичному ключу; удаленные к этому моменту просто пропускаются.
+        """
+        self.request = request
+        self.field = getattr(view, "keyset_field", "created_at")
+        self.page_size = self.get_page_size(request)
+        model_field = queryset.model._meta.get_field(self.field)
+        positions = read_page(self.page_size + 1, self.decode_cursor(request, model_field))
+        self.has_next = len(positions) > self.page_size
+        positions = positions[: self.page_size]
+        objects = queryset.in_bulk([pk for _, pk in positions])
+        self.page = [objects[pk] for _, pk in positions if pk in objects]
+        if positions:
+            # Курсор — с последней позиции источника, даже если ее объект удален
+            position, pk = positions[-1]
+            if pk in objects:
+                position = getattr(objects[pk], self.field)
+            self.last_position = position, pk
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(*self.last_position)
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, "page")
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """
+    Постраничная пагинация по умолчанию; keyset-пагинация включается клиентом
+    через `?pagination=cursor` (или при наличии `?cursor=`).
+    """
+
+    mode_query_param = "pagination"
+    keyset_class = KeysetPagination
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
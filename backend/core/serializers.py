@@ -0,0 +1,96 @@
+from django.utils.module_loading import import_string
+
+FIELDS_QUERY_PARAM = "fields"
+EXPAND_QUERY_PARAM = "expand"
+
+
+def _parse_list_param(request, name):
+    if request is None:
+        return None
+    raw = request.query_params.get(name)
+    if raw is None:
+        return None
+    return {item.strip() for item in raw.split(",") if item.strip()}
+
+
+def requested_fields(request):
+    """
+    Разбирает `?fields=id,content,author.username` в множество путей.
+    None — параметр не передан, ограничений нет.
+    """
+    return _parse_list_param(request, FIELDS_QUERY_PARAM)
+
+
+def requested_expansions(request):
+    return _parse_list_param(request, EXPAND_QUERY_PARAM) or set()
+
+
+def _names_at(requested, path):
+    """Имена полей, запрошенные непосредственно на уровне `path`."""
+    prefix = f"{path}." if path else ""
+    return {
+        item[len(prefix):].split(".")[0]
+        for item in requested
+        if item.startswith(prefix) and len(item) > len(prefix)
+    }
+
+
+def is_field_requested(request, path):
+    """
+    Нужен ли клиенту вложенный путь (например, "author.profile").
+    Если на каком-то уровне поля не перечислены, уровень отдается целиком.
+    Позволяет view не делать JOIN/аннотации для того, что не попадет в ответ.
+    """
+    requested = requested_fields(request)
+    if requested is None:
+        return True
+    parts = path.split(".")
+    for depth, name in enumerate(parts):
+        names = _names_at(requested, ".".join(parts[:depth]))
+        if names and name not in names:
+            return False
+    return True
+
+
+class DynamicFieldsMixin:
+    """
+    Поддержка sparse fieldsets и разворачиваемых связей:
+      ?fields=id,content,author.id,author.username — только перечисленные поля
+      (вложенные сериализаторы ограничиваются через точку);
+      ?expand=post — подставляет сериализатор из `expandable_fields` вместо id.
+
+    `expandable_fields = {"post": ("posts.serializers.PostSerializer", {})}` —
+    путь импорта задается строкой, чтобы не было циклических импортов.
+    """
+
+    expandable_fields = {}
+
+    def get_field_path(self):
+        parts = []
+        node = self
+        while node is not None:
+            if node.field_name:
+                parts.append(node.field_name)
+            node = node.parent
+        return ".".join(reversed(parts))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None:
+            return fields
+
+        path = self.get_field_path()
+        prefix = f"{path}." if path else ""
+        expand = requested_expansions(request)
+        for name, (serializer_path, kwargs) in self.expandable_fields.items():
+            if f"{prefix}{name}" in expand:
+                fields[name] = import_string(serializer_path)(read_only=True, **kwargs)
+
+        requested = requested_fields(request)
+        if requested is not None:
+            names = _names_at(requested, path)
+            if names:
+                for name in set(fields) - names:
+                    fields.pop(name)
+        return fields
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "drf_yasg",
     "channels",
@@ -119,7 +120,47 @@ AUTH_PASSWORD_VALIDATORS = [
 
 ASGI_APPLICATION = "core.asgi.application"
 
-CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+# --- Channel layer (WebSocket) ---
+# Группы должны быть общими для всех воркеров uvicorn и для celery (он
+# отправляет события постов), поэтому в проде — Redis. Несколько URL через
+# запятую — шардирование: channels_redis распределяет каналы и группы по
+# инстансам по хешу имени, воркеры добавляются без изменения конфигурации.
+# Без URL — InMemoryChannelLayer, он работает только внутри одного процесса
+# (разработка и тесты).
+CHANNEL_REDIS_URLS = [
+    url.strip()
+    for url in os.environ.get("CHANNEL_REDIS_URLS", "").split(",")
+    if url.strip()
+]
+# Сообщений в очереди одного канала; сверх этого сообщения отбрасываются
+# (backpressure: медленный клиент не раздувает память Redis)
+CHANNEL_LAYER_CAPACITY = int(os.environ.get("CHANNEL_LAYER_CAPACITY", 100))
+CHANNEL_LAYER_EXPIRY = int(os.environ.get("CHANNEL_LAYER_EXPIRY", 60))  # секунд
+if CHANNEL_REDIS_URLS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": CHANNEL_REDIS_URLS,
+                "prefix": "dare",
+                "capacity": CHANNEL_LAYER_CAPACITY,
+                "expiry": CHANNEL_LAYER_EXPIRY,
+                "group_expiry": 24 * 60 * 60,
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            # Тот же слой, но с подсчетом отброшенных сообщений (core.channel_layers)
+            "BACKEND": "core.channel_layers.InMemoryChannelLayer",
+            "CONFIG": {
+                "capacity": CHANNEL_LAYER_CAPACITY,
+                "expiry": CHANNEL_LAYER_EXPIRY,
+            },
+        }
+    }
+REALTIME_COALESCE_SECONDS = 2  # Окно склейки событий поста для WebSocket (posts.realtime)
 
 LANGUAGE_CODE = "en-us"
 
@@ -211,6 +252,122 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'generate_daily_user_activity',
         'schedule': crontab(minute=0, hour=1),  # Каждый день в 1:00 ночи
     },
+    'recalculate-trending-scores': {
+        'task': 'recalculate_trending_scores',
+        'schedule': crontab(minute='*/5'),  # Каждые 5 минут
+    },
+    'trim-timelines-daily': {
+        'task': 'trim_timelines',
+        'schedule': crontab(minute=0, hour=4),  # Каждый день в 4:00 ночи
+    },
+    'recalculate-post-counters-daily': {
+        'task': 'recalculate_post_counters',
+        'schedule': crontab(minute=30, hour=3),  # Каждый день в 3:30 ночи
+    },
+    'build-trainer-recommendations-daily': {
+        'task': 'build_trainer_recommendations',
+        'schedule': crontab(minute=0, hour=2),  # Каждый день в 2:00 ночи
+    },
+    'recalculate-follow-counts-daily': {
+        'task': 'recalculate_follow_counts',
+        'schedule': crontab(minute=45, hour=3),  # Каждый день в 3:45 ночи
+    },
+    'cleanup-direct-uploads-daily': {
+        'task': 'cleanup_direct_uploads',
+        'schedule': crontab(minute=15, hour=4),  # Каждый день в 4:15 ночи
+    },
 }
 
-ASSISTANT_ID = os.environ.get("ASSISTANT_ID")
\ No newline at end of file
+ASSISTANT_ID = os.environ.get("ASSISTANT_ID")
+
+# --- Лента подписок (posts.timeline) ---
+TIMELINE_BACKEND = os.environ.get(
+    "TIMELINE_BACKEND", "posts.timeline.DatabaseTimelineBackend"
+)
+TIMELINE_REDIS_URL = os.environ.get("TIMELINE_REDIS_URL", "redis://redis:6379/1")
+TIMELINE_MAX_LENGTH = 800  # Сколько последних постов хранится в ленте пользователя
+TIMELINE_BACKFILL_LIMIT = 50  # Сколько постов автора добавляется при подписке
+TIMELINE_FANOUT_THRESHOLD = 10000  # С этого числа подписчиков — fan-out-on-read
+# --- Буфер лайков (interactions.like_buffer) ---
+# Пусто — лайки пишутся в БД сразу. RedisLikeBuffer включает буферизацию
+# (например, на время запуска поста популярного тренера).
+LIKE_BUFFER_BACKEND = os.environ.get("LIKE_BUFFER_BACKEND", "")
+LIKE_BUFFER_REDIS_URL = os.environ.get("LIKE_BUFFER_REDIS_URL", "redis://redis:6379/4")
+LIKE_BUFFER_FLUSH_SECONDS = 5  # Как часто буфер переносится в БД
+LIKE_BUFFER_BATCH_SIZE = 500  # Постов в одной пачке записи
+if LIKE_BUFFER_BACKEND:
+    CELERY_BEAT_SCHEDULE['flush-like-buffer'] = {
+        'task': 'flush_like_buffer',
+        'schedule': LIKE_BUFFER_FLUSH_SECONDS,
+    }
+# --- Лайкнутые посты пользователя (interactions.likes) ---
+# Пусто — is_liked_by_user проверяется запросом к таблице лайков на пачку
+LIKED_POSTS_BACKEND = os.environ.get("LIKED_POSTS_BACKEND", "")
+LIKED_POSTS_REDIS_URL = os.environ.get("LIKED_POSTS_REDIS_URL", "redis://redis:6379/5")
+LIKED_POSTS_TTL = 24 * 60 * 60  # Множество живет сутки с последнего чтения
+LIKED_POSTS_MAX_WARM = 10000  # Больше лайков — проверка запросом, без кеша
+# --- Граф подписок (interactions.follow_graph) ---
+# CacheFollowGraph хранит множества в кеше Django (см. CACHES ниже),
+# RedisFollowGraph — в отдельных Redis set'ах
+FOLLOW_GRAPH_BACKEND = os.environ.get(
+    "FOLLOW_GRAPH_BACKEND", "interactions.follow_graph.CacheFollowGraph"
+)
+FOLLOW_GRAPH_REDIS_URL = os.environ.get("FOLLOW_GRAPH_REDIS_URL", "redis://redis:6379/6")
+FOLLOW_GRAPH_TTL = 24 * 60 * 60  # Время жизни заполненного множества
+# --- Счетчики подписчиков (users.counters) ---
+FOLLOWERS_COUNTER_SHARDS = 16  # Строк-шардов счетчика у популярного тренера
+FOLLOWERS_COUNTER_SHARD_THRESHOLD = 10000  # С этого числа подписчиков — шарды
+# --- Рекомендации тренеров (users.recommendations) ---
+RECOMMENDATIONS_PER_USER = 20  # Сколько тренеров хранится для пользователя
+RECOMMENDATIONS_SIMILAR_TRAINERS = 50  # Похожих тренеров на тренера
+RECOMMENDATIONS_MAX_FOLLOWS_PER_USER = 1000  # Больше подписок — не учитывается в похожести
+RECOMMENDATIONS_BLOCK_CELLS = 4_000_000  # Ячеек плотного блока (~32 МБ float64)
+RECOMMENDATIONS_PAIR_BUDGET = 5_000_000  # Пар подписок, раскрываемых за раз
+# --- Кеш ---
+# Общий Redis нужен в проде: версии для ETag и фрагменты постов должны быть
+# одинаковыми у всех воркеров (web и celery). Без URL — локальная память
+# (разработка и тесты).
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            "KEY_PREFIX": "dare",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "dare",
+        }
+    }
+POST_FRAGMENT_CACHE_TIMEOUT = 60 * 60  # Сериализованный пост; ключ меняется при изменении
+# ETag / Last-Modified строятся из версий в кеше (core.conditional). Версии в
+# локальной памяти не видят изменений из Celery и других воркеров — это был
+# бы ложный 304, поэтому по умолчанию conditional GET включен только с общим кешем
+CONDITIONAL_GET_ENABLED = os.environ.get(
+    "CONDITIONAL_GET_ENABLED", str(bool(CACHE_REDIS_URL))
+) == "True"
+
+# --- Прямая загрузка в storage (core.uploads) ---
+DIRECT_UPLOAD_BACKEND = os.environ.get(
+    "DIRECT_UPLOAD_BACKEND", "core.uploads.S3UploadBackend"
+)
+DIRECT_UPLOAD_EXPIRES_IN = 10 * 60  # Время жизни presigned URL, секунд
+DIRECT_UPLOAD_TTL = 24 * 60 * 60  # Столько живет неприкрепленная загрузка, секунд
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "channel_drops": {"class": "core.channel_layers.DroppedMessagesHandler"},
+    },
+    "loggers": {
+        # channels_redis пишет о переполненных каналах групп в INFO; это
+        # единственный сигнал о потерях, ChannelFull из group_send не выходит
+        "channels_redis": {"handlers": ["console", "channel_drops"], "level": "INFO"},
+    },
+}
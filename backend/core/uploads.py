@@ -0,0 +1,315 @@
+"""
+Загрузка файлов напрямую в storage по presigned URL.
+
+1. POST /api/uploads/presign/ — клиент называет цель (target), Content-Type
+   и размер; получает ключ и параметры загрузки (presigned POST для S3).
+2. Клиент загружает файл прямо в S3, минуя воркеры Django.
+3. Ключ передается в обычный endpoint модели (image_key при создании поста,
+   *_document_key в заявке на верификацию). confirm_upload() проверяет
+   владельца, размер и тип уже загруженного объекта — по сигнатуре первых
+   байтов, а не по заявленному клиентом Content-Type, — и ключ становится
+   значением FileField.
+
+Выданный ключ одноразовый: presign кладет в кеш отметку на
+DIRECT_UPLOAD_TTL, confirm_upload ее атомарно снимает. Один объект нельзя
+прикрепить дважды — обработка картинки удаляет исходник, и второй владелец
+ссылался бы на удаленный файл. Загрузки, которые так и не прикрепили,
+удаляет периодическая cleanup_direct_uploads().
+
+Бэкенд задается DIRECT_UPLOAD_BACKEND: S3UploadBackend в проде,
+FileSystemUploadBackend для разработки и тестов (клиент делает PUT на
+локальный endpoint с подписанным токеном, файл пишется в default_storage).
+"""
+import mimetypes
+import posixpath
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+MB = 1024 * 1024
+LOCAL_UPLOAD_SALT = "core.uploads.local"
+PENDING_UPLOAD_KEY = "upload:pending:{}"
+SIGNATURE_BYTES = 16
+
+IMAGE_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+DOCUMENT_TYPES = {**IMAGE_TYPES, "application/pdf": ".pdf"}
+
+
+def sniff_content_type(head):
+    """Content-Type по сигнатуре начала файла (None — неизвестный формат)."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    return None
+
+
+@dataclass(frozen=True)
+class UploadTarget:
+    upload_to: str
+    content_types: dict  # Content-Type -> расширение ключа
+    max_size: int
+    attached_to: str  # "app.Model.field", куда прикрепляется ключ
+    trainer_only: bool = False
+
+    def key_prefix(self, user):
+        # Пользователь может прикрепить только загруженное им самим
+        return f"{self.upload_to}direct/{user.pk}/"
+
+
+UPLOAD_TARGETS = {
+    # Посты создают только тренеры (PostViewSet), им же выдается и загрузка
+    "post_image": UploadTarget(
+        "post_images/", IMAGE_TYPES, 15 * MB, "posts.Post.image", trainer_only=True
+    ),
+    "identity_document": UploadTarget(
+        "verification_documents/identity/",
+        DOCUMENT_TYPES,
+        10 * MB,
+        "users.Profile.identity_document",
+    ),
+    "qualification_document": UploadTarget(
+        "verification_documents/qualification/",
+        DOCUMENT_TYPES,
+        10 * MB,
+        "users.Profile.qualification_document",
+    ),
+}
+
+
+class S3UploadBackend:
+    """Presigned POST прямо в бакет default_storage (S3Boto3Storage)."""
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    @property
+    def client(self):
+        return self.storage.connection.meta.client
+
+    def object_key(self, name):
+        location = (self.storage.location or "").strip("/")
+        return posixpath.join(location, name) if location else name
+
+    def presign(self, name, content_type, max_size, expires_in):
+        fields = {"Content-Type": content_type}
+        conditions = [{"Content-Type": content_type}, ["content-length-range", 1, max_size]]
+        if self.storage.default_acl:
+            fields["acl"] = self.storage.default_acl
+            conditions.append({"acl": self.storage.default_acl})
+        post = self.client.generate_presigned_post(
+            Bucket=self.storage.bucket_name,
+            Key=self.object_key(name),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expires_in,
+        )
+        return {"method": "POST", "url": post["url"], "fields": post["fields"]}
+
+    def inspect(self, name):
+        """(размер, Content-Type) загруженного объекта или None."""
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(
+                Bucket=self.storage.bucket_name, Key=self.object_key(name)
+            )
+        except ClientError:
+            return None
+        return head["ContentLength"], head.get("ContentType")
+
+    def read_head(self, name, size):
+        obj = self.client.get_object(
+            Bucket=self.storage.bucket_name,
+            Key=self.object_key(name),
+            Range=f"bytes=0-{size - 1}",
+        )
+        return obj["Body"].read()
+
+    def delete(self, name):
+        self.storage.delete(name)
+
+
+class FileSystemUploadBackend:
+    """
+    Замена S3 для разработки и тестов: «presigned URL» — это локальный
+    endpoint с подписанным токеном, тело PUT сохраняется в default_storage.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    def presign(self, name, content_type, max_size, expires_in):
+        token = signing.dumps(
+            {"name": name, "content_type": content_type, "max_size": max_size},
+            salt=LOCAL_UPLOAD_SALT,
+        )
+        return {
+            "method": "PUT",
+            "url": reverse("direct-upload-local", kwargs={"token": token}),
+            "headers": {"Content-Type": content_type},
+        }
+
+    def receive(self, token, content, content_type):
+        """Сохраняет тело PUT; проверяет то же, что и политика S3."""
+        try:
+            payload = signing.loads(
+                token, salt=LOCAL_UPLOAD_SALT, max_age=settings.DIRECT_UPLOAD_EXPIRES_IN
+            )
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid or expired upload URL.")
+        if content_type != payload["content_type"]:
+            raise serializers.ValidationError("Content-Type does not match the upload URL.")
+        if not 0 < len(content) <= payload["max_size"]:
+            raise serializers.ValidationError("File size is not allowed.")
+        self.storage.delete(payload["name"])
+        self.storage.save(payload["name"], ContentFile(content))
+
+    def inspect(self, name):
+        if not self.storage.exists(name):
+            return None
+        return self.storage.size(name), mimetypes.guess_type(name)[0]
+
+    def read_head(self, name, size):
+        with self.storage.open(name, "rb") as file:
+            return file.read(size)
+
+    def delete(self, name):
+        self.storage.delete(name)
+
+
+_backends = {}
+
+
+def get_upload_backend():
+    path = settings.DIRECT_UPLOAD_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def get_target(name):
+    try:
+        return UPLOAD_TARGETS[name]
+    except KeyError:
+        raise serializers.ValidationError({"target": f"Unknown upload target: {name}."})
+
+
+def presign_upload(user, target_name, content_type, size):
+    target = get_target(target_name)
+    extension = target.content_types.get(content_type)
+    if extension is None:
+        raise serializers.ValidationError(
+            {"content_type": f"Allowed types: {', '.join(target.content_types)}."}
+        )
+    if not 0 < size <= target.max_size:
+        raise serializers.ValidationError(
+            {"size": f"File must be at most {target.max_size // MB} MB."}
+        )
+
+    key = f"{target.key_prefix(user)}{uuid.uuid4().hex}{extension}"
+    upload = get_upload_backend().presign(
+        key, content_type, target.max_size, settings.DIRECT_UPLOAD_EXPIRES_IN
+    )
+    cache.set(PENDING_UPLOAD_KEY.format(key), user.pk, settings.DIRECT_UPLOAD_TTL)
+    return {"key": key, "upload": upload, "expires_in": settings.DIRECT_UPLOAD_EXPIRES_IN}
+
+
+def confirm_upload(user, target_name, key):
+    """
+    Проверяет загруженный объект и возвращает ключ для FileField, снимая
+    отметку одноразового ключа. Неподходящий объект удаляется, чтобы не
+    занимать место в бакете. Если запрос дальше не пройдет валидацию, ключ
+    все равно израсходован: клиент загружает файл заново, а старый объект
+    уберет cleanup_direct_uploads().
+    """
+    target = get_target(target_name)
+    pending_key = PENDING_UPLOAD_KEY.format(key)
+    if (
+        not key.startswith(target.key_prefix(user))
+        or ".." in key
+        or cache.get(pending_key) != user.pk
+    ):
+        raise serializers.ValidationError("Unknown or already used upload key.")
+
+    backend = get_upload_backend()
+    info = backend.inspect(key)
+    if info is None:
+        raise serializers.ValidationError("File has not been uploaded yet.")
+    size, content_type = info
+    if (
+        content_type not in target.content_types
+        or not 0 < size <= target.max_size
+        or sniff_content_type(backend.read_head(key, SIGNATURE_BYTES)) != content_type
+    ):
+        backend.delete(key)
+        raise serializers.ValidationError("Uploaded file has an invalid type or size.")
+    # delete атомарен: из двух одновременных запросов ключ получит один
+    if not cache.delete(pending_key):
+        raise serializers.ValidationError("Unknown or already used upload key.")
+    return key
+
+
+def attach_upload(instance, field_name, key):
+    """
+    Записывает подтвержденный ключ в FileField. Файл уже в storage, поэтому
+    Django не считает его новым; пометка нужна core.images для запуска
+    фоновой обработки.
+    """
+    setattr(instance, field_name, key)
+    instance._direct_upload_fields = getattr(instance, "_direct_upload_fields", set()) | {
+        field_name
+    }
+
+
+def cleanup_direct_uploads():
+    """
+    Удаляет прямые загрузки старше DIRECT_UPLOAD_TTL, которые так и не
+    прикрепили к модели (отметка presign к этому времени уже истекла).
+    Возвращает число удаленных объектов.
+    """
+    storage = default_storage
+    backend = get_upload_backend()
+    cutoff = timezone.now() - timedelta(seconds=settings.DIRECT_UPLOAD_TTL)
+    deleted = 0
+    for target in UPLOAD_TARGETS.values():
+        model_label, field = target.attached_to.rsplit(".", 1)
+        model = apps.get_model(model_label)
+        root = f"{target.upload_to}direct/"
+        try:
+            user_dirs, _ = storage.listdir(root)
+        except FileNotFoundError:
+            continue
+        for user_dir in user_dirs:
+            prefix = f"{root}{user_dir}/"
+            stale = [
+                f"{prefix}{name}"
+                for name in storage.listdir(prefix)[1]
+                if storage.get_modified_time(f"{prefix}{name}") < cutoff
+            ]
+            if not stale:
+                continue
+            # Прикрепленные файлы (и результаты обработки рядом с ними) остаются
+            attached = set(
+                model.objects.filter(**{f"{field}__in": stale}).values_list(field, flat=True)
+            )
+            for name in stale:
+                if name not in attached:
+                    backend.delete(name)
+                    deleted += 1
+    return deleted
@@ -11,6 +11,8 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from users.views import CustomTokenObtainPairView
 
+from .views import LocalUploadView, PresignUploadView
+
 schema_view = get_schema_view(
     openapi.Info(
         title="My Project API",
@@ -31,6 +33,9 @@ urlpatterns = [
     path("api/posts/", include("posts.urls")),
     path("api/interactions/", include("interactions.urls")),
     path("api/llm/", include("llm.urls")),
+    # Прямая загрузка файлов в storage (core.uploads)
+    path("api/uploads/presign/", PresignUploadView.as_view(), name="direct-upload-presign"),
+    path("api/uploads/local/<str:token>/", LocalUploadView.as_view(), name="direct-upload-local"),
     # Swagger/OpenAPI
     re_path(
         r"^swagger(?P<format>\.json|\.yaml)$",
@@ -0,0 +1,55 @@
+from django.http import Http404
+from rest_framework import serializers, status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .permissions import IsTrainer
+from .uploads import FileSystemUploadBackend, get_target, get_upload_backend, presign_upload
+
+
+class PresignUploadSerializer(serializers.Serializer):
+    target = serializers.CharField()
+    content_type = serializers.CharField()
+    size = serializers.IntegerField(min_value=1)
+
+
+class PresignUploadView(APIView):
+    """
+    Выдает параметры прямой загрузки в storage (см. core.uploads).
+    Ответ: {"key", "upload": {"method", "url", "fields"|"headers"}, "expires_in"}.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = PresignUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = get_target(serializer.validated_data["target"])
+        if target.trainer_only and not IsTrainer().has_permission(request, self):
+            self.permission_denied(request, message="Only trainers can upload this file.")
+        data = presign_upload(
+            request.user,
+            serializer.validated_data["target"],
+            serializer.validated_data["content_type"],
+            serializer.validated_data["size"],
+        )
+        upload = data["upload"]
+        if upload["url"].startswith("/"):
+            upload["url"] = request.build_absolute_uri(upload["url"])
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class LocalUploadView(APIView):
+    """
+    Приемник PUT для FileSystemUploadBackend (разработка и тесты).
+    Доступ дает подписанный токен из presign, а не сессия.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def put(self, request, token, *args, **kwargs):
+        backend = get_upload_backend()
+        if not isinstance(backend, FileSystemUploadBackend):
+            raise Http404
+        backend.receive(token, request.body, request.content_type)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InteractionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "interactions"
+
+    def ready(self):
+        # Регистрируем обработчики сигналов (счетчики постов и т.д.)
+        from . import signals  # noqa: F401
@@ -0,0 +1,224 @@
+"""
+Пакетные лайки и подписки: список целей за один запрос (офлайн-синхронизация,
+экран «подпишитесь на тренеров» при онбординге).
+
+Пачка — один SELECT целей, один SELECT существующих связей (по таблице, не
+по кешу interactions.follow_graph: устаревший кеш пропустил бы DELETE), один
+INSERT ... ON CONFLICT DO NOTHING и один DELETE. Сигналы post_save /
+post_delete при этом не срабатывают, поэтому побочные эффекты одиночных
+эндпоинтов (счетчики, версии для ETag, ленты подписок, WebSocket)
+выполняются здесь явно, один раз на пачку.
+
+Статус элемента считается по состоянию до записи: при гонке с параллельным
+запросом неточным может оказаться только статус. Лайки пересчитываются по
+таблице (reconcile_likes_count). Подписки пишутся с RETURNING followed_id,
+и счетчики сдвигаются ровно на реально вставленные и удаленные строки
+(adjust_*, шардированные профили — через FollowerCountShard): ни блокировок
+профилей популярных тренеров, ни COUNT по таблице подписок на запрос.
+"""
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.conditional import bump_versions
+from users.counters import adjust_followers_count, adjust_following_count
+
+from .follow_graph import invalidate_following, sync_following
+from .like_buffer import buffer_like, delete_likes, get_like_buffer, reconcile_likes_count
+from .likes import sync_liked_posts
+from .models import Follow, PostLike
+
+BATCH_MAX_ITEMS = 100
+
+
+def batch_likes(user, like_ids, unlike_ids):
+    """Возвращает [{"post", "action", "status"}] в порядке запроса."""
+    from posts.models import Post
+    from posts.realtime import queue_post_update
+
+    existing = set(
+        Post.objects.filter(pk__in=set(like_ids) | set(unlike_ids)).values_list(
+            "pk", flat=True
+        )
+    )
+    buffer = get_like_buffer()
+    if buffer is not None:
+        return buffer_batch_likes(buffer, user, like_ids, unlike_ids, existing)
+
+    liked = set(
+        PostLike.objects.filter(user=user, post_id__in=existing).values_list(
+            "post_id", flat=True
+        )
+    )
+    to_like = [
+        post_id
+        for post_id in dict.fromkeys(like_ids)
+        if post_id in existing and post_id not in liked
+    ]
+    to_unlike = [post_id for post_id in dict.fromkeys(unlike_ids) if post_id in liked]
+
+    changed = to_like + to_unlike
+    if changed:
+        with transaction.atomic():
+            PostLike.objects.bulk_create(
+                [PostLike(user=user, post_id=post_id) for post_id in to_like],
+                ignore_conflicts=True,
+            )
+            if to_unlike:
+                delete_likes([(post_id, user.pk) for post_id in to_unlike])
+            reconcile_likes_count(changed)
+            bump_versions("posts", f"likes:{user.pk}")
+            transaction.on_commit(partial(sync_liked_posts, user.pk, to_like, to_unlike))
+            for post_id in changed:
+                queue_post_update(post_id)
+
+    def status(post_id, action):
+        if post_id not in existing:
+            return "not_found"
+        if action == "like":
+            return "already_liked" if post_id in liked else "liked"
+        return "unliked" if post_id in liked else "not_liked"
+
+    return [
+        {"post": post_id, "action": action, "status": status(post_id, action)}
+        for action, post_ids in (("like", like_ids), ("unlike", unlike_ids))
+        for post_id in post_ids
+    ]
+
+
+def buffer_batch_likes(buffer, user, like_ids, unlike_ids, existing):
+    """Режим буфера (interactions.like_buffer): действия только ставятся в очередь."""
+    results = []
+    for action, post_ids in (("like", like_ids), ("unlike", unlike_ids)):
+        for post_id in post_ids:
+            if post_id in existing:
+                buffer_like(buffer, user.pk, post_id, liked=action == "like")
+            results.append(
+                {
+                    "post": post_id,
+                    "action": action,
+                    "status": "queued" if post_id in existing else "not_found",
+                }
+            )
+    return results
+
+
+def _follow_columns():
+    meta = Follow._meta
+    quote = connection.ops.quote_name
+    return (
+        quote(meta.db_table),
+        quote(meta.get_field("follower").column),
+        quote(meta.get_field("followed").column),
+        quote(meta.get_field("created_at").column),
+    )
+
+
+def insert_follows(user_id, followed_ids):
+    """Подписывает на `followed_ids`; возвращает id, для которых строка вставлена."""
+    if not followed_ids:
+        return []
+    table, follower, followed, created_at = _follow_columns()
+    now = Follow._meta.get_field("created_at").get_db_prep_value(
+        timezone.now(), connection
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({follower}, {followed}, {created_at}) "
+            f"VALUES {', '.join(['(%s, %s, %s)'] * len(followed_ids))} "
+            f"ON CONFLICT DO NOTHING RETURNING {followed}",
+            [value for user in followed_ids for value in (user_id, user, now)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_follows(user_id, followed_ids):
+    """Отписывает от `followed_ids`; возвращает id, для которых строка удалена."""
+    if not followed_ids:
+        return []
+    table, follower, followed, _ = _follow_columns()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {follower} = %s "
+            f"AND {followed} IN ({', '.join(['%s'] * len(followed_ids))}) "
+            f"RETURNING {followed}",
+            [user_id, *followed_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def batch_follows(user, follow_ids, unfollow_ids):
+    """Возвращает [{"user", "action", "status"}] в порядке запроса."""
+    from posts.tasks import backfill_timeline_task, remove_author_from_timeline_task
+    from users.models import Profile
+
+    targets = set(follow_ids) | set(unfollow_ids)
+    roles = dict(
+        User.objects.filter(pk__in=targets).values_list("pk", "profile__role")
+    )
+    following = set(
+        Follow.objects.filter(follower=user, followed_id__in=targets).values_list(
+            "followed_id", flat=True
+        )
+    )
+
+    def follow_status(user_id):
+        if user_id not in roles:
+            return "not_found"
+        if user_id == user.pk:
+            return "self"
+        if roles[user_id] != Profile.Role.TRAINER:
+            return "not_trainer"
+        return "already_following" if user_id in following else "followed"
+
+    def unfollow_status(user_id):
+        if user_id not in roles:
+            return "not_found"
+        return "unfollowed" if user_id in following else "not_following"
+
+    results = [
+        {"user": user_id, "action": "follow", "status": follow_status(user_id)}
+        for user_id in follow_ids
+    ] + [
+        {"user": user_id, "action": "unfollow", "status": unfollow_status(user_id)}
+        for user_id in unfollow_ids
+    ]
+    to_follow = list(
+        dict.fromkeys(item["user"] for item in results if item["status"] == "followed")
+    )
+    to_unfollow = list(
+        dict.fromkeys(item["user"] for item in results if item["status"] == "unfollowed")
+    )
+    if not to_follow and not to_unfollow:
+        return results
+
+    with transaction.atomic():
+        # Побочные эффекты — только для строк, которые действительно изменились
+        # (параллельный запрос мог успеть раньше)
+        to_follow = insert_follows(user.pk, to_follow)
+        to_unfollow = delete_follows(user.pk, to_unfollow)
+        if not to_follow and not to_unfollow:
+            return results
+        adjust_following_count(user.pk, len(to_follow) - len(to_unfollow))
+        adjust_followers_count(to_follow, 1)
+        adjust_followers_count(to_unfollow, -1)
+        # То же, что bump_follow_versions() в сигналах, одним вызовом на пачку
+        bump_versions(
+            f"user:{user.pk}",
+            f"timeline:{user.pk}",
+            f"follows:{user.pk}",
+            "trainers",
+            "posts",
+            *(f"user:{user_id}" for user_id in to_follow + to_unfollow),
+        )
+        invalidate_following(user.pk)
+        transaction.on_commit(partial(sync_following, user.pk, to_follow, to_unfollow))
+        for user_id in to_follow:
+            transaction.on_commit(partial(backfill_timeline_task.delay, user.pk, user_id))
+        for user_id in to_unfollow:
+            transaction.on_commit(
+                partial(remove_author_from_timeline_task.delay, user.pk, user_id)
+            )
+    return results
@@ -0,0 +1,267 @@
+# interactions/follow_graph.py
+"""
+Граф подписок: множество id авторов, на которых подписан пользователь.
+
+Лента подписок и is_followed_by_me проверяют «подписан ли пользователь на X»
+и «на кого из X, Y, Z он подписан»; вместо запроса к interactions_follow на
+каждую проверку множество читается из кеша (settings.FOLLOW_GRAPH_BACKEND).
+Это только кеш: решения о записи (подписка, отписка, batch) принимаются по
+таблице и уникальному индексу, а не по нему. Варианты хранения:
+  - CacheFollowGraph — множество целиком в кеше Django (локальная память
+    без CACHE_REDIS_URL); изменение сбрасывает множество;
+  - RedisFollowGraph — Redis set на пользователя, подписка / отписка меняет
+    уже заполненное множество (SADD / SREM);
+  - InMemoryFollowGraph — для тестов.
+
+Множество заполняется лениво одним запросом и живет FOLLOW_GRAPH_TTL.
+Подписка / отписка (сигналы Follow, batch-подписки) сбрасывает множество
+в своей транзакции и применяет изменение после коммита; заполнение, с
+которым пересеклась подписка, отбрасывается: версия follows:<id>
+(core.conditional) сравнивается до и после чтения из БД.
+
+Число подписчиков хранится в профиле (users.counters) и здесь не кешируется.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from core.conditional import bump_versions, get_versions
+
+from .models import Follow
+
+WARM_CHUNK_SIZE = 1000
+
+# SADD только в уже заполненное множество (см. interactions.likes)
+ADD_IF_WARM = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('sadd', KEYS[1], unpack(ARGV))
+end
+return 0
+"""
+
+
+class BaseFollowGraph:
+    def get(self, user_id):
+        """Множество id авторов или None, если оно не заполнено."""
+        raise NotImplementedError
+
+    def get_among(self, user_id, author_ids):
+        """Подписки из `author_ids` или None, если множество не заполнено."""
+        following = self.get(user_id)
+        return None if following is None else following & set(author_ids)
+
+    def store(self, user_id, author_ids):
+        """Заменяет множество пользователя целиком."""
+        raise NotImplementedError
+
+    def add(self, user_id, author_ids):
+        raise NotImplementedError
+
+    def remove(self, user_id, author_ids):
+        raise NotImplementedError
+
+    def invalidate(self, user_id):
+        raise NotImplementedError
+
+
+class CacheFollowGraph(BaseFollowGraph):
+    """
+    Множество в кеше Django одним значением. Точечно поменять его атомарно
+    нельзя, поэтому любое изменение просто сбрасывает ключ.
+    """
+
+    @staticmethod
+    def _key(user_id):
+        return f"follows:following:{user_id}"
+
+    def get(self, user_id):
+        following = cache.get(self._key(user_id))
+        return None if following is None else set(following)
+
+    def store(self, user_id, author_ids):
+        cache.set(self._key(user_id), frozenset(author_ids), settings.FOLLOW_GRAPH_TTL)
+
+    def add(self, user_id, author_ids):
+        if author_ids:
+            self.invalidate(user_id)
+
+    def remove(self, user_id, author_ids):
+        if author_ids:
+            self.invalidate(user_id)
+
+    def invalidate(self, user_id):
+        cache.delete(self._key(user_id))
+
+
+class RedisFollowGraph(BaseFollowGraph):
+    # id пользователей начинаются с 1: «0» отмечает заполненное (в т.ч. пустое) множество
+    sentinel = 0
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.FOLLOW_GRAPH_REDIS_URL)
+        self.add_if_warm = self.client.register_script(ADD_IF_WARM)
+
+    @staticmethod
+    def _key(user_id):
+        return f"follows:following:{user_id}"
+
+    def get(self, user_id):
+        key = self._key(user_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.smembers(key)
+        pipe.expire(key, settings.FOLLOW_GRAPH_TTL)
+        members, warm = pipe.execute()
+        if not warm:
+            return None
+        return {int(author_id) for author_id in members} - {self.sentinel}
+
+    def get_among(self, user_id, author_ids):
+        # Проверка членства без передачи всего множества
+        author_ids = list(author_ids)
+        if not author_ids:
+            return set()
+        key = self._key(user_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.smismember(key, author_ids)
+        pipe.expire(key, settings.FOLLOW_GRAPH_TTL)
+        flags, warm = pipe.execute()
+        if not warm:
+            return None
+        return {author_id for author_id, flag in zip(author_ids, flags) if flag}
+
+    def store(self, user_id, author_ids):
+        author_ids = [self.sentinel, *author_ids]
+        temp_key = f"{self._key(user_id)}:warm:{uuid.uuid4().hex}"
+        pipe = self.client.pipeline(transaction=True)
+        for start in range(0, len(author_ids), WARM_CHUNK_SIZE):
+            pipe.sadd(temp_key, *author_ids[start:start + WARM_CHUNK_SIZE])
+        pipe.expire(temp_key, settings.FOLLOW_GRAPH_TTL)
+        pipe.rename(temp_key, self._key(user_id))
+        pipe.execute()
+
+    def add(self, user_id, author_ids):
+        if author_ids:
+            self.add_if_warm(keys=[self._key(user_id)], args=list(author_ids))
+
+    def remove(self, user_id, author_ids):
+        if author_ids:
+            self.client.srem(self._key(user_id), *author_ids)
+
+    def invalidate(self, user_id):
+        self.client.delete(self._key(user_id))
+
+
+class InMemoryFollowGraph(BaseFollowGraph):
+    """Множества в памяти процесса. Только для тестов."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sets = {}
+
+    def clear(self):
+        with self.lock:
+            self.sets.clear()
+
+    def get(self, user_id):
+        with self.lock:
+            following = self.sets.get(user_id)
+            return None if following is None else set(following)
+
+    def store(self, user_id, author_ids):
+        with self.lock:
+            self.sets[user_id] = set(author_ids)
+
+    def add(self, user_id, author_ids):
+        with self.lock:
+            if user_id in self.sets:
+                self.sets[user_id].update(author_ids)
+
+    def remove(self, user_id, author_ids):
+        with self.lock:
+            if user_id in self.sets:
+                self.sets[user_id].difference_update(author_ids)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.sets.pop(user_id, None)
+
+
+_graphs = {}
+
+
+def get_follow_graph():
+    path = settings.FOLLOW_GRAPH_BACKEND
+    if path not in _graphs:
+        _graphs[path] = import_string(path)()
+    return _graphs[path]
+
+
+def warm_following(graph, user_id):
+    version_name = f"follows:{user_id}"
+    version = get_versions(version_name)[version_name]
+    author_ids = set(
+        Follow.objects.filter(follower_id=user_id)
+        .order_by()
+        .values_list("followed_id", flat=True)
+    )
+    graph.store(user_id, author_ids)
+    # Подписка, закоммиченная во время чтения, могла не попасть в множество
+    if get_versions(version_name)[version_name] != version:
+        graph.invalidate(user_id)
+    return author_ids
+
+
+def following_ids(user_id):
+    """Множество id авторов, на которых подписан пользователь."""
+    graph = get_follow_graph()
+    following = graph.get(user_id)
+    if following is None:
+        following = warm_following(graph, user_id)
+    return following
+
+
+def following_among(user_id, author_ids):
+    """На кого из `author_ids` подписан пользователь."""
+    author_ids = set(author_ids)
+    if not author_ids:
+        return set()
+    graph = get_follow_graph()
+    following = graph.get_among(user_id, author_ids)
+    if following is None:
+        following = warm_following(graph, user_id) & author_ids
+    return following
+
+
+def is_following(user_id, author_id):
+    return bool(following_among(user_id, [author_id]))
+
+
+def common_following(user_id, other_user_id):
+    """Авторы, на которых подписаны оба пользователя."""
+    return following_ids(user_id) & following_ids(other_user_id)
+
+
+def invalidate_following(user_id):
+    """
+    Сбрасывает множество внутри транзакции подписки: до коммита граф
+    ответит запросом к БД, а не устаревшим множеством. Заполнение,
+    успевшее прочитать БД до коммита, исправит sync_following().
+    """
+    get_follow_graph().invalidate(user_id)
+
+
+def sync_following(user_id, added=(), removed=()):
+    """
+    Вызывается после коммита подписок/отписок пользователя. Версия
+    поднимается до изменения множества — так параллельное заполнение увидит
+    изменение.
+    """
+    bump_versions(f"follows:{user_id}")
+    graph = get_follow_graph()
+    graph.add(user_id, added)
+    graph.remove(user_id, removed)
@@ -0,0 +1,373 @@
+"""
+Буферизованная запись лайков для «горячих» постов.
+
+В обычном режиме каждый клик — get_or_create по уникальному индексу и
+UPDATE счетчика одной и той же строки поста; на запуске популярного поста
+запросы выстраиваются в очередь на этой строке. С LIKE_BUFFER_BACKEND лайк
+и анлайк только записываются в буфер:
+
+  - по посту: множества user_id «добавить» / «удалить» (последнее действие
+    пользователя побеждает) и общее множество постов с изменениями;
+  - по пользователю: множества post_id, чтобы is_liked_by_user сразу
+    отражал его собственные действия (read-your-writes).
+
+flush_like_buffer() (Celery beat каждые LIKE_BUFFER_FLUSH_SECONDS, при
+остановке воркера и командой flush_like_buffer) забирает пачку постов,
+пишет ее одним bulk_create(ignore_conflicts=True) и одним параметризованным
+DELETE и пересчитывает likes_count этих постов по таблице лайков. Сигналы
+PostLike при этом не срабатывают, поэтому версии и WebSocket-обновления
+поднимаются здесь явно (и те и другие — после коммита).
+
+Записи удаляются из буфера только после коммита и ровно те, что были
+прочитаны: действие, пришедшее во время записи, остается в буфере и уйдет
+следующей пачкой; при ошибке посты возвращаются в очередь. Взятые посты
+до ack() лежат в отдельном множестве «в обработке»: если воркер упал
+посреди записи, следующий flush возвращает их в очередь (recover()).
+Повторная запись безопасна — вставка и удаление идемпотентны, а счетчик
+пересчитывается целиком.
+"""
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.conditional import bump_versions
+
+from .models import Comment, PostLike
+
+
+class BaseLikeBuffer:
+    def record(self, user_id, post_id, liked):
+        raise NotImplementedError
+
+    def pending_for_user(self, user_id):
+        """(post_id с лайком в буфере, post_id с анлайком в буфере)."""
+        raise NotImplementedError
+
+    def take(self, limit):
+        """
+        {post_id: (user_id для добавления, user_id для удаления)} для пачки
+        постов; до ack() изменения остаются в буфере.
+        """
+        raise NotImplementedError
+
+    def ack(self, changes):
+        """Удаляет записанные изменения из буфера."""
+        raise NotImplementedError
+
+    def requeue(self, post_ids):
+        """Возвращает посты в очередь, если запись не удалась."""
+        raise NotImplementedError
+
+    def recover(self):
+        """Возвращает в очередь посты, взятые упавшей записью и не подтвержденные."""
+        raise NotImplementedError
+
+
+class RedisLikeBuffer(BaseLikeBuffer):
+    dirty_key = "likes:buffer:dirty"
+    processing_key = "likes:buffer:processing"
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.LIKE_BUFFER_REDIS_URL)
+
+    @staticmethod
+    def _post_key(post_id, liked):
+        return f"likes:buffer:post:{post_id}:{'add' if liked else 'remove'}"
+
+    @staticmethod
+    def _user_key(user_id, liked):
+        return f"likes:buffer:user:{user_id}:{'add' if liked else 'remove'}"
+
+    def record(self, user_id, post_id, liked):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.sadd(self._post_key(post_id, liked), user_id)
+        pipe.srem(self._post_key(post_id, not liked), user_id)
+        pipe.sadd(self._user_key(user_id, liked), post_id)
+        pipe.srem(self._user_key(user_id, not liked), post_id)
+        pipe.sadd(self.dirty_key, post_id)
+        pipe.execute()
+
+    def pending_for_user(self, user_id):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.smembers(self._user_key(user_id, True))
+        pipe.smembers(self._user_key(user_id, False))
+        added, removed = pipe.execute()
+        return {int(post_id) for post_id in added}, {int(post_id) for post_id in removed}
+
+    def take(self, limit):
+        candidates = self.client.srandmember(self.dirty_key, limit) or []
+        if not candidates:
+            return {}
+        # SMOVE, а не SPOP: до ack() пост остается в множестве «в обработке»;
+        # пост, который параллельно забрал другой flush, здесь пропускается
+        pipe = self.client.pipeline(transaction=False)
+        for post_id in candidates:
+            pipe.smove(self.dirty_key, self.processing_key, post_id)
+        post_ids = [
+            int(post_id) for post_id, moved in zip(candidates, pipe.execute()) if moved
+        ]
+        if not post_ids:
+            return {}
+        pipe = self.client.pipeline(transaction=False)
+        for post_id in post_ids:
+            pipe.smembers(self._post_key(post_id, True))
+            pipe.smembers(self._post_key(post_id, False))
+        members = pipe.execute()
+        return {
+            post_id: (
+                {int(user_id) for user_id in members[2 * index]},
+                {int(user_id) for user_id in members[2 * index + 1]},
+            )
+            for index, post_id in enumerate(post_ids)
+        }
+
+    def ack(self, changes):
+        pipe = self.client.pipeline(transaction=False)
+        for post_id, (added, removed) in changes.items():
+            for liked, user_ids in ((True, added), (False, removed)):
+                if not user_ids:
+                    continue
+                pipe.srem(self._post_key(post_id, liked), *user_ids)
+                for user_id in user_ids:
+                    pipe.srem(self._user_key(user_id, liked), post_id)
+        if changes:
+            pipe.srem(self.processing_key, *changes)
+        pipe.execute()
+
+    def requeue(self, post_ids):
+        if post_ids:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.sadd(self.dirty_key, *post_ids)
+            pipe.srem(self.processing_key, *post_ids)
+            pipe.execute()
+
+    def recover(self):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.sunionstore(self.dirty_key, [self.dirty_key, self.processing_key])
+        pipe.delete(self.processing_key)
+        pipe.execute()
+
+
+class InMemoryLikeBuffer(BaseLikeBuffer):
+    """Буфер в памяти процесса. Только для тестов и разработки с одним процессом."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.posts = defaultdict(lambda: (set(), set()))
+        self.users = defaultdict(lambda: (set(), set()))
+        self.dirty = []
+        self.processing = set()
+
+    def record(self, user_id, post_id, liked):
+        with self.lock:
+            added, removed = self.posts[post_id]
+            (added if liked else removed).add(user_id)
+            (removed if liked else added).discard(user_id)
+            added, removed = self.users[user_id]
+            (added if liked else removed).add(post_id)
+            (removed if liked else added).discard(post_id)
+            if post_id not in self.dirty:
+                self.dirty.append(post_id)
+
+    def pending_for_user(self, user_id):
+        with self.lock:
+            added, removed = self.users.get(user_id, (set(), set()))
+            return set(added), set(removed)
+
+    def take(self, limit):
+        with self.lock:
+            post_ids, self.dirty = self.dirty[:limit], self.dirty[limit:]
+            self.processing.update(post_ids)
+            return {
+                post_id: tuple(set(user_ids) for user_ids in self.posts[post_id])
+                for post_id in post_ids
+            }
+
+    def ack(self, changes):
+        with self.lock:
+            for post_id, pending in changes.items():
+                for index, user_ids in enumerate(pending):
+                    self.posts[post_id][index].difference_update(user_ids)
+                    for user_id in user_ids:
+                        self.users[user_id][index].discard(post_id)
+            self.processing.difference_update(changes)
+
+    def requeue(self, post_ids):
+        with self.lock:
+            self.dirty.extend(post_id for post_id in post_ids if post_id not in self.dirty)
+            self.processing.difference_update(post_ids)
+
+    def recover(self):
+        self.requeue(sorted(self.processing))
+
+
+_buffers = {}
+
+
+def get_like_buffer():
+    """Буфер из settings.LIKE_BUFFER_BACKEND или None (лайки пишутся сразу)."""
+    path = settings.LIKE_BUFFER_BACKEND
+    if not path:
+        return None
+    if path not in _buffers:
+        _buffers[path] = import_string(path)()
+    return _buffers[path]
+
+
+def buffer_like(buffer, user_id, post_id, liked):
+    buffer.record(user_id, post_id, liked)
+    # is_liked_by_user меняется сразу (read-your-writes), ETag тоже
+    bump_versions(f"likes:{user_id}")
+
+
+def apply_pending_likes(user_id, post_ids, liked):
+    """Накладывает буфер на множество лайкнутых в БД постов из `post_ids`."""
+    buffer = get_like_buffer()
+    if buffer is None:
+        return liked
+    added, removed = buffer.pending_for_user(user_id)
+    return (liked - removed) | (added & set(post_ids))
+
+
+def write_changes(changes):
+    """Пишет пачку из буфера в БД; возвращает число постов с изменениями."""
+    from posts.models import Post
+    from posts.realtime import queue_post_update
+
+    from .likes import sync_liked_posts
+
+    post_ids = set(
+        Post.objects.filter(pk__in=list(changes)).values_list("pk", flat=True)
+    )
+    # Пост или пользователь могли быть удалены, пока лайк ждал в буфере
+    user_ids = set().union(*(added for added, _ in changes.values()))
+    if user_ids:
+        user_ids = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+
+    likes = []
+    removals = []
+    by_user = defaultdict(lambda: ([], []))
+    for post_id, (added, removed) in changes.items():
+        if post_id not in post_ids:
+            continue
+        likes.extend(
+            PostLike(user_id=user_id, post_id=post_id) for user_id in added & user_ids
+        )
+        removals.extend((post_id, user_id) for user_id in removed)
+        for user_id in added & user_ids:
+            by_user[user_id][0].append(post_id)
+        for user_id in removed:
+            by_user[user_id][1].append(post_id)
+
+    with transaction.atomic():
+        PostLike.objects.bulk_create(likes, batch_size=1000, ignore_conflicts=True)
+        if removals:
+            delete_likes(removals)
+        reconcile_likes_count(post_ids)
+        # И версии, и WebSocket-окна открываются только после коммита
+        bump_versions("posts")
+        for post_id in post_ids:
+            queue_post_update(post_id)
+        for user_id, (added, removed) in by_user.items():
+            transaction.on_commit(partial(sync_liked_posts, user_id, added, removed))
+    return len(post_ids)
+
+
+def delete_likes(pairs):
+    """
+    Удаляет лайки (post_id, user_id) без сигналов post_delete и без загрузки
+    объектов: счетчики пересчитываются следом одним UPDATE. Пары ищутся по
+    уникальному индексу (user, post).
+    """
+    meta = PostLike._meta
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {quote(meta.db_table)} "
+            f"WHERE {quote(meta.get_field('post').column)} = %s "
+            f"AND {quote(meta.get_field('user').column)} = %s",
+            pairs,
+        )
+
+
+def post_counter_expression(field):
+    """Фактическое значение счетчика поста (likes_count / comments_count) подзапросом."""
+    model = PostLike if field == "likes_count" else Comment
+    return Coalesce(
+        Subquery(
+            model.objects.filter(post_id=OuterRef("pk"))
+            .order_by()
+            .values("post_id")
+            .annotate(total=Count("id"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def reconcile_likes_count(post_ids):
+    """likes_count = фактическое число лайков для `post_ids`, одним UPDATE."""
+    from posts.models import Post
+
+    Post.objects.filter(pk__in=post_ids).update(
+        likes_count=post_counter_expression("likes_count"),
+        last_activity_at=timezone.now(),
+    )
+
+
+def drifted_post_counters():
+    """Фильтр постов, у которых likes_count или comments_count расходятся с фактом."""
+    drifted = Q()
+    for field in ("likes_count", "comments_count"):
+        drifted |= ~Q(**{field: post_counter_expression(field)})
+    return drifted
+
+
+def reconcile_post_counters(post_ids):
+    """
+    likes_count и comments_count = фактические значения одним UPDATE, только
+    у расходящихся строк. Возвращает число исправленных постов.
+    """
+    from posts.models import Post
+
+    return (
+        Post.objects.filter(pk__in=post_ids)
+        .filter(drifted_post_counters())
+        .update(
+            likes_count=post_counter_expression("likes_count"),
+            comments_count=post_counter_expression("comments_count"),
+        )
+    )
+
+
+def flush_like_buffer(batch_size=None):
+    """Записывает буфер в БД пачками; возвращает число обработанных постов."""
+    buffer = get_like_buffer()
+    if buffer is None:
+        return 0
+    batch_size = batch_size or settings.LIKE_BUFFER_BATCH_SIZE
+    buffer.recover()
+    flushed = 0
+    while True:
+        changes = buffer.take(batch_size)
+        if not changes:
+            return flushed
+        try:
+            flushed += write_changes(changes)
+        except Exception:
+            buffer.requeue(list(changes))
+            raise
+        buffer.ack(changes)
@@ -0,0 +1,215 @@
+# interactions/likes.py
+"""
+«Лайкнул ли пользователь посты X, Y, Z» — для ленты, trending, batch и т.п.
+
+Без настройки это один запрос к interactions_postlike на пачку постов. С
+LIKED_POSTS_BACKEND у каждого пользователя есть множество id лайкнутых постов
+(Redis set), и проверка идет без обращения к таблице лайков:
+
+  - множество заполняется лениво при первом чтении одним запросом и живет
+    LIKED_POSTS_TTL с момента последнего чтения;
+  - лайк / анлайк меняет уже заполненное множество после коммита (сигналы,
+    batch-эндпоинты, перенос из буфера лайков);
+  - заполнение, с которым пересекся лайк, отбрасывается: версия likes:<id>
+    (core.conditional) сравнивается до и после чтения из БД.
+
+Пользователи с очень большим числом лайков (> LIKED_POSTS_MAX_WARM) не
+кешируются и проверяются запросом по пачке.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from core.conditional import bump_versions, get_versions
+
+from .like_buffer import apply_pending_likes
+from .models import PostLike
+
+UNCACHED_KEY = "likes:uncached:{}"
+WARM_CHUNK_SIZE = 1000
+
+# SADD только в уже заполненное множество: иначе частичное множество
+# выглядело бы заполненным
+ADD_IF_WARM = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('sadd', KEYS[1], unpack(ARGV))
+end
+return 0
+"""
+
+
+class BaseLikedPostsStore:
+    def get(self, user_id, post_ids):
+        """Лайкнутые из `post_ids` или None, если множество не заполнено."""
+        raise NotImplementedError
+
+    def store(self, user_id, post_ids):
+        """Заменяет множество пользователя целиком."""
+        raise NotImplementedError
+
+    def add(self, user_id, post_ids):
+        raise NotImplementedError
+
+    def remove(self, user_id, post_ids):
+        raise NotImplementedError
+
+    def invalidate(self, user_id):
+        raise NotImplementedError
+
+
+class RedisLikedPostsStore(BaseLikedPostsStore):
+    # id постов начинаются с 1: «0» отмечает заполненное (в т.ч. пустое) множество
+    sentinel = 0
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.LIKED_POSTS_REDIS_URL)
+        self.add_if_warm = self.client.register_script(ADD_IF_WARM)
+
+    @staticmethod
+    def _key(user_id):
+        return f"likes:posts:{user_id}"
+
+    def get(self, user_id, post_ids):
+        post_ids = list(post_ids)
+        key = self._key(user_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.smismember(key, post_ids)
+        pipe.expire(key, settings.LIKED_POSTS_TTL)
+        flags, warm = pipe.execute()
+        if not warm:
+            return None
+        return {post_id for post_id, flag in zip(post_ids, flags) if flag}
+
+    def store(self, user_id, post_ids):
+        post_ids = [self.sentinel, *post_ids]
+        temp_key = f"{self._key(user_id)}:warm:{uuid.uuid4().hex}"
+        pipe = self.client.pipeline(transaction=True)
+        for start in range(0, len(post_ids), WARM_CHUNK_SIZE):
+            pipe.sadd(temp_key, *post_ids[start:start + WARM_CHUNK_SIZE])
+        pipe.expire(temp_key, settings.LIKED_POSTS_TTL)
+        pipe.rename(temp_key, self._key(user_id))
+        pipe.execute()
+
+    def add(self, user_id, post_ids):
+        if post_ids:
+            self.add_if_warm(keys=[self._key(user_id)], args=list(post_ids))
+
+    def remove(self, user_id, post_ids):
+        if post_ids:
+            self.client.srem(self._key(user_id), *post_ids)
+
+    def invalidate(self, user_id):
+        self.client.delete(self._key(user_id))
+
+
+class InMemoryLikedPostsStore(BaseLikedPostsStore):
+    """Множества в памяти процесса. Только для тестов."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sets = {}
+
+    def clear(self):
+        with self.lock:
+            self.sets.clear()
+
+    def get(self, user_id, post_ids):
+        with self.lock:
+            liked = self.sets.get(user_id)
+            return None if liked is None else liked & set(post_ids)
+
+    def store(self, user_id, post_ids):
+        with self.lock:
+            self.sets[user_id] = set(post_ids)
+
+    def add(self, user_id, post_ids):
+        with self.lock:
+            if user_id in self.sets:
+                self.sets[user_id].update(post_ids)
+
+    def remove(self, user_id, post_ids):
+        with self.lock:
+            if user_id in self.sets:
+                self.sets[user_id].difference_update(post_ids)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.sets.pop(user_id, None)
+
+
+_stores = {}
+
+
+def get_liked_posts_store():
+    path = settings.LIKED_POSTS_BACKEND
+    if not path:
+        return None
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+def warm_liked_posts(store, user_id):
+    """
+    Заполняет множество из БД. Возвращает id лайкнутых постов или None,
+    если пользователь не кешируется.
+    """
+    if cache.get(UNCACHED_KEY.format(user_id)):
+        return None
+    version_name = f"likes:{user_id}"
+    version = get_versions(version_name)[version_name]
+    post_ids = list(
+        PostLike.objects.filter(user_id=user_id).values_list("post_id", flat=True)[
+            : settings.LIKED_POSTS_MAX_WARM + 1
+        ]
+    )
+    if len(post_ids) > settings.LIKED_POSTS_MAX_WARM:
+        cache.set(UNCACHED_KEY.format(user_id), True, settings.LIKED_POSTS_TTL)
+        return None
+    store.store(user_id, post_ids)
+    # Лайк, закоммиченный во время чтения, мог не попасть в множество
+    if get_versions(version_name)[version_name] != version:
+        store.invalidate(user_id)
+    return set(post_ids)
+
+
+def sync_liked_posts(user_id, added=(), removed=()):
+    """
+    Вызывается после коммита лайков/анлайков пользователя. Версия поднимается
+    до изменения множества — так параллельное заполнение увидит изменение.
+    """
+    store = get_liked_posts_store()
+    bump_versions(f"likes:{user_id}")
+    if store is None:
+        return
+    store.add(user_id, added)
+    store.remove(user_id, removed)
+
+
+def liked_post_ids(user, post_ids):
+    """
+    Возвращает множество id постов из `post_ids`, которые лайкнул пользователь.
+    Один запрос на всю пачку вместо `.exists()` на каждый пост (или ни одного,
+    если множество пользователя уже в LIKED_POSTS_BACKEND).
+    """
+    if not user or not user.is_authenticated or not post_ids:
+        return set()
+    store = get_liked_posts_store()
+    liked = store.get(user.pk, post_ids) if store is not None else None
+    if liked is None and store is not None:
+        warmed = warm_liked_posts(store, user.pk)
+        if warmed is not None:
+            liked = warmed & set(post_ids)
+    if liked is None:
+        liked = set(
+            PostLike.objects.filter(user=user, post_id__in=post_ids).values_list(
+                "post_id", flat=True
+            )
+        )
+    # Лайки, еще не записанные из буфера (interactions.like_buffer)
+    return apply_pending_likes(user.pk, post_ids, liked)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from interactions.like_buffer import flush_like_buffer, get_like_buffer
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered likes (LIKE_BUFFER_BACKEND) to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of posts written per batch (default LIKE_BUFFER_BATCH_SIZE).',
+        )
+
+    def handle(self, *args, **options):
+        if get_like_buffer() is None:
+            self.stdout.write('Like buffer is disabled, nothing to flush.')
+            return
+        flushed = flush_like_buffer(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed buffered likes for {flushed} posts.'))
@@ -21,6 +21,15 @@ class Follow(models.Model):
             )
         ]
         ordering = ["-created_at"]
+        indexes = [
+            # Списки подписчиков / подписок с keyset-пагинацией
+            models.Index(
+                fields=["followed", "-created_at", "-id"], name="follow_followed_recent_idx"
+            ),
+            models.Index(
+                fields=["follower", "-created_at", "-id"], name="follow_follower_recent_idx"
+            ),
+        ]
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
 
@@ -37,6 +46,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["post", "-created_at", "-id"], name="comment_post_recent_idx"
+            ),
+        ]
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
 
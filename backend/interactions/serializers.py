@@ -1,14 +1,19 @@
 # interactions/serializers.py
+from django.db import models
 from rest_framework import serializers
 
-from users.serializers import UserSerializer
+from core.serializers import DynamicFieldsMixin
+from users.serializers import CompactUserSerializer, UserSerializer, prime_followed_users
 
+from .batch import BATCH_MAX_ITEMS
 from .models import Comment, Follow, PostLike
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     post = serializers.PrimaryKeyRelatedField(read_only=True)
+    # ?expand=post — пост целиком вместо id
+    expandable_fields = {"post": ("posts.serializers.PostSerializer", {})}
 
     class Meta:
         model = Comment
@@ -16,7 +21,20 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "author", "post", "created_at", "updated_at"]
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowListSerializer(serializers.ListSerializer):
+    """is_followed_by_me для пользователей всей страницы одним обращением."""
+
+    def to_representation(self, data):
+        follows = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        for field in self.child.fields.values():
+            if isinstance(field, UserSerializer):
+                prime_followed_users(
+                    field, [getattr(follow, f"{field.source}_id") for follow in follows]
+                )
+        return super().to_representation(follows)
+
+
+class FollowSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     follower = UserSerializer(read_only=True)
     followed = UserSerializer(read_only=True)
 
@@ -24,12 +42,77 @@ class FollowSerializer(serializers.ModelSerializer):
         model = Follow
         fields = ["id", "follower", "followed", "created_at"]
         read_only_fields = ["id", "follower", "followed", "created_at"]
+        list_serializer_class = FollowListSerializer
+
+
+class FollowerEntrySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Элемент списка подписчиков: только подписавшийся пользователь, вторая
+    сторона — пользователь из URL.
+    """
+
+    user = CompactUserSerializer(source="follower", read_only=True)
+
+    class Meta:
+        model = Follow
+        fields = ["id", "user", "created_at"]
+        read_only_fields = fields
+        list_serializer_class = FollowListSerializer
+
+
+class FollowingEntrySerializer(FollowerEntrySerializer):
+    """Элемент списка подписок: только автор, на которого подписан пользователь."""
 
+    user = CompactUserSerializer(source="followed", read_only=True)
 
-class PostLikeSerializer(serializers.ModelSerializer):
+
+class PostLikeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    expandable_fields = {"post": ("posts.serializers.PostSerializer", {})}
 
     class Meta:
         model = PostLike
         fields = ["id", "user", "post", "created_at"]
         read_only_fields = ["id", "user", "created_at"]
+
+
+class BatchActionSerializer(serializers.Serializer):
+    """
+    Два списка id целей: `actions` задает имена полей, например
+    {"like": [...], "unlike": [...]}. Один id не может быть в обоих списках.
+    """
+
+    actions = ()
+
+    def get_fields(self):
+        return {
+            action: serializers.ListField(
+                child=serializers.IntegerField(min_value=1),
+                max_length=BATCH_MAX_ITEMS,
+                required=False,
+                default=list,
+            )
+            for action in self.actions
+        }
+
+    def validate(self, attrs):
+        first, second = (attrs[action] for action in self.actions)
+        if not first and not second:
+            raise serializers.ValidationError("Nothing to do: both lists are empty.")
+        if len(first) + len(second) > BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"At most {BATCH_MAX_ITEMS} items per request."
+            )
+        if set(first) & set(second):
+            raise serializers.ValidationError(
+                f"An id cannot be in both '{self.actions[0]}' and '{self.actions[1]}'."
+            )
+        return attrs
+
+
+class LikeBatchSerializer(BatchActionSerializer):
+    actions = ("like", "unlike")
+
+
+class FollowBatchSerializer(BatchActionSerializer):
+    actions = ("follow", "unfollow")
@@ -0,0 +1,112 @@
+# interactions/signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.conditional import bump_versions
+from posts.models import Post
+from posts.realtime import queue_post_update
+from posts.tasks import backfill_timeline_task, remove_author_from_timeline_task
+from users.counters import adjust_followers_count, adjust_following_count
+
+from .follow_graph import invalidate_following, sync_following
+from .likes import sync_liked_posts
+from .models import Comment, Follow, PostLike
+
+
+def bump_follow_versions(follow):
+    # Счетчики подписок видны в профилях, списках тренеров и авторах постов,
+    # состав — в ленте подписок и is_followed_by_me
+    bump_versions(
+        f"user:{follow.follower_id}",
+        f"user:{follow.followed_id}",
+        f"timeline:{follow.follower_id}",
+        f"follows:{follow.follower_id}",
+        "trainers",
+        "posts",
+    )
+
+
+def adjust_post_counter(post_ids, field, delta, since=None):
+    """
+    Атомарно сдвигает денормализованный счетчик (likes_count / comments_count)
+    у постов одним UPDATE ... SET field = field + delta и отмечает активность
+    (для инкрементального пересчета trending). Подписчикам поста по WebSocket
+    уходит склеенное обновление; `since` — created_at нового комментария.
+    """
+    Post.objects.filter(pk__in=post_ids).update(
+        **{field: Greatest(F(field) + delta, 0)}, last_activity_at=timezone.now()
+    )
+    bump_versions("posts")
+    for post_id in post_ids:
+        queue_post_update(post_id, since)
+
+
+@receiver(post_save, sender=PostLike)
+def post_like_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_post_counter([instance.post_id], "likes_count", 1)
+        bump_versions(f"likes:{instance.user_id}")
+        transaction.on_commit(
+            partial(sync_liked_posts, instance.user_id, added=[instance.post_id])
+        )
+
+
+@receiver(post_delete, sender=PostLike)
+def post_like_deleted(sender, instance, **kwargs):
+    adjust_post_counter([instance.post_id], "likes_count", -1)
+    bump_versions(f"likes:{instance.user_id}")
+    transaction.on_commit(
+        partial(sync_liked_posts, instance.user_id, removed=[instance.post_id])
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_post_counter(
+            [instance.post_id], "comments_count", 1, since=instance.created_at
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    adjust_post_counter([instance.post_id], "comments_count", -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_following_count(instance.follower_id, 1)
+        adjust_followers_count([instance.followed_id], 1)
+        bump_follow_versions(instance)
+        invalidate_following(instance.follower_id)
+        transaction.on_commit(
+            partial(sync_following, instance.follower_id, added=[instance.followed_id])
+        )
+        transaction.on_commit(
+            partial(backfill_timeline_task.delay, instance.follower_id, instance.followed_id)
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    adjust_following_count(instance.follower_id, -1)
+    adjust_followers_count([instance.followed_id], -1)
+    bump_follow_versions(instance)
+    invalidate_following(instance.follower_id)
+    transaction.on_commit(
+        partial(sync_following, instance.follower_id, removed=[instance.followed_id])
+    )
+    transaction.on_commit(
+        partial(
+            remove_author_from_timeline_task.delay,
+            instance.follower_id,
+            instance.followed_id,
+        )
+    )
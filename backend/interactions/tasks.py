@@ -0,0 +1,27 @@
+import logging
+
+from celery import shared_task
+from celery.signals import worker_shutdown
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="flush_like_buffer")
+def flush_like_buffer_task():
+    """
+    Переносит лайки из буфера в БД (если буфер включен).
+    """
+    from .like_buffer import flush_like_buffer
+
+    try:
+        flushed = flush_like_buffer()
+        if flushed:
+            logger.info(f"Flushed buffered likes for {flushed} posts.")
+    except Exception as e:
+        logger.error(f"Error flushing like buffer: {e}", exc_info=True)
+
+
+@worker_shutdown.connect
+def flush_like_buffer_on_shutdown(**kwargs):
+    """Последний перенос при остановке воркера, чтобы не ждать следующего запуска."""
+    flush_like_buffer_task()
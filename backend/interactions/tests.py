@@ -1,16 +1,28 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from posts.models import Post
 from users.models import Profile
 
+from .follow_graph import following_among, following_ids, get_follow_graph, sync_following
+from .like_buffer import flush_like_buffer, get_like_buffer
+from .likes import get_liked_posts_store, liked_post_ids, sync_liked_posts
 from .models import Comment, Follow, PostLike
 
 
 class InteractionTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create_user(username="user1", password="password123")
         self.user2 = User.objects.create_user(username="user2", password="password123")
         self.trainer1 = User.objects.create_user(
@@ -57,6 +69,20 @@ class InteractionTests(APITestCase):
             len(response.data.get("results", [])) >= 2 or len(response.data) >= 2
         )
 
+    def test_list_comments_expand_post(self):
+        """Ensure ?expand=post embeds the post instead of its id."""
+        Comment.objects.create(
+            post=self.post_by_trainer, author=self.user1, content="Comment 1"
+        )
+        url = reverse("post-comments-list", kwargs={"post_pk": self.post_by_trainer.pk})
+        response = self.client.get(url + "?expand=post&fields=id,post.id,post.content")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = response.data["results"][0]
+        self.assertEqual(set(item), {"id", "post"})
+        self.assertEqual(
+            item["post"], {"id": self.post_by_trainer.pk, "content": "Trainer's post"}
+        )
+
     def test_delete_own_comment(self):
         """Ensure author can delete their own comment."""
         comment = Comment.objects.create(
@@ -230,7 +256,7 @@ class InteractionTests(APITestCase):
             "results", response.data
         )  # Учитываем пагинацию или ее отсутствие
         self.assertEqual(len(results), 1)
-        self.assertEqual(results[0]["followed"]["username"], self.trainer1.username)
+        self.assertEqual(results[0]["user"]["username"], self.trainer1.username)
 
     def test_list_followers(self):
         """Ensure we can list a trainer's followers."""
@@ -245,10 +271,50 @@ class InteractionTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         results = response.data.get("results", response.data)
         self.assertEqual(len(results), 2)
-        follower_usernames = {item["follower"]["username"] for item in results}
+        follower_usernames = {item["user"]["username"] for item in results}
         self.assertIn(self.user1.username, follower_usernames)
         self.assertIn(self.user2.username, follower_usernames)
 
+    def test_followers_keyset_pages_and_since(self):
+        fans = [
+            User.objects.create_user(username=f"fan{i}", password="password123")
+            for i in range(3)
+        ]
+        start = timezone.now() - timedelta(hours=1)
+        for minutes, fan in enumerate(fans):
+            follow = Follow.objects.create(follower=fan, followed=self.trainer1)
+            Follow.objects.filter(pk=follow.pk).update(
+                created_at=start + timedelta(minutes=minutes)
+            )
+        url = reverse("user-follower-list", kwargs={"user_pk": self.trainer1.pk})
+        self.client.force_authenticate(user=self.user1)
+
+        # Пользователь из URL + страница + подписки user1 (is_followed_by_me)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {"page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["user"]["username"] for item in response.data["results"]],
+            ["fan2", "fan1"],
+        )
+        self.assertEqual(
+            set(response.data["results"][0]["user"]),
+            {"id", "username", "avatar_url", "avatar_renditions", "is_followed_by_me"},
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [item["user"]["username"] for item in response.data["results"]], ["fan0"]
+        )
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(url, {"since": start.isoformat()})
+        self.assertEqual(
+            [item["user"]["username"] for item in response.data["results"]],
+            ["fan2", "fan1"],
+        )
+        response = self.client.get(url, {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_list_followers_of_non_trainer(self):
         """Ensure listing followers of a non-trainer raises PermissionDenied (as implemented)."""
         url = reverse(
@@ -258,3 +324,284 @@ class InteractionTests(APITestCase):
         response = self.client.get(url)
         # Ожидаем 403 Forbidden, так как мы раскомментировали проверку во view
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(LIKE_BUFFER_BACKEND="interactions.like_buffer.InMemoryLikeBuffer")
+class LikeBufferTests(APITestCase):
+    def setUp(self):
+        get_like_buffer().clear()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.post = Post.objects.create(author=self.trainer, content="Launch")
+        self.url = reverse("post-like", kwargs={"post_pk": self.post.pk})
+        self.client.force_authenticate(user=self.user)
+
+    def test_buffered_like_is_visible_to_user_before_flush(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(PostLike.objects.exists())
+
+        detail = self.client.get(reverse("post-detail", kwargs={"pk": self.post.pk}))
+        self.assertTrue(detail.data["is_liked_by_user"])
+
+        self.assertEqual(flush_like_buffer(), 1)
+        self.assertTrue(PostLike.objects.filter(user=self.user, post=self.post).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(get_like_buffer().pending_for_user(self.user.pk), (set(), set()))
+
+    def test_last_action_wins_and_flush_is_batched(self):
+        PostLike.objects.create(user=self.trainer, post=self.post)
+        fans = [
+            User.objects.create_user(username=f"fan{i}", password="password123")
+            for i in range(3)
+        ]
+        for fan in fans:
+            self.client.force_authenticate(user=fan)
+            self.client.post(self.url)
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url)
+        self.client.delete(self.url)
+        self.client.force_authenticate(user=self.trainer)
+        self.client.delete(self.url)
+
+        # Посты и пользователи пачки, один INSERT, один DELETE, пересчет
+        # счетчика (+ SAVEPOINT / RELEASE транзакции)
+        with self.assertNumQueries(7):
+            self.assertEqual(flush_like_buffer(), 1)
+        self.assertEqual(
+            set(PostLike.objects.values_list("user_id", flat=True)),
+            {fan.pk for fan in fans},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 3)
+
+    def test_click_does_not_query_database(self):
+        url = reverse("post-like", kwargs={"post_pk": self.post.pk + 100})
+        with self.assertNumQueries(0):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        # Лайк несуществующего поста отбрасывается при записи
+        self.assertEqual(flush_like_buffer(), 0)
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_batch_taken_by_crashed_flush_is_recovered(self):
+        self.client.post(self.url)
+        buffer = get_like_buffer()
+        self.assertIn(self.post.pk, buffer.take(10))  # Воркер упал до ack()
+        self.assertEqual(buffer.take(10), {})
+
+        self.assertEqual(flush_like_buffer(), 1)
+        self.assertTrue(PostLike.objects.filter(user=self.user, post=self.post).exists())
+
+    def test_flush_command(self):
+        self.client.post(self.url)
+        out = StringIO()
+        call_command("flush_like_buffer", stdout=out)
+        self.assertIn("1 posts", out.getvalue())
+        self.assertEqual(PostLike.objects.count(), 1)
+
+
+class BatchInteractionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.trainers = []
+        for i in range(3):
+            trainer = User.objects.create_user(username=f"trainer{i}", password="password123")
+            trainer.profile.role = Profile.Role.TRAINER
+            trainer.profile.save()
+            self.trainers.append(trainer)
+        self.posts = [
+            Post.objects.create(author=self.trainers[0], content=f"Post {i}") for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_batch_like_and_unlike(self):
+        first, second, third = self.posts
+        PostLike.objects.create(user=self.user, post=second)
+        PostLike.objects.create(user=self.user, post=third)
+
+        # Посты, лайки пользователя, INSERT, DELETE, пересчет счетчиков
+        # (+ SAVEPOINT / RELEASE транзакции)
+        with self.assertNumQueries(7):
+            response = self.client.post(
+                reverse("post-like-batch"),
+                {"like": [first.pk, second.pk, 999], "unlike": [third.pk]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["status"] for item in response.data["results"]],
+            ["liked", "already_liked", "not_found", "unliked"],
+        )
+        self.assertEqual(
+            set(PostLike.objects.values_list("post_id", flat=True)), {first.pk, second.pk}
+        )
+        third.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual((first.likes_count, third.likes_count), (1, 0))
+
+    def test_batch_rejects_same_id_in_both_lists(self):
+        response = self.client.post(
+            reverse("post-like-batch"),
+            {"like": [self.posts[0].pk], "unlike": [self.posts[0].pk]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_follow_and_unfollow(self):
+        Follow.objects.create(follower=self.user, followed=self.trainers[2])
+        other = User.objects.create_user(username="user2", password="password123")
+        ids = [self.trainers[0].pk, self.trainers[1].pk, other.pk, self.user.pk]
+
+        response = self.client.post(
+            reverse("follow-batch"),
+            {"follow": ids, "unfollow": [self.trainers[2].pk]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"user": self.trainers[0].pk, "action": "follow", "status": "followed"},
+                {"user": self.trainers[1].pk, "action": "follow", "status": "followed"},
+                {"user": other.pk, "action": "follow", "status": "not_trainer"},
+                {"user": self.user.pk, "action": "follow", "status": "self"},
+                {"user": self.trainers[2].pk, "action": "unfollow", "status": "unfollowed"},
+            ],
+        )
+        self.assertEqual(
+            set(Follow.objects.filter(follower=self.user).values_list("followed_id", flat=True)),
+            {self.trainers[0].pk, self.trainers[1].pk},
+        )
+
+
+@override_settings(LIKED_POSTS_BACKEND="interactions.likes.InMemoryLikedPostsStore")
+class LikedPostsStoreTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_liked_posts_store().clear()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}") for i in range(3)
+        ]
+        PostLike.objects.create(user=self.user, post=self.posts[0])
+        self.post_ids = [post.pk for post in self.posts]
+
+    def test_warms_once_then_answers_without_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(liked_post_ids(self.user, self.post_ids), {self.posts[0].pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(liked_post_ids(self.user, self.post_ids), {self.posts[0].pk})
+
+    @patch("posts.tasks.publish_post_update_task.apply_async")
+    def test_like_and_unlike_update_warm_set_after_commit(self, apply_async):
+        liked_post_ids(self.user, self.post_ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            PostLike.objects.create(user=self.user, post=self.posts[1])
+            PostLike.objects.filter(user=self.user, post=self.posts[0]).delete()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(liked_post_ids(self.user, self.post_ids), {self.posts[1].pk})
+
+    def test_warm_overlapping_a_like_is_discarded(self):
+        store = get_liked_posts_store()
+        original = store.store
+
+        def store_then_like(user_id, post_ids):
+            original(user_id, post_ids)
+            # Лайк закоммичен между чтением из БД и проверкой версии
+            with self.captureOnCommitCallbacks(execute=True):
+                sync_liked_posts(user_id, added=[self.posts[2].pk])
+
+        with patch.object(store, "store", side_effect=store_then_like):
+            liked_post_ids(self.user, self.post_ids)
+        self.assertIsNone(store.get(self.user.pk, self.post_ids))
+
+    @override_settings(LIKED_POSTS_MAX_WARM=0)
+    def test_users_with_too_many_likes_are_not_cached(self):
+        liked_post_ids(self.user, self.post_ids)
+        self.assertIsNone(get_liked_posts_store().get(self.user.pk, self.post_ids))
+        with self.assertNumQueries(1):
+            self.assertEqual(liked_post_ids(self.user, self.post_ids), {self.posts[0].pk})
+
+
+@override_settings(FOLLOW_GRAPH_BACKEND="interactions.follow_graph.InMemoryFollowGraph")
+class FollowGraphTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_follow_graph().clear()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.trainers = []
+        for i in range(3):
+            trainer = User.objects.create_user(username=f"trainer{i}", password="password123")
+            trainer.profile.role = Profile.Role.TRAINER
+            trainer.profile.save()
+            self.trainers.append(trainer)
+        Follow.objects.create(follower=self.user, followed=self.trainers[0])
+        self.client.force_authenticate(user=self.user)
+
+    def test_warms_once_then_answers_without_queries(self):
+        ids = [trainer.pk for trainer in self.trainers]
+        with self.assertNumQueries(1):
+            self.assertEqual(following_among(self.user.pk, ids), {self.trainers[0].pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(following_among(self.user.pk, ids), {self.trainers[0].pk})
+            self.assertEqual(following_ids(self.user.pk), {self.trainers[0].pk})
+
+    @patch("posts.tasks.remove_author_from_timeline_task.delay")
+    @patch("posts.tasks.backfill_timeline_task.delay")
+    def test_follow_and_unfollow_keep_graph_in_sync(self, backfill, remove_author):
+        following_ids(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.user, followed=self.trainers[1])
+            Follow.objects.filter(follower=self.user, followed=self.trainers[0]).delete()
+        self.assertEqual(following_ids(self.user.pk), {self.trainers[1].pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("follow-batch"),
+                {"follow": [self.trainers[2].pk], "unfollow": [self.trainers[1].pk]},
+                format="json",
+            )
+        self.assertEqual(following_ids(self.user.pk), {self.trainers[2].pk})
+
+    def test_warm_overlapping_a_follow_is_discarded(self):
+        graph = get_follow_graph()
+        original = graph.store
+
+        def store_then_follow(user_id, author_ids):
+            original(user_id, author_ids)
+            # Подписка закоммичена между чтением из БД и проверкой версии
+            with self.captureOnCommitCallbacks(execute=True):
+                sync_following(user_id, added=[self.trainers[1].pk])
+
+        with patch.object(graph, "store", side_effect=store_then_follow):
+            following_ids(self.user.pk)
+        self.assertIsNone(graph.get(self.user.pk))
+
+    @patch("posts.tasks.remove_author_from_timeline_task.delay")
+    @patch("posts.tasks.backfill_timeline_task.delay")
+    def test_writes_do_not_trust_stale_graph(self, backfill, remove_author):
+        # Кеш утверждает обратное тому, что в таблице
+        get_follow_graph().store(self.user.pk, {self.trainers[1].pk})
+
+        url = reverse("follow-user", kwargs={"user_pk": self.trainers[1].pk})
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = reverse("unfollow-user", kwargs={"user_pk": self.trainers[0].pk})
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        get_follow_graph().store(self.user.pk, set())
+        response = self.client.post(
+            reverse("follow-batch"), {"unfollow": [self.trainers[1].pk]}, format="json"
+        )
+        self.assertEqual(response.data["results"][0]["status"], "unfollowed")
+        self.assertFalse(Follow.objects.filter(follower=self.user).exists())
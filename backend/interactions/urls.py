@@ -2,6 +2,7 @@
 from django.urls import path
 
 from .views import (
+    FollowBatchView,
     FollowCreateView,
     FollowDestroyView,
     FollowerListView,
@@ -9,6 +10,7 @@ from .views import (
 )
 
 urlpatterns = [
+    path("follow/batch/", FollowBatchView.as_view(), name="follow-batch"),
     path("follow/<int:user_pk>/", FollowCreateView.as_view(), name="follow-user"),
     path("unfollow/<int:user_pk>/", FollowDestroyView.as_view(), name="unfollow-user"),
     path(
@@ -1,15 +1,44 @@
 # interactions/views.py
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import generics, permissions, serializers, status, viewsets
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
+from core.pagination import KeysetPagination, OptionalKeysetPagination
 from core.permissions import IsAdminUser, IsAuthorOrReadOnly
+from core.serializers import is_field_requested
 from posts.models import Post
 
+from .batch import batch_follows, batch_likes
+from .like_buffer import buffer_like, get_like_buffer
 from .models import Comment, Follow, PostLike
-from .serializers import CommentSerializer, FollowSerializer, PostLikeSerializer
+from .serializers import (
+    CommentSerializer,
+    FollowBatchSerializer,
+    FollowerEntrySerializer,
+    FollowingEntrySerializer,
+    FollowSerializer,
+    LikeBatchSerializer,
+    PostLikeSerializer,
+)
+
+
+def select_user_relation(queryset, request, field):
+    """
+    select_related для вложенного пользователя с учетом ?fields=:
+    профиль JOIN'ится только если он (или avatar_url) попадет в ответ.
+    """
+    if is_field_requested(request, f"{field}.profile") or is_field_requested(
+        request, f"{field}.avatar_url"
+    ):
+        return queryset.select_related(f"{field}__profile")
+    if is_field_requested(request, field):
+        return queryset.select_related(field)
+    return queryset
 
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -18,6 +47,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     """
 
     serializer_class = CommentSerializer
+    pagination_class = OptionalKeysetPagination
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
         IsAuthorOrReadOnly | IsAdminUser,
@@ -27,13 +57,10 @@ class CommentViewSet(viewsets.ModelViewSet):
         # Возвращаем комментарии только для конкретного поста (если post_pk передан в URL)
         # или все комменты (для админки, например)
         post_pk = self.kwargs.get("post_pk")
+        queryset = select_user_relation(Comment.objects.all(), self.request, "author")
         if post_pk:
-            return Comment.objects.filter(post_id=post_pk).select_related(
-                "author__profile"
-            )
-        return Comment.objects.select_related(
-            "author__profile"
-        ).all()  # Для вложенных роутеров не нужно
+            return queryset.filter(post_id=post_pk)
+        return queryset  # Для вложенных роутеров не нужно
 
     def perform_create(self, serializer):
         # post_pk должен быть в URL (используем вложенные роутеры)
@@ -64,9 +91,16 @@ class FollowCreateView(generics.CreateAPIView):
         if not followed_user.profile.is_trainer:
             raise PermissionDenied("You can only follow trainers.")
 
-        follow, created = Follow.objects.get_or_create(
-            follower=follower, followed=followed_user
-        )
+        # Сразу INSERT: существующую подписку отклонит уникальный индекс, и
+        # только тогда она читается. Граф подписок здесь не спрашиваем — это
+        # кеш, и устаревший ответ превратился бы в 404
+        try:
+            with transaction.atomic():
+                follow = Follow.objects.create(follower=follower, followed=followed_user)
+            created = True
+        except IntegrityError:
+            follow = get_object_or_404(Follow, follower=follower, followed=followed_user)
+            created = False
 
         # Сериализуем результат
         serializer = self.get_serializer(follow)
@@ -78,6 +112,26 @@ class FollowCreateView(generics.CreateAPIView):
         return Response(serializer.data, status=status_code, headers=headers)
 
 
+class FollowBatchView(generics.GenericAPIView):
+    """
+    API endpoint to follow/unfollow several users at once:
+    {"follow": [ids], "unfollow": [ids]} -> {"results": [{"user", "action", "status"}]}.
+    """
+
+    serializer_class = FollowBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = batch_follows(
+            request.user,
+            serializer.validated_data["follow"],
+            serializer.validated_data["unfollow"],
+        )
+        return Response({"results": results})
+
+
 class FollowDestroyView(generics.DestroyAPIView):
     """
     API endpoint to unfollow a user.
@@ -95,29 +149,66 @@ class FollowDestroyView(generics.DestroyAPIView):
         )
 
 
+def compact_follow_entries(queryset, request, side):
+    """
+    Списки подписчиков / подписок: только `side` (другая сторона — пользователь
+    из URL) и только колонки компактного представления. ?since=<ISO datetime>
+    оставляет подписки новее указанного момента — дашборд забирает только
+    новых подписчиков.
+
+    Ограничение ?since: created_at присваивается при INSERT, а видна подписка
+    только после коммита. Подписка с более ранним created_at, закоммиченная
+    уже после опроса, в следующий ?since=<последний created_at> не попадет.
+    Id присваивается так же и водяным знаком не лучше, поэтому клиенту,
+    которому нужен каждый подписчик, следует опрашивать с перекрытием в
+    несколько секунд и отбрасывать уже виденные id.
+    """
+    since = request.query_params.get("since")
+    if since:
+        position = parse_datetime(since)
+        if position is None:
+            raise serializers.ValidationError({"since": "Expected an ISO 8601 datetime."})
+        if timezone.is_naive(position):
+            position = timezone.make_aware(position)
+        queryset = queryset.filter(created_at__gt=position)
+    return queryset.select_related(f"{side}__profile").only(
+        "id",
+        "created_at",
+        side,
+        f"{side}__username",
+        f"{side}__profile__avatar",
+        f"{side}__profile__avatar_status",
+    )
+
+
 class FollowingListView(generics.ListAPIView):
     """
     API endpoint to list users followed by a specific user (user_pk from URL).
+    Keyset-paginated by (created_at, id), newest first.
     """
 
-    serializer_class = FollowSerializer
+    serializer_class = FollowingEntrySerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]  # Доступно аутентифицированным
 
     def get_queryset(self):
         # Получаем user_pk из URL
         user_pk = self.kwargs.get("user_pk")
         user = get_object_or_404(User, pk=user_pk)
-        # Возвращаем список тех, на кого подписан user_pk
-        return Follow.objects.filter(follower=user).select_related("followed__profile")
+        # Возвращаем список тех, на кого подписан user_pk (индекс follower, created_at)
+        queryset = Follow.objects.filter(follower=user)
+        return compact_follow_entries(queryset, self.request, "followed")
 
 
 class FollowerListView(generics.ListAPIView):
     """
     API endpoint to list followers of a specific user (user_pk from URL).
     Optionally restricted to only show followers for trainers.
+    Keyset-paginated by (created_at, id), newest first.
     """
 
-    serializer_class = FollowSerializer
+    serializer_class = FollowerEntrySerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]  # Доступно аутентифицированным
 
     def get_queryset(self):
@@ -133,8 +224,9 @@ class FollowerListView(generics.ListAPIView):
                 "Only trainers have followers viewable via this endpoint."
             )
 
-        # Возвращаем список подписчиков user_pk
-        return Follow.objects.filter(followed=user).select_related("follower__profile")
+        # Возвращаем список подписчиков user_pk (индекс followed, created_at)
+        queryset = Follow.objects.filter(followed=user)
+        return compact_follow_entries(queryset, self.request, "follower")
 
 
 # --- Like Views ---
@@ -143,7 +235,23 @@ class PostLikeCreateDestroyView(generics.GenericAPIView):
     serializer_class = PostLikeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def buffered(self, buffer, liked):
+        """
+        Режим буфера (settings.LIKE_BUFFER_BACKEND): действие пишется в буфер,
+        в БД его перенесет flush_like_buffer. Ответ 202 для лайка и 204 для
+        анлайка независимо от текущего состояния. БД на клике не читается:
+        лайк несуществующего поста отбросит запись буфера.
+        """
+        post_pk = self.kwargs.get("post_pk")
+        buffer_like(buffer, self.request.user.pk, post_pk, liked)
+        if liked:
+            return Response({"post": post_pk, "liked": True}, status=status.HTTP_202_ACCEPTED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def post(self, request, *args, **kwargs):
+        buffer = get_like_buffer()
+        if buffer is not None:
+            return self.buffered(buffer, liked=True)
         post_pk = self.kwargs.get("post_pk")
         post = get_object_or_404(Post, pk=post_pk)
         like, created = PostLike.objects.get_or_create(user=request.user, post=post)
@@ -156,8 +264,31 @@ class PostLikeCreateDestroyView(generics.GenericAPIView):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
     def delete(self, request, *args, **kwargs):
+        buffer = get_like_buffer()
+        if buffer is not None:
+            return self.buffered(buffer, liked=False)
         post_pk = self.kwargs.get("post_pk")
         post = get_object_or_404(Post, pk=post_pk)
         like = get_object_or_404(PostLike, user=request.user, post=post)
         like.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class PostLikeBatchView(generics.GenericAPIView):
+    """
+    API endpoint to like/unlike several posts at once:
+    {"like": [ids], "unlike": [ids]} -> {"results": [{"post", "action", "status"}]}.
+    """
+
+    serializer_class = LikeBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = batch_likes(
+            request.user,
+            serializer.validated_data["like"],
+            serializer.validated_data["unlike"],
+        )
+        return Response({"results": results})
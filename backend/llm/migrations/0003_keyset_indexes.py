@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("llm", "0002_alter_conversationhistory_options_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="conversationhistory",
+            index=models.Index(
+                fields=["user", "-timestamp", "-id"],
+                name="conversation_user_recent_idx",
+            ),
+        ),
+    ]
@@ -15,6 +15,9 @@ class ConversationHistory(models.Model):
                 fields=["thread_id"]
             ),  # Индекс для быстрого поиска по thread_id
             models.Index(fields=["user"]),  # Добавляем индекс для пользователя
+            models.Index(
+                fields=["user", "-timestamp", "-id"], name="conversation_user_recent_idx"
+            ),  # Для keyset-пагинации истории пользователя
         ]
         ordering = ['-timestamp']  # Сортировка по умолчанию
 
@@ -6,6 +6,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from core.pagination import OptionalKeysetPagination
+
 from .models import ConversationHistory
 from .serializers import (
     ConversationHistorySerializer,
@@ -106,6 +108,8 @@ class UpdateAssistantResponseView(mixins.CreateModelMixin, viewsets.GenericViewS
 class ConversationHistoryViewSet(viewsets.ModelViewSet):
     serializer_class = ConversationHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptionalKeysetPagination
+    keyset_field = "timestamp"
 
     def get_queryset(self):
         # Возвращаем историю только для текущего пользователя
@@ -0,0 +1,110 @@
+"""
+Кеш сериализованных постов.
+
+Фрагмент — представление поста без полей, зависящих от пользователя
+(is_liked_by_user и т.п.), ключ:
+
+    post-fragment:<id>:<версия поста>:<версия автора>:<сигнатура запроса>
+
+Версия поста берется из самой строки (updated_at и счетчики, которые
+сигналы PostLike / Comment обновляют через UPDATE), версия автора — из
+core.conditional (поднимается при сохранении профиля). Поэтому фрагмент
+всегда соответствует загруженной строке, а устаревший просто перестает
+читаться — явно удалять ключи не нужно. Сигнатура учитывает ?fields= /
+?expand= и хост (в ответе абсолютные URL картинок).
+
+Первая страница общей ленты хранится как список id постов под версией
+"posts:list": ее поднимают только создание и удаление поста — лента
+сортируется по created_at, и другие изменения ни состав, ни порядок не
+меняют. Лайки и комментарии список не сбрасывают: версии постов для ключей
+фрагментов читаются на каждый запрос одним запросом по первичному ключу
+(current_refs), без сортировки и COUNT.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.conditional import get_versions
+from core.serializers import EXPAND_QUERY_PARAM, FIELDS_QUERY_PARAM
+
+from .models import Post
+
+FIRST_PAGE_TIMEOUT = 10 * 60
+
+
+def request_signature(request, field_path=""):
+    """field_path — где в ответе лежит пост (при ?expand=post набор полей другой)."""
+    if request is None:
+        return "-"
+    parts = [
+        field_path,
+        request.get_host(),
+        request.scheme,
+        request.query_params.get(FIELDS_QUERY_PARAM, ""),
+        request.query_params.get(EXPAND_QUERY_PARAM, ""),
+    ]
+    return hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+def post_ref(post):
+    """(post_id, author_id, версия поста) — все, что нужно для ключа фрагмента."""
+    version = f"{post.updated_at.timestamp()}-{post.likes_count}-{post.comments_count}"
+    return post.pk, post.author_id, version
+
+
+def fragment_keys(refs, signature):
+    """Возвращает {post_id: ключ} для ссылок из post_ref()."""
+    versions = get_versions(*{f"user:{author_id}" for _, author_id, _ in refs})
+    return {
+        post_id: (
+            f"post-fragment:{post_id}:{version}:"
+            f"{versions[f'user:{author_id}']}:{signature}"
+        )
+        for post_id, author_id, version in refs
+    }
+
+
+def get_fragments(refs, signature, render_missing):
+    """
+    {post_id: фрагмент} для всех refs. Промахи рендерит render_missing(post_ids)
+    (должен вернуть {post_id: фрагмент}) и сохраняет одним set_many.
+    """
+    keys = fragment_keys(refs, signature)
+    found = cache.get_many(list(keys.values()))
+    fragments = {post_id: found[key] for post_id, key in keys.items() if key in found}
+    missing = [post_id for post_id in keys if post_id not in fragments]
+    if missing:
+        rendered = render_missing(missing)
+        cache.set_many(
+            {keys[post_id]: data for post_id, data in rendered.items()},
+            settings.POST_FRAGMENT_CACHE_TIMEOUT,
+        )
+        fragments.update(rendered)
+    return fragments
+
+
+def first_page_key(page_size):
+    """
+    Ключ берется до запроса к БД: если пост появится, пока страница
+    считается, она сохранится под старой версией и не будет прочитана.
+    """
+    version = get_versions("posts:list")["posts:list"]
+    return f"post-list:first-page:{version}:{page_size}"
+
+
+def set_first_page(key, count, posts):
+    cache.set(
+        key,
+        {"count": count, "ids": [post.pk for post in posts]},
+        FIRST_PAGE_TIMEOUT,
+    )
+
+
+def current_refs(post_ids):
+    """post_ref() для постов из кеша первой страницы, в том же порядке."""
+    posts = Post.objects.filter(pk__in=post_ids).only(
+        "id", "author_id", "updated_at", "likes_count", "comments_count"
+    )
+    refs = {post.pk: post_ref(post) for post in posts}
+    return [refs[post_id] for post_id in post_ids if post_id in refs]
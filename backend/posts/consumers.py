@@ -0,0 +1,98 @@
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from interactions.likes import liked_post_ids
+
+from .realtime import author_group, post_group, timeline_group
+
+logger = logging.getLogger("platform")
+
+
+def followed_read_time_authors(user_id):
+    from interactions.follow_graph import following_among
+
+    from .timeline import get_fanout_on_read_author_ids
+
+    return following_among(user_id, get_fanout_on_read_author_ids())
+
+
+class PostEventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ws/posts/ — события постов вместо опроса /api/posts/ и комментариев.
+
+    После подключения пользователь сразу получает события своей ленты
+    подписок, включая посты fan-out-on-read авторов, на которых он подписан
+    в этот момент (их группы; новые подписки подхватятся при
+    переподключении); на посты подписывается сообщениями
+    {"action": "subscribe" | "unsubscribe", "post_ids": [...]}.
+
+    Ответ на subscribe несет liked_post_ids — какие из запрошенных постов
+    лайкнул пользователь (interactions.likes, одна проверка на всю пачку):
+    события post.update общие для группы и is_liked не содержат.
+    """
+
+    max_subscriptions = 200
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            # Посты доступны только аутентифицированным, как и в REST API
+            await self.close(code=4401)
+            return
+        self.post_groups = set()
+        self.timeline_group = timeline_group(user.pk)
+        self.author_groups = {
+            author_group(author_id)
+            for author_id in await database_sync_to_async(followed_read_time_authors)(user.pk)
+        }
+        for group in self.author_groups | {self.timeline_group}:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+        logger.info(f"WS connected: PostEventsConsumer for user {user.username}")
+
+    async def disconnect(self, code):
+        if not hasattr(self, "timeline_group"):
+            return
+        for group in self.post_groups | self.author_groups | {self.timeline_group}:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content):
+        action = content.get("action")
+        post_ids = content.get("post_ids")
+        if action not in ("subscribe", "unsubscribe"):
+            return await self.send_json({"error": 'Поле "action": subscribe или unsubscribe'})
+        if not isinstance(post_ids, list) or not all(
+            isinstance(post_id, int) and not isinstance(post_id, bool)
+            for post_id in post_ids
+        ):
+            return await self.send_json({"error": 'Поле "post_ids" — список id постов'})
+
+        groups = {post_group(post_id) for post_id in post_ids}
+        if action == "subscribe":
+            groups -= self.post_groups
+            if len(self.post_groups) + len(groups) > self.max_subscriptions:
+                return await self.send_json(
+                    {"error": f"Не больше {self.max_subscriptions} подписок на посты"}
+                )
+            for group in groups:
+                await self.channel_layer.group_add(group, self.channel_name)
+            self.post_groups |= groups
+            liked = await database_sync_to_async(liked_post_ids)(self.scope["user"], post_ids)
+        else:
+            groups &= self.post_groups
+            for group in groups:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            self.post_groups -= groups
+
+        response = {
+            "event": "subscriptions",
+            "post_ids": sorted(int(group.split(".")[1]) for group in self.post_groups),
+        }
+        if action == "subscribe":
+            response["liked_post_ids"] = sorted(liked)
+        await self.send_json(response)
+
+    async def realtime_event(self, event):
+        await self.send_json(event["payload"])
@@ -0,0 +1,19 @@
+from imagekit import ImageSpec, register
+from imagekit.processors import ResizeToFit
+
+from core.images import RenditionSet
+
+
+class PostImage(ImageSpec):
+    """Основное изображение поста; применяется в фоне, см. core.images."""
+
+    processors = [ResizeToFit(width=500, height=500)]
+    format = "JPEG"
+    options = {"quality": 95}
+
+
+register.generator("posts:post_image", PostImage)
+
+
+# Миниатюры для ленты и превью; полный размер — сам PostImage
+POST_IMAGE_RENDITIONS = RenditionSet("posts:post_image", widths=(160, 320), full_width=500)
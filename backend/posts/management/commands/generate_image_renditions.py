@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+
+from core.images import ImageStatus
+from posts.imagegenerators import POST_IMAGE_RENDITIONS
+from posts.models import Post
+from users.imagegenerators import AVATAR_RENDITIONS
+from users.models import Profile
+
+DEFAULT_BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates missing image renditions (thumbnails, WebP) for processed '
+        'post images and avatars, e.g. for files uploaded before renditions existed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of objects loaded per batch (default {DEFAULT_BATCH_SIZE}).',
+        )
+
+    def _generate(self, model, field_name, status_field, renditions, batch_size):
+        queryset = (
+            model.objects.filter(**{status_field: ImageStatus.READY})
+            .exclude(**{field_name: ''})
+            .order_by('pk')
+            .only('id', field_name)
+        )
+        done = 0
+        failed = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for instance in batch:
+                try:
+                    # Уже существующие файлы imagekit пропускает сам
+                    renditions.generate(getattr(instance, field_name))
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{model.__name__} {instance.pk}: {e}')
+        return done, failed
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for label, args in (
+            ('post images', (Post, 'image', 'image_status', POST_IMAGE_RENDITIONS)),
+            ('avatars', (Profile, 'avatar', 'avatar_status', AVATAR_RENDITIONS)),
+        ):
+            done, failed = self._generate(*args, batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'Renditions for {label}: {done} processed, {failed} failed.'
+            ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from interactions.models import Follow
+from posts.timeline import backfill_timeline
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Backfills materialized subscription timelines from existing follows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of follows processed per batch (default {DEFAULT_BATCH_SIZE}).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write(self.style.SUCCESS('Starting timelines rebuild...'))
+
+        follows = 0
+        entries = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Follow.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'follower_id', 'followed_id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            for _, follower_id, followed_id in batch:
+                entries += backfill_timeline(follower_id, followed_id)
+            follows += len(batch)
+            self.stdout.write(f'  processed {follows} follows...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Timelines rebuild finished: {follows} follows, {entries} entries.'
+        ))
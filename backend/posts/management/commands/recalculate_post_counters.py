@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.conditional import bump_versions
+from interactions.like_buffer import drifted_post_counters, reconcile_post_counters
+from posts.models import Post
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Repairs drift in the denormalized likes_count / comments_count of posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of posts checked per batch (default {DEFAULT_BATCH_SIZE}).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write(self.style.SUCCESS('Starting post counters reconciliation...'))
+
+        checked = 0
+        fixed = 0
+        last_pk = 0
+        while True:
+            # Keyset по pk: каждая пачка стоит одинаково, независимо от глубины
+            post_ids = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not post_ids:
+                break
+            last_pk = post_ids[-1]
+
+            # Поиск расхождений без блокировок
+            drifted = list(
+                Post.objects.filter(pk__in=post_ids)
+                .filter(drifted_post_counters())
+                .values_list('pk', flat=True)
+            )
+            updated = 0
+            if drifted:
+                # Как в recalculate_follow_counts: строки сначала блокируются, и
+                # только следующий запрос считает COUNT. Лайк, уже сдвинувший
+                # счетчик через F(), к этому моменту закоммичен и попадает в
+                # COUNT, а ждущий блокировку сдвинет исправленное значение
+                with transaction.atomic():
+                    list(
+                        Post.objects.select_for_update()
+                        .filter(pk__in=drifted)
+                        .order_by('pk')
+                        .values_list('pk', flat=True)
+                    )
+                    updated = reconcile_post_counters(drifted)
+                if updated:
+                    bump_versions('posts')
+            checked += len(post_ids)
+            fixed += updated
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Post counters reconciliation finished: checked {checked}, fixed {fixed}.'
+        ))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.trending import recalculate_trending_scores
+
+LAST_RUN_CACHE_KEY = 'trending:last-run'
+# Перекрытие с прошлым запуском, чтобы не потерять активность на границе
+RUN_OVERLAP = timedelta(minutes=1)
+
+
+class Command(BaseCommand):
+    help = 'Recalculates time-decayed trending scores for recently active posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recalculate every post active within the trending window, '
+                 'not only posts active since the previous run.',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        last_run = None if options['full'] else cache.get(LAST_RUN_CACHE_KEY)
+        since = last_run - RUN_OVERLAP if last_run else None
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Starting trending scores calculation (since {since or 'window start'})..."
+        ))
+        updated = recalculate_trending_scores(since=since, now=now)
+        cache.set(LAST_RUN_CACHE_KEY, now, None)
+        self.stdout.write(self.style.SUCCESS(f'Trending scores updated for {updated} posts.'))
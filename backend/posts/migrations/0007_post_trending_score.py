@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0006_keyset_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="last_activity_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Последняя активность"
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="trending_score",
+            field=models.FloatField(default=0, verbose_name="Trending score"),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["-trending_score", "-id"], name="post_trending_idx"
+            ),
+        ),
+    ]
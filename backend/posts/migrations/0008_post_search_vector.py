@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+from core.migration_operations import AddPostgresIndex, RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0007_post_trending_score"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        AddPostgresIndex(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="post_search_vector_idx"
+            ),
+        ),
+        # Заполняем вектор для существующих постов (веса как в posts.search)
+        RunPostgresSQL(
+            sql="""
+                UPDATE posts_post AS p
+                SET search_vector =
+                    setweight(to_tsvector('simple', coalesce(p.content, '')), 'A')
+                    || setweight(to_tsvector('simple', coalesce(u.username, '')), 'B')
+                FROM auth_user AS u
+                WHERE u.id = p.author_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    # Загруженные раньше файлы уже обработаны ProcessedImageField
+    Post = apps.get_model("posts", "post")
+    Post.objects.exclude(image__isnull=True).exclude(image="").update(
+        image_status="ready"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0008_post_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="image_status",
+            field=models.CharField(
+                choices=[
+                    ("none", "Нет изображения"),
+                    ("processing", "Обрабатывается"),
+                    ("ready", "Готово"),
+                    ("failed", "Ошибка обработки"),
+                ],
+                default="none",
+                max_length=10,
+                verbose_name="Статус изображения",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to="post_images/",
+                verbose_name="Изображение",
+            ),
+        ),
+        migrations.RunPython(mark_existing_images_ready, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,38 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from imagekit.models import ProcessedImageField
-from imagekit.processors import ResizeToFit
+
+from core.images import ImageStatus
 
 
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     content = models.TextField(verbose_name="Содержание")
-    image = ProcessedImageField(
+    # Сохраняется как есть, ресайз — в фоне (posts.imagegenerators.PostImage)
+    image = models.ImageField(
         upload_to="post_images/",
-        processors=[ResizeToFit(width=500, height=500)],
-        format="JPEG",
-        options={"quality": 95},
         null=True,
         blank=True,
         verbose_name="Изображение",
     )
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.NONE,
+        verbose_name="Статус изображения",
+    )
+    # Денормализованные счетчики, поддерживаются сигналами interactions
+    likes_count = models.PositiveIntegerField(default=0, verbose_name="Лайки")
+    comments_count = models.PositiveIntegerField(default=0, verbose_name="Комментарии")
+    # Время последнего лайка/комментария — по нему пересчитывается trending
+    last_activity_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Последняя активность"
+    )
+    # Логарифмический score с экспоненциальным затуханием, см. posts.trending
+    trending_score = models.FloatField(default=0, verbose_name="Trending score")
+    # tsvector по content + username автора (только PostgreSQL), см. posts.search
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
@@ -24,5 +41,50 @@ class Post(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Для keyset-пагинации ленты и ленты автора по (created_at, id)
+            models.Index(fields=["-created_at", "-id"], name="post_recent_idx"),
+            models.Index(
+                fields=["author", "-created_at", "-id"], name="post_author_recent_idx"
+            ),
+            # Топ-N trending — обычный index scan
+            models.Index(fields=["-trending_score", "-id"], name="post_trending_idx"),
+            GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+        ]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок: одна строка на (подписчик, пост).
+    Заполняется fan-out'ом при публикации поста (см. posts.timeline).
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    # Копия Post.created_at, чтобы сортировка ленты шла по одному индексу
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-post"], name="timeline_user_recent_idx"
+            ),
+            models.Index(fields=["user", "author"], name="timeline_user_author_idx"),
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+
+    def __str__(self):
+        return f"Пост {self.post_id} в ленте {self.user_id}"
@@ -0,0 +1,155 @@
+"""
+События постов в реальном времени (WebSocket, см. posts.consumers).
+
+Группы channel layer:
+  - post.<id>            — изменения поста (счетчики, новые комментарии,
+                           удаление); клиент подписывается на посты, которые
+                           сейчас на экране;
+  - user.<id>.timeline   — новые посты в ленте подписок пользователя;
+  - author.<id>.posts    — новые посты fan-out-on-read автора (posts.timeline):
+                           по лентам они не раскладываются, поэтому подписчик
+                           при подключении входит в группы таких авторов.
+
+Отправка идет из Celery-воркеров, поэтому в production слой должен быть
+общим для процессов (channels_redis, CHANNEL_REDIS_URLS).
+
+Изменения одного поста склеиваются: первое событие открывает окно
+(ключ в кеше + отложенная на REALTIME_COALESCE_SECONDS задача), остальные
+в пределах окна ничего не отправляют. Задача читает актуальные счетчики из
+строки поста и id комментариев, созданных с начала окна, и шлет в группу
+одно сообщение — популярный пост дает не больше одного сообщения за окно,
+сколько бы лайков он ни собрал. Счетчики в сообщении абсолютные, поэтому
+потерянное или повторное сообщение ничего не ломает.
+"""
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+EVENT_TYPE = "realtime.event"  # -> PostEventsConsumer.realtime_event
+PENDING_KEY = "realtime:post:{}:pending"
+MAX_COMMENT_IDS = 20
+
+
+def post_group(post_id):
+    return f"post.{post_id}"
+
+
+def timeline_group(user_id):
+    return f"user.{user_id}.timeline"
+
+
+def author_group(author_id):
+    return f"author.{author_id}.posts"
+
+
+def send_to_groups(groups, payload):
+    """
+    Отправляет payload в группы одним проходом event loop'а. Переполненный
+    канал (клиент не успевает читать) слой пропускает молча, не прерывая
+    рассылку остальным: событие для него теряется, а счетчики придут со
+    следующим. Потери считает core.channel_layers.
+    """
+    groups = list(groups)
+    layer = get_channel_layer()
+    if layer is None or not groups:
+        return
+
+    async def send_all():
+        for group in groups:
+            await layer.group_send(group, {"type": EVENT_TYPE, "payload": payload})
+
+    async_to_sync(send_all)()
+
+
+def queue_post_update(post_id, since=None):
+    """
+    Вызывается из сигналов. `since` — с какого момента искать новые
+    комментарии (created_at комментария, открывшего окно).
+    """
+    since = since or timezone.now()
+    transaction.on_commit(partial(open_coalesce_window, post_id, since.timestamp()))
+
+
+def open_coalesce_window(post_id, since):
+    """Возвращает True, если окно открыто этим вызовом и отправка запланирована."""
+    from .tasks import publish_post_update_task
+
+    window = settings.REALTIME_COALESCE_SECONDS
+    # Ключ живет дольше окна: если задача потеряется, пост «замолчит»
+    # только до истечения ключа
+    if not cache.add(PENDING_KEY.format(post_id), since, window * 30):
+        return False
+    publish_post_update_task.apply_async((post_id,), countdown=window)
+    return True
+
+
+def publish_post_update(post_id):
+    from interactions.models import Comment
+
+    from .models import Post
+
+    key = PENDING_KEY.format(post_id)
+    since = cache.get(key)
+    # Закрываем окно до чтения из БД: событие после этой точки откроет новое
+    cache.delete(key)
+
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values("likes_count", "comments_count", "updated_at")
+        .first()
+    )
+    if row is None:
+        return False
+    comment_ids = []
+    if since is not None:
+        comment_ids = list(
+            Comment.objects.filter(
+                post_id=post_id,
+                created_at__gte=datetime.fromtimestamp(since, tz=dt_timezone.utc),
+            )
+            .order_by("id")
+            .values_list("id", flat=True)[:MAX_COMMENT_IDS]
+        )
+    send_to_groups(
+        [post_group(post_id)],
+        {
+            "event": "post.update",
+            "post_id": post_id,
+            "likes_count": row["likes_count"],
+            "comments_count": row["comments_count"],
+            "new_comment_ids": comment_ids,
+            "updated_at": row["updated_at"].isoformat(),
+        },
+    )
+    return True
+
+
+def publish_post_deleted(post_id):
+    send_to_groups([post_group(post_id)], {"event": "post.deleted", "post_id": post_id})
+
+
+def timeline_post_payload(post):
+    return {
+        "event": "timeline.post",
+        "post_id": post.pk,
+        "author_id": post.author_id,
+        "created_at": post.created_at.isoformat(),
+    }
+
+
+def publish_timeline_post(user_ids, post):
+    """Новый пост в лентах `user_ids` (вызывается fan-out'ом после записи в ленты)."""
+    send_to_groups(
+        [timeline_group(user_id) for user_id in user_ids], timeline_post_payload(post)
+    )
+
+
+def publish_author_post(post):
+    """Новый пост fan-out-on-read автора: одно сообщение в группу автора."""
+    send_to_groups([author_group(post.author_id)], timeline_post_payload(post))
@@ -0,0 +1,7 @@
+from django.urls import re_path
+
+from .consumers import PostEventsConsumer
+
+websocket_urlpatterns = [
+    re_path(r"ws/posts/$", PostEventsConsumer.as_asgi()),
+]
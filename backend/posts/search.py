@@ -0,0 +1,98 @@
+"""
+Полнотекстовый поиск по постам на PostgreSQL.
+
+Post.search_vector содержит content (вес A) и username автора (вес B) и
+обновляется при сохранении поста, а при смене username — у всех постов
+автора (update_author_search_vectors); по нему построен GIN-индекс, так что
+поиск не зависит от размера таблицы. На других СУБД (SQLite в тестах)
+используется обычный SearchFilter с icontains.
+"""
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connections
+from django.db.models import F, Value
+from rest_framework import filters
+
+from .models import Post
+
+SEARCH_CONFIG = "simple"  # Контент на нескольких языках, без стемминга
+HIGHLIGHT_PARAM = "highlight"
+
+
+def supports_full_text(using="default"):
+    return connections[using].vendor == "postgresql"
+
+
+def post_search_vector(username):
+    return SearchVector("content", weight="A", config=SEARCH_CONFIG) + SearchVector(
+        Value(username), weight="B", config=SEARCH_CONFIG
+    )
+
+
+def update_search_vector(post):
+    if supports_full_text(post._state.db or "default"):
+        Post.objects.filter(pk=post.pk).update(
+            search_vector=post_search_vector(post.author.username)
+        )
+
+
+def update_author_search_vectors(author_id, batch_size=1000):
+    """Пересчитывает search_vector всех постов автора пачками по pk."""
+    from django.contrib.auth.models import User
+
+    if not supports_full_text():
+        return 0
+    username = User.objects.filter(pk=author_id).values_list("username", flat=True).first()
+    if username is None:
+        return 0
+    updated = 0
+    last_pk = 0
+    while True:
+        pks = list(
+            Post.objects.filter(author_id=author_id, pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            return updated
+        last_pk = pks[-1]
+        updated += Post.objects.filter(pk__in=pks).update(
+            search_vector=post_search_vector(username)
+        )
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    `?search=` через tsvector + GIN с ранжированием SearchRank
+    (если клиент не задал ?ordering=) и `?highlight=1` для SearchHeadline.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not supports_full_text(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        terms = request.query_params.get(self.search_param, "").strip()
+        if not terms:
+            return queryset
+
+        query = SearchQuery(terms, search_type="websearch", config=SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=query)
+        if filters.OrderingFilter.ordering_param not in request.query_params:
+            queryset = queryset.annotate(
+                search_rank=SearchRank(F("search_vector"), query)
+            ).order_by("-search_rank", "-id")
+        if request.query_params.get(HIGHLIGHT_PARAM):
+            queryset = queryset.annotate(
+                search_headline=SearchHeadline(
+                    "content",
+                    query,
+                    config=SEARCH_CONFIG,
+                    start_sel="<mark>",
+                    stop_sel="</mark>",
+                )
+            )
+        return queryset
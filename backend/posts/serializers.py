@@ -1,15 +1,48 @@
+from functools import partial
+
+from django.db import models
 from rest_framework import serializers
 
-from users.serializers import UserSerializer
+from core.images import ImageStatus
+from core.loaders import MembershipLoader, get_context_loader
+from core.serializers import DynamicFieldsMixin
+from core.uploads import attach_upload, confirm_upload
+from interactions.likes import liked_post_ids
+from users.serializers import UserSerializer, get_followed_users_loader, prime_followed_users
 
+from .cache import get_fragments, post_ref, request_signature
+from .imagegenerators import POST_IMAGE_RENDITIONS
 from .models import Post
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Список постов собирается из кеша фрагментов (posts.cache); is_liked_by_user
+    и author.is_followed_by_me для всей страницы узнаются одним запросом
+    (или из кеша) и накладываются поверх.
+    """
+
+    def to_representation(self, data):
+        posts = data.all() if isinstance(data, models.manager.BaseManager) else data
+        by_id = {post.pk: post for post in posts}
+        return self.child.represent_many(
+            [post_ref(post) for post in by_id.values()],
+            lambda post_ids: [by_id[post_id] for post_id in post_ids],
+            instances=by_id,
+        )
+
+
+class PostSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    likes_count = serializers.SerializerMethodField(read_only=True)
     is_liked_by_user = serializers.SerializerMethodField(read_only=True)
-    comments_count = serializers.SerializerMethodField(read_only=True)
+    # Миниатюры в JPEG и WebP для srcset; None, пока изображение обрабатывается
+    image_renditions = serializers.SerializerMethodField(read_only=True)
+    # Ключ файла, загруженного напрямую в storage (core.uploads), вместо multipart
+    image_key = serializers.CharField(write_only=True, required=False)
+
+    # Зависят от пользователя или запроса — не кешируются во фрагменте
+    # (как и author.is_followed_by_me)
+    user_fields = ("is_liked_by_user",)
 
     class Meta:
         model = Post
@@ -18,6 +51,9 @@ class PostSerializer(serializers.ModelSerializer):
             "author",
             "content",
             "image",
+            "image_key",
+            "image_renditions",
+            "image_status",
             "created_at",
             "updated_at",
             "likes_count",
@@ -27,28 +63,123 @@ class PostSerializer(serializers.ModelSerializer):
         read_only_fields = [
             "id",
             "author",
+            "image_renditions",
+            "image_status",
             "created_at",
             "updated_at",
             "likes_count",
             "is_liked_by_user",
             "comments_count",
         ]
+        list_serializer_class = PostListSerializer
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+    def get_liked_posts_loader(self):
+        request = self.context.get("request")
+        user = getattr(request, "user", None)
+        if not user or not user.is_authenticated:
+            return None
+        return get_context_loader(
+            self.context,
+            "liked_posts",
+            lambda: MembershipLoader(partial(liked_post_ids, user)),
+        )
 
-    def get_is_liked_by_user(self, obj):
-        # Получаем текущего пользователя из контекста запроса
-        user = self.context.get("request").user
+    def is_liked(self, post_id):
+        # Загрузчик общий на запрос: для списка он уже заполнен одним запросом
+        loader = self.get_liked_posts_loader()
         # Если пользователь не аутентифицирован, он не мог лайкнуть
-        if not user or not user.is_authenticated:
+        if loader is None:
             return False
-        # Проверяем, существует ли лайк от этого пользователя для этого поста
-        return obj.likes.filter(user=user).exists()
-    
-    def get_comments_count(self, obj):
-        # obj - это экземпляр Post
-        # Предполагаем, что у модели Post есть related_name='comments' от модели Comment
-        if hasattr(obj, 'comments'):
-            return obj.comments.count()
-        return 0
\ No newline at end of file
+        return loader.contains(post_id)
+
+    def get_is_liked_by_user(self, obj):
+        return self.is_liked(obj.pk)
+
+    def validate_image_key(self, value):
+        return confirm_upload(self.context["request"].user, "post_image", value)
+
+    def validate(self, attrs):
+        if attrs.get("image") and attrs.get("image_key"):
+            raise serializers.ValidationError("Pass either image or image_key, not both.")
+        return attrs
+
+    def create(self, validated_data):
+        image_key = validated_data.pop("image_key", None)
+        if image_key is None:
+            return super().create(validated_data)
+        post = Post(**validated_data)
+        attach_upload(post, "image", image_key)
+        post.save()
+        return post
+
+    def update(self, instance, validated_data):
+        image_key = validated_data.pop("image_key", None)
+        if image_key is not None:
+            attach_upload(instance, "image", image_key)
+        return super().update(instance, validated_data)
+
+    def get_image_renditions(self, obj):
+        if not obj.image or obj.image_status != ImageStatus.READY:
+            return None
+        request = self.context.get("request")
+        return POST_IMAGE_RENDITIONS.urls(
+            obj.image, request.build_absolute_uri if request else None
+        )
+
+    def to_shared_representation(self, instance):
+        data = super().to_representation(instance)
+        for name in self.user_fields:
+            data.pop(name, None)
+        if isinstance(data.get("author"), dict):
+            data["author"].pop("is_followed_by_me", None)
+        return data
+
+    def add_user_fields(self, data, post_id, instance=None, author_id=None):
+        if "is_liked_by_user" in self.fields:
+            data["is_liked_by_user"] = self.is_liked(post_id)
+        author = self.fields.get("author")
+        if author is not None and "is_followed_by_me" in author.fields:
+            loader = get_followed_users_loader(self.context)
+            data["author"] = {
+                **data["author"],
+                "is_followed_by_me": loader is not None and loader.contains(author_id),
+            }
+        # Фрагмент с подсветкой есть только при ?search=...&highlight=1 на PostgreSQL
+        headline = getattr(instance, "search_headline", None)
+        if headline is not None:
+            data["search_headline"] = headline
+        return data
+
+    def represent_many(self, refs, load_posts, instances=None):
+        """
+        Представления постов по ссылкам posts.cache.post_ref(). Общая часть
+        берется из кеша фрагментов, промахи загружаются load_posts(post_ids)
+        и сериализуются, пользовательские поля накладываются поверх.
+        Посты, которых уже нет в БД, пропускаются.
+        """
+        instances = dict(instances or {})
+        loader = self.get_liked_posts_loader()
+        # Если ?fields= не включает is_liked_by_user, запрос не нужен
+        if loader is not None and "is_liked_by_user" in self.fields:
+            loader.prime(post_id for post_id, _, _ in refs)
+        prime_followed_users(self.fields.get("author"), [author_id for _, author_id, _ in refs])
+
+        def render_missing(post_ids):
+            posts = load_posts(post_ids)
+            instances.update((post.pk, post) for post in posts)
+            return {post.pk: self.to_shared_representation(post) for post in posts}
+
+        signature = request_signature(self.context.get("request"), self.get_field_path())
+        fragments = get_fragments(refs, signature, render_missing)
+        return [
+            self.add_user_fields(
+                dict(fragments[post_id]), post_id, instances.get(post_id), author_id
+            )
+            for post_id, author_id, _ in refs
+            if post_id in fragments
+        ]
+
+    def to_representation(self, instance):
+        return self.represent_many(
+            [post_ref(instance)], lambda post_ids: [instance], {instance.pk: instance}
+        )[0]
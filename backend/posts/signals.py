@@ -0,0 +1,68 @@
+# posts/signals.py
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.conditional import bump_versions
+from core.images import mark_image_upload
+
+from .models import Post
+from .realtime import publish_post_deleted, queue_post_update
+from .search import update_search_vector
+from .tasks import (
+    fan_out_post_task,
+    process_post_image_task,
+    remove_post_from_timelines_task,
+    update_author_search_vectors_task,
+)
+
+
+@receiver(pre_save, sender=Post)
+def post_image_uploaded(sender, instance, **kwargs):
+    instance._image_uploaded = mark_image_upload(instance, "image", "image_status")
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    if kwargs.get("update_fields") is None or "content" in kwargs["update_fields"]:
+        update_search_vector(instance)
+    bump_versions("posts")
+    if getattr(instance, "_image_uploaded", False):
+        instance._image_uploaded = False
+        transaction.on_commit(partial(process_post_image_task.delay, instance.pk))
+    if created:
+        # Новый пост меняет состав общей ленты (posts.cache)
+        bump_versions("posts:list")
+        # Fan-out только после коммита, иначе воркер может не увидеть пост
+        transaction.on_commit(partial(fan_out_post_task.delay, instance.pk))
+    else:
+        queue_post_update(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_removed(sender, instance, **kwargs):
+    bump_versions("posts", "posts:list")
+    transaction.on_commit(
+        partial(remove_post_from_timelines_task.delay, instance.pk, instance.author_id)
+    )
+    transaction.on_commit(partial(publish_post_deleted, instance.pk))
+
+
+@receiver(pre_save, sender=User)
+def author_username_changing(sender, instance, update_fields=None, **kwargs):
+    # username входит в search_vector постов автора (posts.search)
+    if instance.pk is None or (update_fields is not None and "username" not in update_fields):
+        instance._username_changed = False
+        return
+    old = User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    instance._username_changed = old is not None and old != instance.username
+
+
+@receiver(post_save, sender=User)
+def author_username_changed(sender, instance, created, **kwargs):
+    if getattr(instance, "_username_changed", False):
+        instance._username_changed = False
+        transaction.on_commit(partial(update_author_search_vectors_task.delay, instance.pk))
@@ -0,0 +1,159 @@
+from celery import shared_task
+from django.core.management import call_command
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="recalculate_post_counters")
+def recalculate_post_counters_task():
+    """
+    Celery задача для запуска recalculate_post_counters.
+    """
+    try:
+        logger.info("Starting scheduled post counters reconciliation...")
+        call_command('recalculate_post_counters')
+        logger.info("Successfully finished post counters reconciliation.")
+    except Exception as e:
+        logger.error(f"Error during post counters reconciliation: {e}", exc_info=True)
+
+
+@shared_task(name="fan_out_post")
+def fan_out_post_task(post_id):
+    """
+    Раскладывает новый пост по лентам подписчиков автора.
+    """
+    from .timeline import fan_out_post
+
+    delivered = fan_out_post(post_id)
+    logger.info(f"Post {post_id} delivered to {delivered} timelines.")
+
+
+@shared_task(name="backfill_timeline")
+def backfill_timeline_task(user_id, author_id):
+    """
+    Добавляет последние посты автора в ленту после подписки.
+    """
+    from .timeline import backfill_timeline
+
+    backfill_timeline(user_id, author_id)
+
+
+@shared_task(name="backfill_followers")
+def backfill_followers_task(author_id):
+    """
+    Раскладывает посты автора по лентам подписчиков после выхода из fan-out-on-read.
+    """
+    from .timeline import backfill_followers
+
+    delivered = backfill_followers(author_id)
+    logger.info(f"Author {author_id} backfilled into {delivered} timelines.")
+
+
+@shared_task(name="remove_author_from_timeline")
+def remove_author_from_timeline_task(user_id, author_id):
+    """
+    Убирает посты автора из ленты после отписки.
+    """
+    from .timeline import remove_author_from_timeline
+
+    remove_author_from_timeline(user_id, author_id)
+
+
+@shared_task(name="remove_post_from_timelines")
+def remove_post_from_timelines_task(post_id, author_id):
+    """
+    Убирает удаленный пост из лент подписчиков.
+    """
+    from .timeline import remove_post_from_timelines
+
+    remove_post_from_timelines(post_id, author_id)
+
+
+@shared_task(name="trim_timelines")
+def trim_timelines_task():
+    """
+    Обрезает ленты подписок до TIMELINE_MAX_LENGTH записей.
+    """
+    from .timeline import trim_timelines
+
+    try:
+        trim_timelines()
+    except Exception as e:
+        logger.error(f"Error during timelines trimming: {e}", exc_info=True)
+
+
+@shared_task(name="cleanup_direct_uploads")
+def cleanup_direct_uploads_task():
+    """
+    Удаляет прямые загрузки в storage, которые так и не прикрепили (core.uploads).
+    """
+    from core.uploads import cleanup_direct_uploads
+
+    try:
+        deleted = cleanup_direct_uploads()
+        logger.info(f"Deleted {deleted} unattached direct uploads.")
+    except Exception as e:
+        logger.error(f"Error during direct uploads cleanup: {e}", exc_info=True)
+
+
+@shared_task(name="recalculate_trending_scores")
+def recalculate_trending_scores_task():
+    """
+    Celery задача для запуска recalculate_trending_scores.
+    """
+    try:
+        call_command('recalculate_trending_scores')
+    except Exception as e:
+        logger.error(f"Error during trending scores calculation: {e}", exc_info=True)
+
+
+@shared_task(name="update_author_search_vectors")
+def update_author_search_vectors_task(author_id):
+    """
+    Пересчитывает поисковый вектор постов автора после смены username.
+    """
+    from .search import update_author_search_vectors
+
+    updated = update_author_search_vectors(author_id)
+    logger.info(f"Search vectors of {updated} posts by author {author_id} updated.")
+
+
+@shared_task(name="process_post_image")
+def process_post_image_task(post_id):
+    """
+    Ресайз загруженного изображения поста и атомарная подмена файла.
+    """
+    from django.utils import timezone
+
+    from core.conditional import bump_versions
+    from core.images import process_image
+
+    from .imagegenerators import POST_IMAGE_RENDITIONS
+    from .models import Post
+
+    # updated_at меняется, чтобы фрагменты поста в кеше (posts.cache) обновились
+    if process_image(
+        Post,
+        post_id,
+        "image",
+        "image_status",
+        "posts.imagegenerators.PostImage",
+        renditions=POST_IMAGE_RENDITIONS,
+        extra_updates={"updated_at": timezone.now()},
+    ):
+        bump_versions("posts")
+
+
+@shared_task(name="publish_post_update")
+def publish_post_update_task(post_id):
+    """
+    Отправляет склеенные за окно изменения поста подписчикам WebSocket.
+    """
+    from .realtime import publish_post_update
+
+    try:
+        publish_post_update(post_id)
+    except Exception as e:
+        logger.error(f"Error publishing update for post {post_id}: {e}", exc_info=True)
+
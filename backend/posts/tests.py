@@ -1,11 +1,52 @@
-from django.contrib.auth.models import User
+import json
+import logging
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from core.channel_layers import REDIS_OVER_CAPACITY_MESSAGE, dropped_message_count
+from core.conditional import get_versions
+from core.images import ImageStatus, processed_name
+from core.uploads import cleanup_direct_uploads
+from interactions.models import Comment, Follow, PostLike
 from users.models import Profile
 
-from .models import Post
+from .cache import first_page_key
+from .consumers import PostEventsConsumer
+from .imagegenerators import POST_IMAGE_RENDITIONS, PostImage
+from .models import Post, TimelineEntry
+from .realtime import post_group, publish_post_update, publish_timeline_post, timeline_group
+from .tasks import process_post_image_task
+from .search import update_author_search_vectors
+from .trending import recalculate_trending_scores, score_from_events
+from .timeline import (
+    backfill_timeline,
+    fan_out_post,
+    get_timeline_backend,
+    remove_author_from_timeline,
+    remove_post_from_timelines,
+    trim_timelines,
+)
 
 
 class PostViewSetTests(APITestCase):
@@ -142,3 +183,987 @@ class PostViewSetTests(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(Post.objects.count(), 3)  # Пост не должен удалиться
+
+
+class PostCounterTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(
+            username="trainer1", password="password123"
+        )
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.post = Post.objects.create(author=self.trainer, content="Counted post")
+
+    def test_like_and_unlike_update_likes_count(self):
+        like = PostLike.objects.create(user=self.user, post=self.post)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comment_create_and_delete_update_comments_count(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, content="Nice"
+        )
+        Comment.objects.create(post=self.post, author=self.trainer, content="Thanks")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_serializer_reads_stored_counters(self):
+        PostLike.objects.create(user=self.user, post=self.post)
+        Comment.objects.create(post=self.post, author=self.user, content="Nice")
+        url = reverse("post-detail", kwargs={"pk": self.post.pk})
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["likes_count"], 1)
+        self.assertEqual(response.data["comments_count"], 1)
+
+    def test_recalculate_post_counters_repairs_drift(self):
+        PostLike.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=42, comments_count=7)
+
+        version = get_versions("posts")["posts"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("recalculate_post_counters", batch_size=1, stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.comments_count, 0)
+        # Закешированные страницы с устаревшими счетчиками инвалидируются
+        self.assertNotEqual(get_versions("posts")["posts"], version)
+
+    def test_recalculate_post_counters_skips_consistent_posts(self):
+        PostLike.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=1, comments_count=0)
+        version = get_versions("posts")["posts"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("recalculate_post_counters", stdout=StringIO())
+
+        self.assertEqual(get_versions("posts")["posts"], version)
+
+
+class SubscriptionsTimelineTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(
+            username="trainer1", password="password123"
+        )
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.other_trainer = User.objects.create_user(
+            username="trainer2", password="password123"
+        )
+        self.other_trainer.profile.role = Profile.Role.TRAINER
+        self.other_trainer.profile.save()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        Follow.objects.create(follower=self.user, followed=self.trainer)
+        self.url = reverse("post-subscriptions")
+
+    def _result_ids(self, response):
+        return [item["id"] for item in response.data["results"]]
+
+    def test_fan_out_delivers_post_to_followers(self):
+        post = Post.objects.create(author=self.trainer, content="For followers")
+        Post.objects.create(author=self.other_trainer, content="Not followed")
+
+        self.assertEqual(fan_out_post(post.pk), 1)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._result_ids(response), [post.pk])
+
+    def test_backfill_and_unfollow_prune(self):
+        older = Post.objects.create(author=self.other_trainer, content="Older post")
+        Follow.objects.create(follower=self.user, followed=self.other_trainer)
+
+        backfill_timeline(self.user.pk, self.other_trainer.pk)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=older).exists()
+        )
+
+        remove_author_from_timeline(self.user.pk, self.other_trainer.pk)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_large_author_is_served_on_read(self):
+        Profile.objects.filter(user=self.trainer).update(fanout_on_read=True)
+        post = Post.objects.create(author=self.trainer, content="Celebrity post")
+
+        # Автор выше порога: fan-out не делается, пост подмешивается при чтении
+        self.assertEqual(fan_out_post(post.pk), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(self._result_ids(response), [post.pk])
+
+    def test_cursor_pages_merge_timeline_and_read_time_authors(self):
+        Follow.objects.create(follower=self.user, followed=self.other_trainer)
+        Profile.objects.filter(user=self.other_trainer).update(fanout_on_read=True)
+        posts = [
+            Post.objects.create(
+                author=self.trainer if i % 2 else self.other_trainer, content=f"Post {i}"
+            )
+            for i in range(5)
+        ]
+        # Одинаковое время у постов из разных источников: порядок решает id
+        Post.objects.filter(pk__in=[posts[3].pk, posts[4].pk]).update(
+            created_at=posts[3].created_at
+        )
+        for post in posts:
+            fan_out_post(post.pk)
+        self.assertEqual(TimelineEntry.objects.count(), 2)
+
+        self.client.force_authenticate(user=self.user)
+        url = self.url + "?page_size=2"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(self._result_ids(response))
+            url = response.data["next"]
+        self.assertEqual(seen, [post.pk for post in reversed(posts)])
+
+    def test_filtered_feed_keeps_page_pagination(self):
+        post = Post.objects.create(author=self.trainer, content="For followers")
+        fan_out_post(post.pk)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"author": self.trainer.pk})
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(self._result_ids(response), [post.pk])
+
+    def test_remove_post_skips_follower_lookup_in_database_backend(self):
+        post = Post.objects.create(author=self.trainer, content="For followers")
+        fan_out_post(post.pk)
+
+        with CaptureQueriesContext(connection) as ctx:
+            remove_post_from_timelines(post.pk, self.trainer.pk)
+
+        self.assertFalse(TimelineEntry.objects.filter(post_id=post.pk).exists())
+        # Записи ленты удаляются по post_id, список подписчиков не читается
+        self.assertFalse(
+            any(Follow._meta.db_table in query["sql"] for query in ctx.captured_queries)
+        )
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_trim_keeps_latest_entries(self):
+        posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}")
+            for i in range(3)
+        ]
+        for post in posts:
+            fan_out_post(post.pk)
+
+        trim_timelines()
+
+        self.assertEqual(
+            get_timeline_backend().read(self.user.pk, 10), [posts[2].pk, posts[1].pk]
+        )
+
+    @override_settings(
+        TIMELINE_BACKEND="posts.timeline.InMemoryTimelineBackend",
+        TIMELINE_MAX_LENGTH=2,
+    )
+    def test_in_memory_backend_is_bounded(self):
+        backend = get_timeline_backend()
+        backend.clear()
+        posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}")
+            for i in range(3)
+        ]
+        for post in posts:
+            fan_out_post(post.pk)
+
+        self.assertEqual(
+            backend.read(self.user.pk, 10), [posts[2].pk, posts[1].pk]
+        )
+
+
+class PostKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(
+            username="trainer1", password="password123"
+        )
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}")
+            for i in range(5)
+        ]
+        # Одинаковое время создания: порядок должен решаться по id
+        Post.objects.filter(pk__in=[p.pk for p in self.posts[:2]]).update(
+            created_at=self.posts[0].created_at
+        )
+        self.client.force_authenticate(user=self.trainer)
+
+    def test_cursor_walks_all_posts_without_duplicates(self):
+        url = reverse("post-list") + "?pagination=cursor&page_size=2"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(
+            Post.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_page_number_pagination_is_still_default(self):
+        response = self.client.get(reverse("post-list"))
+        self.assertEqual(response.data["count"], 5)
+
+    def test_cursor_rejects_custom_ordering(self):
+        response = self.client.get(
+            reverse("post-list"), {"pagination": "cursor", "ordering": "-likes_count"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse("post-list") + "?cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PostLikedByUserTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(
+            username="trainer1", password="password123"
+        )
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}")
+            for i in range(4)
+        ]
+        PostLike.objects.create(user=self.user, post=self.posts[1])
+        PostLike.objects.create(user=self.user, post=self.posts[3])
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_resolves_likes_with_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("post-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        liked = {
+            item["id"] for item in response.data["results"] if item["is_liked_by_user"]
+        }
+        self.assertEqual(liked, {self.posts[1].pk, self.posts[3].pk})
+        like_queries = [
+            q for q in ctx.captured_queries if "interactions_postlike" in q["sql"]
+        ]
+        self.assertEqual(len(like_queries), 1)
+
+    def test_retrieve_reports_like_state(self):
+        response = self.client.get(
+            reverse("post-detail", kwargs={"pk": self.posts[1].pk})
+        )
+        self.assertTrue(response.data["is_liked_by_user"])
+        response = self.client.get(
+            reverse("post-detail", kwargs={"pk": self.posts[0].pk})
+        )
+        self.assertFalse(response.data["is_liked_by_user"])
+
+
+class PostSparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(
+            username="trainer1", password="password123"
+        )
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.post = Post.objects.create(author=self.trainer, content="Sparse post")
+        self.client.force_authenticate(user=self.trainer)
+
+    def test_compact_author(self):
+        url = reverse("post-list") + (
+            "?fields=id,content,author.id,author.username,author.avatar_url"
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        item = response.data["results"][0]
+        self.assertEqual(set(item), {"id", "content", "author"})
+        self.assertEqual(set(item["author"]), {"id", "username", "avatar_url"})
+        # Ни счетчиков подписчиков, ни лайков текущего пользователя
+        self.assertFalse(
+            any("interactions_" in q["sql"] for q in ctx.captured_queries)
+        )
+
+    def test_default_representation_is_unchanged(self):
+        response = self.client.get(reverse("post-detail", kwargs={"pk": self.post.pk}))
+        self.assertIn("profile", response.data["author"])
+        self.assertIn("followers_count", response.data["author"]["profile"])
+        self.assertIn("is_liked_by_user", response.data)
+
+
+class TrendingTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(
+            username="trainer1", password="password123"
+        )
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.fans = [
+            User.objects.create_user(username=f"fan{i}", password="password123")
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.fans[0])
+
+    def test_score_decays_with_event_age(self):
+        now = timezone.now()
+        fresh = score_from_events([(now, 1.0)])
+        stale = score_from_events([(now - timedelta(days=2), 1.0)])
+        self.assertGreater(fresh, stale)
+        # Два события вдвое старше half-life не перевешивают одно свежее
+        self.assertGreater(
+            fresh, score_from_events([(now - timedelta(days=2), 2.0)])
+        )
+
+    def test_trending_orders_by_engagement(self):
+        quiet = Post.objects.create(author=self.trainer, content="Quiet post")
+        popular = Post.objects.create(author=self.trainer, content="Popular post")
+        for fan in self.fans:
+            PostLike.objects.create(user=fan, post=popular)
+        Comment.objects.create(post=popular, author=self.fans[1], content="Wow")
+
+        self.assertEqual(recalculate_trending_scores(), 2)
+
+        response = self.client.get(reverse("post-trending"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [item["id"] for item in response.data["results"]]
+        self.assertEqual(ids, [popular.pk, quiet.pk])
+
+    def test_recalculation_is_incremental(self):
+        post = Post.objects.create(author=self.trainer, content="Old post")
+        Post.objects.filter(pk=post.pk).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        self.assertEqual(
+            recalculate_trending_scores(since=timezone.now() - timedelta(minutes=5)), 0
+        )
+
+        PostLike.objects.create(user=self.fans[0], post=post)
+        self.assertEqual(
+            recalculate_trending_scores(since=timezone.now() - timedelta(minutes=5)), 1
+        )
+        post.refresh_from_db()
+        self.assertGreater(post.trending_score, 0)
+
+    def test_trending_cursor_pagination(self):
+        posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}")
+            for i in range(3)
+        ]
+        recalculate_trending_scores()
+        url = reverse("post-trending") + "?pagination=cursor&page_size=2"
+        first = self.client.get(url)
+        second = self.client.get(first.data["next"])
+        ids = [item["id"] for item in first.data["results"] + second.data["results"]]
+        self.assertEqual(ids, [p.pk for p in reversed(posts)])
+
+
+class PostSearchTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(
+            username="coach_anna", password="password123"
+        )
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.other = User.objects.create_user(username="coach_bob", password="password123")
+        self.other.profile.role = Profile.Role.TRAINER
+        self.other.profile.save()
+        self.squats = Post.objects.create(author=self.trainer, content="Deep squats routine")
+        self.running = Post.objects.create(author=self.other, content="Morning running")
+        self.client.force_authenticate(user=self.trainer)
+
+    def test_search_by_content_and_author(self):
+        url = reverse("post-list")
+        response = self.client.get(url, {"search": "squats"})
+        self.assertEqual([p["id"] for p in response.data["results"]], [self.squats.pk])
+
+        response = self.client.get(url, {"search": "coach_bob"})
+        self.assertEqual([p["id"] for p in response.data["results"]], [self.running.pk])
+
+    def test_highlight_is_optional(self):
+        response = self.client.get(
+            reverse("post-list"), {"search": "running", "highlight": "1"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        if connection.vendor == "postgresql":
+            self.assertIn("<mark>", response.data["results"][0]["search_headline"])
+
+    @patch("posts.tasks.update_author_search_vectors_task.delay")
+    def test_username_change_reindexes_author_posts(self, delay):
+        delay.side_effect = update_author_search_vectors
+        self.trainer.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trainer.save(update_fields=["last_login"])
+        delay.assert_not_called()
+
+        self.trainer.username = "coach_maria"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trainer.save()
+        delay.assert_called_once_with(self.trainer.pk)
+
+        response = self.client.get(reverse("post-list"), {"search": "coach_maria"})
+        self.assertEqual([p["id"] for p in response.data["results"]], [self.squats.pk])
+
+
+@override_settings(CONDITIONAL_GET_ENABLED=True)
+class PostConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.fan = User.objects.create_user(username="fan", password="password123")
+        self.post = Post.objects.create(author=self.trainer, content="Post")
+        self.client.force_authenticate(user=self.fan)
+
+    @patch("posts.tasks.publish_post_update_task.apply_async")
+    def test_detail_not_modified_until_post_changes(self, publish):
+        url = reverse("post-detail", kwargs={"pk": self.post.pk})
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        # Одна выборка валидаторов, без сериализации и JOIN'ов
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PostLike.objects.create(user=self.fan, post=self.post)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["is_liked_by_user"])
+        self.assertNotEqual(response["ETag"], etag)
+
+    @patch("posts.tasks.fan_out_post_task.delay")
+    def test_feed_first_page_not_modified(self, fan_out):
+        url = reverse("post-list")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.trainer, content="New post")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    @override_settings(CONDITIONAL_GET_ENABLED=False)
+    def test_disabled_without_shared_cache(self):
+        response = self.client.get(reverse("post-list"))
+        self.assertNotIn("ETag", response)
+
+    def test_etag_depends_on_query(self):
+        url = reverse("post-list")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, {"fields": "id"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class PostResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.fan = User.objects.create_user(username="fan", password="password123")
+        self.posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}") for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.fan)
+        self.url = reverse("post-list")
+
+    def test_first_page_is_cache_read(self):
+        first = self.client.get(self.url)
+        # Версии постов по первичному ключу и лайки текущего пользователя
+        with self.assertNumQueries(2):
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+
+    @patch("posts.tasks.publish_post_update_task.apply_async")
+    def test_like_overlays_and_invalidates(self, publish):
+        self.client.get(self.url)
+        key = first_page_key(10)
+        with self.captureOnCommitCallbacks(execute=True):
+            PostLike.objects.create(user=self.fan, post=self.posts[0])
+        # Лайк не меняет состав ленты: список остается в кеше, обновляется фрагмент
+        self.assertEqual(first_page_key(10), key)
+        response = self.client.get(self.url)
+        item = next(p for p in response.data["results"] if p["id"] == self.posts[0].pk)
+        self.assertEqual(item["likes_count"], 1)
+        self.assertTrue(item["is_liked_by_user"])
+
+        # Фрагмент общий, is_liked_by_user — свой у каждого пользователя
+        other = User.objects.create_user(username="other", password="password123")
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+        item = next(p for p in response.data["results"] if p["id"] == self.posts[0].pk)
+        self.assertEqual(item["likes_count"], 1)
+        self.assertFalse(item["is_liked_by_user"])
+
+    @patch("posts.tasks.remove_post_from_timelines_task.delay")
+    @patch("posts.tasks.publish_post_update_task.apply_async")
+    def test_edit_and_delete_invalidate(self, publish, remove_post):
+        self.client.get(self.url)
+        self.client.get(reverse("post-detail", kwargs={"pk": self.posts[1].pk}))
+        post = self.posts[1]
+        post.content = "Edited"
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+            self.posts[2].delete()
+
+        response = self.client.get(self.url)
+        contents = {p["id"]: p["content"] for p in response.data["results"]}
+        self.assertEqual(contents[post.pk], "Edited")
+        self.assertNotIn(self.posts[2].pk, contents)
+        self.assertEqual(response.data["count"], 2)
+        response = self.client.get(reverse("post-detail", kwargs={"pk": post.pk}))
+        self.assertEqual(response.data["content"], "Edited")
+
+    @patch("posts.tasks.update_author_search_vectors_task.delay")
+    def test_author_change_invalidates_fragments(self, reindex):
+        self.client.get(self.url)
+        self.trainer.username = "renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trainer.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["results"][0]["author"]["username"], "renamed")
+
+
+class PostBatchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.fan = User.objects.create_user(username="fan", password="password123")
+        self.posts = [
+            Post.objects.create(author=self.trainer, content=f"Post {i}") for i in range(3)
+        ]
+        PostLike.objects.create(user=self.fan, post=self.posts[2])
+        self.client.force_authenticate(user=self.fan)
+        self.url = reverse("post-batch")
+
+    def test_request_order_and_missing_ids(self):
+        ids = [self.posts[2].pk, 999999, self.posts[0].pk]
+        # Посты + лайки пользователя + его подписки (граф подписок еще пуст)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {"ids": ",".join(map(str, ids))})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([item["id"] for item in results], ids)
+        self.assertTrue(results[0]["is_liked_by_user"])
+        self.assertEqual(results[1], {"id": 999999, "error": "not_found"})
+        self.assertFalse(results[2]["is_liked_by_user"])
+
+    def test_author_followed_flag_is_per_user(self):
+        params = {"ids": str(self.posts[0].pk), "fields": "id,author.id,author.is_followed_by_me"}
+        response = self.client.get(self.url, params)
+        self.assertFalse(response.data["results"][0]["author"]["is_followed_by_me"])
+
+        # Фрагмент поста уже в кеше, но флаг накладывается поверх
+        Follow.objects.create(follower=self.fan, followed=self.trainer)
+        response = self.client.get(self.url, params)
+        self.assertEqual(
+            response.data["results"][0]["author"],
+            {"id": self.trainer.pk, "is_followed_by_me": True},
+        )
+
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get(self.url, params)
+        self.assertFalse(response.data["results"][0]["author"]["is_followed_by_me"])
+
+    def test_post_variant(self):
+        ids = [post.pk for post in reversed(self.posts)]
+        response = self.client.post(self.url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], ids)
+
+    def test_invalid_ids(self):
+        response = self.client.get(self.url, {"ids": "1,abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            self.url, {"ids": list(range(1, 102))}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def make_test_image(name="photo.png", size=(1200, 900)):
+    buffer = BytesIO()
+    Image.new("RGB", size, color=(200, 80, 40)).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+@override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tempfile.mkdtemp(), "base_url": "/media/"},
+        },
+    }
+)
+class PostImageProcessingTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.client.force_authenticate(user=self.trainer)
+
+    def test_upload_is_processed_in_background(self):
+        response = self.client.post(
+            reverse("post-list"),
+            {"content": "With photo", "image": make_test_image()},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["image_status"], ImageStatus.PROCESSING)
+        post = Post.objects.get(pk=response.data["id"])
+        original = post.image.name
+
+        process_post_image_task(post.pk)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, ImageStatus.READY)
+        self.assertNotEqual(post.image.name, original)
+        self.assertFalse(post.image.storage.exists(original))
+        with Image.open(post.image) as processed:
+            self.assertLessEqual(max(processed.size), 500)
+            self.assertEqual(processed.format, "JPEG")
+
+        # Renditions созданы до подмены и отдаются в виде карты для srcset
+        response = self.client.get(reverse("post-detail", kwargs={"pk": post.pk}))
+        renditions = response.data["image_renditions"]
+        self.assertEqual(list(renditions["jpeg"]), ["160w", "320w", "500w"])
+        self.assertEqual(list(renditions["webp"]), ["160w", "320w", "500w"])
+        thumb = renditions["webp"]["160w"].split("/media/", 1)[-1]
+        with Image.open(post.image.storage.open(thumb)) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertLessEqual(max(image.size), 160)
+
+    def test_backfill_command_generates_renditions(self):
+        post = Post.objects.create(author=self.trainer, content="Post", image=make_test_image())
+        Post.objects.filter(pk=post.pk).update(image_status=ImageStatus.READY)
+        post.refresh_from_db()
+
+        call_command("generate_image_renditions", stdout=StringIO())
+
+        storage = post.image.storage
+        for name in POST_IMAGE_RENDITIONS.names(post.image):
+            self.assertTrue(storage.exists(name), name)
+
+    def test_result_is_discarded_if_image_was_replaced(self):
+        post = Post.objects.create(author=self.trainer, content="Post", image=make_test_image())
+        original = post.image.name
+        generate = PostImage.generate
+
+        def replace_during_processing(spec):
+            # Пользователь загрузил новую картинку, пока шла обработка
+            Post.objects.filter(pk=post.pk).update(image="post_images/newer.png")
+            return generate(spec)
+
+        with patch.object(PostImage, "generate", replace_during_processing):
+            process_post_image_task(post.pk)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, "post_images/newer.png")
+        self.assertEqual(post.image_status, ImageStatus.PROCESSING)
+        # Результат обработки и его renditions удалены, оригинал остался
+        storage = post.image.storage
+        discarded = processed_name(original, PostImage)
+        self.assertTrue(storage.exists(original))
+        self.assertFalse(storage.exists(discarded))
+        for name in POST_IMAGE_RENDITIONS.names(File(None, name=discarded)):
+            self.assertFalse(storage.exists(name), name)
+
+
+@override_settings(
+    DIRECT_UPLOAD_BACKEND="core.uploads.FileSystemUploadBackend",
+    STORAGES={
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tempfile.mkdtemp(), "base_url": "/media/"},
+        },
+    },
+)
+class PostDirectUploadTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.client.force_authenticate(user=self.trainer)
+
+    def upload(self, content_type="image/png", content=None):
+        response = self.client.post(
+            reverse("direct-upload-presign"),
+            {"target": "post_image", "content_type": content_type, "size": 1024},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = response.data["upload"]
+        put = self.client.generic(
+            upload["method"],
+            upload["url"],
+            content or make_test_image().read(),
+            content_type=upload["headers"]["Content-Type"],
+        )
+        self.assertEqual(put.status_code, status.HTTP_204_NO_CONTENT)
+        return response.data["key"]
+
+    def test_create_post_with_uploaded_key(self):
+        key = self.upload()
+        response = self.client.post(
+            reverse("post-list"), {"content": "Direct", "image_key": key}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["image_status"], ImageStatus.PROCESSING)
+        post = Post.objects.get(pk=response.data["id"])
+        self.assertEqual(post.image.name, key)
+
+        process_post_image_task(post.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, ImageStatus.READY)
+
+    def test_rejects_foreign_or_missing_keys(self):
+        key = self.upload()
+        other = User.objects.create_user(username="trainer2", password="password123")
+        other.profile.role = Profile.Role.TRAINER
+        other.profile.save()
+        self.client.force_authenticate(user=other)
+        response = self.client.post(
+            reverse("post-list"), {"content": "Stolen", "image_key": key}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            reverse("post-list"),
+            {"content": "Missing", "image_key": key.replace(str(self.trainer.pk), str(other.pk))},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_key_can_be_attached_once(self):
+        key = self.upload()
+        response = self.client.post(
+            reverse("post-list"), {"content": "First", "image_key": key}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(
+            reverse("post-list"), {"content": "Second", "image_key": key}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rejects_content_not_matching_declared_type(self):
+        key = self.upload(content=b"<svg onload=alert(1)>")
+        response = self.client.post(
+            reverse("post-list"), {"content": "Fake", "image_key": key}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(default_storage.exists(key))
+
+    def test_only_trainers_presign_post_images(self):
+        user = User.objects.create_user(username="user1", password="password123")
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            reverse("direct-upload-presign"),
+            {"target": "post_image", "content_type": "image/png", "size": 1024},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cleanup_removes_only_unattached_uploads(self):
+        attached = self.upload()
+        self.client.post(
+            reverse("post-list"), {"content": "Kept", "image_key": attached}, format="json"
+        )
+        orphan = self.upload()
+
+        with override_settings(DIRECT_UPLOAD_TTL=-60):
+            self.assertEqual(cleanup_direct_uploads(), 1)
+        self.assertTrue(default_storage.exists(attached))
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_presign_validates_type_and_size(self):
+        url = reverse("direct-upload-presign")
+        response = self.client.post(
+            url, {"target": "post_image", "content_type": "application/pdf", "size": 10}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            url, {"target": "post_image", "content_type": "image/png", "size": 10 ** 9}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PostRealtimeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.post = Post.objects.create(author=self.trainer, content="Live post")
+
+    async def connect(self, user):
+        # channels.testing тянет daphne, поэтому протокол WebSocket — вручную
+        scope = {"type": "websocket", "path": "/ws/posts/", "headers": [], "user": user}
+        communicator = ApplicationCommunicator(PostEventsConsumer.as_asgi(), scope)
+        await communicator.send_input({"type": "websocket.connect"})
+        message = await communicator.receive_output()
+        return communicator, message["type"] == "websocket.accept"
+
+    async def send_json(self, communicator, content):
+        await communicator.send_input({"type": "websocket.receive", "text": json.dumps(content)})
+
+    async def receive_json(self, communicator):
+        message = await communicator.receive_output()
+        return json.loads(message["text"])
+
+    @patch("posts.tasks.publish_post_update_task.apply_async")
+    def test_events_within_window_are_coalesced(self, apply_async):
+        with self.captureOnCommitCallbacks(execute=True):
+            PostLike.objects.create(user=self.user, post=self.post)
+            PostLike.objects.create(user=self.trainer, post=self.post)
+            Comment.objects.create(post=self.post, author=self.user, content="Nice")
+        apply_async.assert_called_once_with(
+            (self.post.pk,), countdown=settings.REALTIME_COALESCE_SECONDS
+        )
+
+        # После отправки окно закрыто, следующее событие открывает новое
+        publish_post_update(self.post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.trainer, content="Thanks")
+        self.assertEqual(apply_async.call_count, 2)
+
+    async def test_subscribe_reports_liked_posts(self):
+        other = await sync_to_async(Post.objects.create)(author=self.trainer, content="Other")
+        await sync_to_async(PostLike.objects.create)(user=self.user, post=self.post)
+        communicator, connected = await self.connect(self.user)
+        self.assertTrue(connected)
+
+        await self.send_json(
+            communicator, {"action": "subscribe", "post_ids": [self.post.pk, other.pk]}
+        )
+        event = await self.receive_json(communicator)
+        self.assertEqual(event["liked_post_ids"], [self.post.pk])
+
+        await self.send_json(communicator, {"action": "unsubscribe", "post_ids": [other.pk]})
+        self.assertNotIn("liked_post_ids", await self.receive_json(communicator))
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+
+    @patch("posts.tasks.publish_post_update_task.apply_async")
+    async def test_subscriber_receives_compact_delta(self, apply_async):
+        communicator, connected = await self.connect(self.user)
+        self.assertTrue(connected)
+        await self.send_json(communicator, {"action": "subscribe", "post_ids": [self.post.pk]})
+        self.assertEqual(
+            await self.receive_json(communicator),
+            {"event": "subscriptions", "post_ids": [self.post.pk], "liked_post_ids": []},
+        )
+
+        def interact():
+            with self.captureOnCommitCallbacks(execute=True):
+                PostLike.objects.create(user=self.user, post=self.post)
+                return Comment.objects.create(post=self.post, author=self.user, content="Hi")
+
+        comment = await sync_to_async(interact)()
+        await sync_to_async(publish_post_update)(self.post.pk)
+
+        event = await self.receive_json(communicator)
+        self.assertEqual(event["event"], "post.update")
+        self.assertEqual(event["likes_count"], 1)
+        self.assertEqual(event["comments_count"], 1)
+        self.assertEqual(event["new_comment_ids"], [comment.pk])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+
+    async def test_follower_receives_timeline_post(self):
+        await sync_to_async(Follow.objects.create)(follower=self.user, followed=self.trainer)
+        communicator, connected = await self.connect(self.user)
+        self.assertTrue(connected)
+
+        post = await sync_to_async(Post.objects.create)(author=self.trainer, content="New")
+        await sync_to_async(fan_out_post)(post.pk)
+
+        event = await self.receive_json(communicator)
+        self.assertEqual(event["event"], "timeline.post")
+        self.assertEqual(event["post_id"], post.pk)
+        self.assertEqual(event["author_id"], self.trainer.pk)
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+
+    async def test_follower_receives_read_time_author_post(self):
+        def follow_popular_trainer():
+            cache.clear()
+            Follow.objects.create(follower=self.user, followed=self.trainer)
+            Profile.objects.filter(user=self.trainer).update(fanout_on_read=True)
+
+        await sync_to_async(follow_popular_trainer)()
+        communicator, connected = await self.connect(self.user)
+        self.assertTrue(connected)
+
+        post = await sync_to_async(Post.objects.create)(author=self.trainer, content="New")
+        self.assertEqual(await sync_to_async(fan_out_post)(post.pk), 0)
+
+        event = await self.receive_json(communicator)
+        self.assertEqual(event["event"], "timeline.post")
+        self.assertEqual(event["post_id"], post.pk)
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+
+    @override_settings(
+        CHANNEL_LAYERS={
+            "default": {
+                "BACKEND": "core.channel_layers.InMemoryChannelLayer",
+                "CONFIG": {"capacity": 1},
+            }
+        }
+    )
+    def test_full_channel_is_counted_and_does_not_stop_other_groups(self):
+        cache.clear()
+        layer = get_channel_layer()
+        slow = async_to_sync(layer.new_channel)()
+        other = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(timeline_group(self.user.pk), slow)
+        async_to_sync(layer.group_add)(timeline_group(self.trainer.pk), other)
+
+        publish_timeline_post([self.user.pk], self.post)
+        with self.assertLogs("core.channel_layers", "WARNING"):
+            publish_timeline_post([self.user.pk, self.trainer.pk], self.post)
+
+        self.assertEqual(dropped_message_count(), 1)
+        self.assertEqual(async_to_sync(layer.receive)(other)["payload"]["post_id"], self.post.pk)
+
+    def test_redis_layer_over_capacity_record_is_counted(self):
+        cache.clear()
+        logging.getLogger("channels_redis.core").info(
+            REDIS_OVER_CAPACITY_MESSAGE, 2, 5, post_group(self.post.pk)
+        )
+        self.assertEqual(dropped_message_count(), 2)
+
+    async def test_anonymous_connection_is_rejected(self):
+        communicator, connected = await self.connect(AnonymousUser())
+        self.assertFalse(connected)
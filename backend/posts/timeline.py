@@ -0,0 +1,431 @@
+"""
+Материализованная лента подписок (fan-out-on-write).
+
+Когда тренер публикует пост, его id раскладывается по лентам подписчиков;
+эндпоинт /api/posts/subscriptions/ затем берет страницу keyset-срезом этого
+заранее отсортированного и ограниченного списка вместо
+`author_id IN (<все подписки>)`.
+
+Хранилище подключается через settings.TIMELINE_BACKEND:
+  - DatabaseTimelineBackend — таблица TimelineEntry (по умолчанию);
+  - RedisTimelineBackend — sorted set на пользователя;
+  - InMemoryTimelineBackend — для тестов.
+
+Авторы с очень большим числом подписчиков (>= TIMELINE_FANOUT_THRESHOLD)
+не раскладываются по лентам: их посты подмешиваются при чтении
+(fan-out-on-read), чтобы один пост не превращался в миллионы записей.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils.module_loading import import_string
+
+from core.conditional import bump_versions
+from core.pagination import keyset_condition
+
+from .models import Post, TimelineEntry
+from .realtime import publish_author_post, publish_timeline_post
+
+FANOUT_BATCH_SIZE = 1000
+FANOUT_ON_READ_CACHE_KEY = "timeline:fanout-on-read-authors"
+FANOUT_ON_READ_CACHE_TIMEOUT = 10 * 60
+
+
+@dataclass(frozen=True)
+class TimelineItem:
+    user_id: int
+    post_id: int
+    author_id: int
+    created_at: datetime
+
+
+class BaseTimelineBackend:
+    def add(self, items):
+        raise NotImplementedError
+
+    def read_page(self, user_id, limit, before=None):
+        """
+        [(created_at, post_id)] ленты от новых к старым, строго после позиции
+        `before` = (created_at, post_id), если она задана.
+        """
+        raise NotImplementedError
+
+    def read(self, user_id, limit):
+        """Возвращает id постов ленты, от новых к старым."""
+        return [post_id for _, post_id in self.read_page(user_id, limit)]
+
+    def remove_author(self, user_id, author_id):
+        raise NotImplementedError
+
+    def remove_post(self, post_id, author_id):
+        raise NotImplementedError
+
+    def trim(self):
+        """Обрезает ленты до TIMELINE_MAX_LENGTH (для периодической задачи)."""
+
+
+class DatabaseTimelineBackend(BaseTimelineBackend):
+    def add(self, items):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=item.user_id,
+                    post_id=item.post_id,
+                    author_id=item.author_id,
+                    created_at=item.created_at,
+                )
+                for item in items
+            ],
+            batch_size=FANOUT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def read_page(self, user_id, limit, before=None):
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        if before is not None:
+            entries = entries.filter(keyset_condition("created_at", *before, pk_field="post_id"))
+        return list(
+            entries.order_by("-created_at", "-post_id").values_list(
+                "created_at", "post_id"
+            )[:limit]
+        )
+
+    def remove_author(self, user_id, author_id):
+        TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+    def remove_post(self, post_id, author_id):
+        # Обычно записи уже удалены каскадом вместе с постом
+        TimelineEntry.objects.filter(post_id=post_id).delete()
+
+    def trim(self):
+        overflow = (
+            TimelineEntry.objects.annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=[F("user_id")],
+                    order_by=[F("created_at").desc(), F("post_id").desc()],
+                )
+            )
+            .filter(position__gt=settings.TIMELINE_MAX_LENGTH)
+            .values_list("pk", flat=True)
+        )
+        pks = list(overflow)
+        for start in range(0, len(pks), FANOUT_BATCH_SIZE):
+            TimelineEntry.objects.filter(
+                pk__in=pks[start:start + FANOUT_BATCH_SIZE]
+            ).delete()
+
+
+class RedisTimelineBackend(BaseTimelineBackend):
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.TIMELINE_REDIS_URL)
+
+    @staticmethod
+    def _key(user_id):
+        return f"timeline:{user_id}"
+
+    def add(self, items):
+        by_user = defaultdict(dict)
+        for item in items:
+            by_user[item.user_id][item.post_id] = item.created_at.timestamp()
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, members in by_user.items():
+            key = self._key(user_id)
+            pipe.zadd(key, members)
+            # Держим только последние TIMELINE_MAX_LENGTH записей
+            pipe.zremrangebyrank(key, 0, -settings.TIMELINE_MAX_LENGTH - 1)
+        pipe.execute()
+
+    def read_page(self, user_id, limit, before=None):
+        key = self._key(user_id)
+        if before is None:
+            high, ties = "+inf", 0
+        else:
+            high = before[0].timestamp()
+            # Посты с тем же временем, что у курсора, идут по id; Redis
+            # сортирует равные score лексикографически, поэтому берем их все
+            ties = self.client.zcount(key, high, high)
+        members = self.client.zrevrangebyscore(
+            key, high, "-inf", start=0, num=limit + ties, withscores=True
+        )
+        positions = sorted(
+            ((score, int(post_id)) for post_id, score in members), reverse=True
+        )
+        if before is not None:
+            positions = [
+                (score, post_id)
+                for score, post_id in positions
+                if score < high or post_id < before[1]
+            ]
+        return [
+            (datetime.fromtimestamp(score, tz=dt_timezone.utc), post_id)
+            for score, post_id in positions[:limit]
+        ]
+
+    def remove_author(self, user_id, author_id):
+        post_ids = list(
+            Post.objects.filter(author_id=author_id).values_list("id", flat=True)
+        )
+        for start in range(0, len(post_ids), FANOUT_BATCH_SIZE):
+            self.client.zrem(
+                self._key(user_id), *post_ids[start:start + FANOUT_BATCH_SIZE]
+            )
+
+    def remove_post(self, post_id, author_id):
+        from interactions.models import Follow
+
+        # Ключи лент по post_id не найти: обходим подписчиков автора пачками
+        follower_ids = (
+            Follow.objects.filter(followed_id=author_id)
+            .order_by()
+            .values_list("follower_id", flat=True)
+            .iterator(chunk_size=FANOUT_BATCH_SIZE)
+        )
+        pipe = self.client.pipeline(transaction=False)
+        for follower_id in follower_ids:
+            pipe.zrem(self._key(follower_id), post_id)
+            if len(pipe) >= FANOUT_BATCH_SIZE:
+                pipe.execute()
+        pipe.execute()
+
+
+class InMemoryTimelineBackend(BaseTimelineBackend):
+    """Хранит ленты в памяти процесса. Только для тестов."""
+
+    def __init__(self):
+        self.timelines = defaultdict(dict)
+
+    def add(self, items):
+        for item in items:
+            self.timelines[item.user_id][item.post_id] = (item.created_at, item.author_id)
+        for user_id in {item.user_id for item in items}:
+            entries = self._sorted(user_id)
+            for post_id in entries[settings.TIMELINE_MAX_LENGTH:]:
+                del self.timelines[user_id][post_id]
+
+    def _sorted(self, user_id):
+        timeline = self.timelines[user_id]
+        return sorted(timeline, key=lambda post_id: (timeline[post_id][0], post_id), reverse=True)
+
+    def read_page(self, user_id, limit, before=None):
+        timeline = self.timelines[user_id]
+        positions = [(timeline[post_id][0], post_id) for post_id in self._sorted(user_id)]
+        if before is not None:
+            positions = [position for position in positions if position < before]
+        return positions[:limit]
+
+    def remove_author(self, user_id, author_id):
+        timeline = self.timelines[user_id]
+        for post_id in [pid for pid, (_, aid) in timeline.items() if aid == author_id]:
+            del timeline[post_id]
+
+    def remove_post(self, post_id, author_id):
+        for timeline in self.timelines.values():
+            timeline.pop(post_id, None)
+
+    def clear(self):
+        self.timelines.clear()
+
+
+_backends = {}
+
+
+def get_timeline_backend():
+    path = settings.TIMELINE_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def get_fanout_on_read_author_ids():
+    """
+    Авторы, чьи посты не раскладываются по лентам, а подмешиваются при чтении.
+    Множество хранится флагом Profile.fanout_on_read (его переключает
+    recalculate_follow_counts) и читается по частичному индексу; один и тот
+    же закэшированный ответ используется и при записи, и при чтении, чтобы
+    пост не потерялся между двумя режимами.
+    """
+    author_ids = cache.get(FANOUT_ON_READ_CACHE_KEY)
+    if author_ids is None:
+        from users.models import Profile
+
+        author_ids = set(
+            Profile.objects.filter(fanout_on_read=True).values_list("user_id", flat=True)
+        )
+        cache.set(FANOUT_ON_READ_CACHE_KEY, author_ids, FANOUT_ON_READ_CACHE_TIMEOUT)
+    return author_ids
+
+
+def deliver(backend, post, items):
+    backend.add(items)
+    # Открытые WebSocket'ы подписчиков узнают о посте сразу (posts.realtime)
+    publish_timeline_post([item.user_id for item in items], post)
+
+
+def fan_out_post(post_id):
+    from interactions.models import Follow
+
+    post = Post.objects.filter(pk=post_id).only("id", "author_id", "created_at").first()
+    if post is None:
+        return 0
+    if post.author_id in get_fanout_on_read_author_ids():
+        # В ленты не пишем, но открытые WebSocket'ы подписчиков узнают о посте
+        publish_author_post(post)
+        return 0
+
+    backend = get_timeline_backend()
+    follower_ids = (
+        Follow.objects.filter(followed_id=post.author_id)
+        .order_by()
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    delivered = 0
+    batch = []
+    for follower_id in follower_ids:
+        batch.append(TimelineItem(follower_id, post.pk, post.author_id, post.created_at))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            deliver(backend, post, batch)
+            delivered += len(batch)
+            batch = []
+    if batch:
+        deliver(backend, post, batch)
+        delivered += len(batch)
+    # Пост появился в лентах только сейчас, а не в момент сохранения
+    bump_versions("posts")
+    return delivered
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет последние посты автора в ленту нового подписчика."""
+    if author_id in get_fanout_on_read_author_ids():
+        return 0
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by("-created_at")
+        .values_list("id", "created_at")[:settings.TIMELINE_BACKFILL_LIMIT]
+    )
+    items = [
+        TimelineItem(user_id, post_id, author_id, created_at)
+        for post_id, created_at in posts
+    ]
+    if items:
+        get_timeline_backend().add(items)
+        bump_versions(f"timeline:{user_id}")
+    return len(items)
+
+
+def backfill_followers(author_id):
+    """
+    Раскладывает последние посты автора по лентам всех подписчиков — когда
+    автор перестает обслуживаться fan-out-on-read.
+    """
+    from interactions.models import Follow
+
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .order_by("-created_at")
+        .values_list("id", "created_at")[:settings.TIMELINE_BACKFILL_LIMIT]
+    )
+    if not posts:
+        return 0
+    backend = get_timeline_backend()
+    follower_ids = (
+        Follow.objects.filter(followed_id=author_id)
+        .order_by()
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    delivered = 0
+    batch = []
+    for follower_id in follower_ids:
+        batch.append(follower_id)
+        if len(batch) * len(posts) >= FANOUT_BATCH_SIZE:
+            delivered += _backfill_batch(backend, batch, author_id, posts)
+            batch = []
+    if batch:
+        delivered += _backfill_batch(backend, batch, author_id, posts)
+    bump_versions("posts")
+    return delivered
+
+
+def _backfill_batch(backend, user_ids, author_id, posts):
+    backend.add(
+        [
+            TimelineItem(user_id, post_id, author_id, created_at)
+            for user_id in user_ids
+            for post_id, created_at in posts
+        ]
+    )
+    return len(user_ids)
+
+
+def remove_author_from_timeline(user_id, author_id):
+    get_timeline_backend().remove_author(user_id, author_id)
+    bump_versions(f"timeline:{user_id}")
+
+
+def remove_post_from_timelines(post_id, author_id):
+    # Подписчиков автора ищет только бэкенд, которому они нужны (Redis)
+    get_timeline_backend().remove_post(post_id, author_id)
+
+
+def trim_timelines():
+    get_timeline_backend().trim()
+
+
+def subscriptions_page(user, limit, before=None):
+    """
+    Страница ленты подписок [(created_at, post_id)] от новых к старым строго
+    после `before`: keyset-срез материализованной ленты, слитый с таким же
+    срезом постов fan-out-on-read авторов (индекс post_author_recent_idx).
+    Сортировки и OFFSET в БД нет — каждый источник отдает не больше `limit`.
+    """
+    positions = dict(
+        (post_id, created_at)
+        for created_at, post_id in get_timeline_backend().read_page(user.pk, limit, before)
+    )
+    read_time_authors = get_fanout_on_read_author_ids()
+    if read_time_authors:
+        from interactions.follow_graph import following_among
+
+        followed = following_among(user.pk, read_time_authors)
+        if followed:
+            posts = Post.objects.filter(author_id__in=followed)
+            if before is not None:
+                posts = posts.filter(keyset_condition("created_at", *before))
+            positions.update(
+                (post_id, created_at)
+                for created_at, post_id in posts.order_by("-created_at", "-id")
+                .values_list("created_at", "id")[:limit]
+            )
+    return sorted(
+        ((created_at, post_id) for post_id, created_at in positions.items()),
+        reverse=True,
+    )[:limit]
+
+
+def subscriptions_filter(user):
+    """
+    Условие для ленты подписок с фильтрами, поиском или сортировкой:
+    ограниченный список id из материализованной ленты плюс посты авторов,
+    которые обслуживаются fan-out-on-read.
+    """
+    condition = Q(
+        id__in=get_timeline_backend().read(user.pk, settings.TIMELINE_MAX_LENGTH)
+    )
+    read_time_authors = get_fanout_on_read_author_ids()
+    if read_time_authors:
+        from interactions.follow_graph import following_among
+
+        followed = following_among(user.pk, read_time_authors)
+        if followed:
+            condition |= Q(author_id__in=followed)
+    return condition
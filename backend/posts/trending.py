@@ -0,0 +1,119 @@
+"""
+Trending-рейтинг постов с экспоненциальным затуханием по времени.
+
+Вклад каждого события (публикация, лайк, комментарий) с весом w в момент t
+затухает как w * exp(-λ * (now - t)). Вместо «текущего» значения храним
+
+    trending_score = ln( Σ w_i * exp(λ * (t_i - EPOCH)) )
+
+Это монотонно эквивалентно затухающей сумме на любой момент времени, поэтому
+без новых событий порядок постов не меняется и score пересчитывать не нужно:
+периодическая задача обновляет только посты с новой активностью, а топ-N
+читается по индексу (-trending_score, -id).
+
+События группируются по часам (TruncHour), так что пересчет не тянет
+в Python отдельные лайки.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from core.conditional import bump_versions
+
+from .models import Post
+
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WINDOW_DAYS = 7  # События старше окна практически не влияют на score
+
+POST_WEIGHT = 1.0
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 3.0
+
+DECAY_RATE = math.log(2) / TRENDING_HALF_LIFE_HOURS  # λ, в 1/час
+BATCH_SIZE = 500
+
+
+def _hours_since_epoch(moment):
+    return (moment - TRENDING_EPOCH).total_seconds() / 3600
+
+
+def score_from_events(events):
+    """
+    events — список (момент, вес). Считает ln Σ w * exp(λ (t - EPOCH))
+    через log-sum-exp, чтобы не переполнить float.
+    """
+    terms = [
+        math.log(weight) + DECAY_RATE * _hours_since_epoch(moment)
+        for moment, weight in events
+        if weight > 0
+    ]
+    if not terms:
+        return 0.0
+    peak = max(terms)
+    return peak + math.log(sum(math.exp(term - peak) for term in terms))
+
+
+def _hourly_counts(model, post_ids, window_start):
+    return (
+        model.objects.filter(post_id__in=post_ids, created_at__gte=window_start)
+        .annotate(bucket=TruncHour("created_at"))
+        .order_by()
+        .values("post_id", "bucket")
+        .annotate(total=Count("id"))
+    )
+
+
+def calculate_scores(posts, now=None):
+    """Возвращает {post_id: score} для переданных постов."""
+    from interactions.models import Comment, PostLike
+
+    now = now or timezone.now()
+    window_start = now - timedelta(days=TRENDING_WINDOW_DAYS)
+    post_ids = [post.pk for post in posts]
+
+    events = defaultdict(list)
+    for post in posts:
+        events[post.pk].append((post.created_at, POST_WEIGHT))
+    for model, weight in ((PostLike, LIKE_WEIGHT), (Comment, COMMENT_WEIGHT)):
+        for row in _hourly_counts(model, post_ids, window_start):
+            events[row["post_id"]].append((row["bucket"], weight * row["total"]))
+
+    return {post_id: score_from_events(items) for post_id, items in events.items()}
+
+
+def recalculate_trending_scores(since=None, now=None):
+    """
+    Пересчитывает score постов, созданных или получивших активность после
+    `since` (по умолчанию — за окно TRENDING_WINDOW_DAYS). Возвращает число
+    обновленных постов.
+    """
+    now = now or timezone.now()
+    since = since or now - timedelta(days=TRENDING_WINDOW_DAYS)
+    candidates = Post.objects.filter(
+        Q(created_at__gte=since) | Q(last_activity_at__gte=since)
+    ).order_by("pk")
+
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            candidates.filter(pk__gt=last_pk).only("id", "created_at", "trending_score")[
+                :BATCH_SIZE
+            ]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        scores = calculate_scores(batch, now=now)
+        for post in batch:
+            post.trending_score = scores[post.pk]
+        Post.objects.bulk_update(batch, ["trending_score"])
+        updated += len(batch)
+    if updated:
+        bump_versions("trending")
+    return updated
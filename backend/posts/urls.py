@@ -1,7 +1,11 @@
 from django.urls import include, path
 from rest_framework_nested import routers
 
-from interactions.views import CommentViewSet, PostLikeCreateDestroyView
+from interactions.views import (
+    CommentViewSet,
+    PostLikeBatchView,
+    PostLikeCreateDestroyView,
+)
 
 from .views import PostViewSet
 
@@ -13,6 +17,8 @@ posts_router = routers.NestedDefaultRouter(router, r"", lookup="post")
 posts_router.register(r"comments", CommentViewSet, basename="post-comments")
 
 urlpatterns = [
+    # Лайки/анлайки нескольких постов за один запрос /api/posts/likes/batch/
+    path("likes/batch/", PostLikeBatchView.as_view(), name="post-like-batch"),
     path("", include(router.urls)),
     path("", include(posts_router.urls)),
     # Отдельный URL для лайка/анлайка поста /api/posts/{post_pk}/like/
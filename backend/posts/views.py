@@ -1,26 +1,148 @@
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.core.cache import cache
 from django_filters.rest_framework import DjangoFilterBackend
 
+from core.conditional import (
+    ConditionalGetMixin,
+    get_versions,
+    make_etag,
+    version_to_datetime,
+)
+from core.pagination import KeysetPagination, OptionalKeysetPagination
 from core.permissions import IsAdminUser, IsAuthorOrReadOnly, IsTrainer
+from core.serializers import FIELDS_QUERY_PARAM, is_field_requested
 
+from .cache import current_refs, first_page_key, set_first_page
 from .models import Post
+from .search import PostSearchFilter
 from .serializers import PostSerializer
+from .timeline import subscriptions_filter, subscriptions_page
 
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Post.objects.select_related("author__profile")
-        .prefetch_related("likes", "comments")
-        .all()
-    )
+BATCH_MAX_IDS = 100
+
+
+class PostViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    # likes_count / comments_count хранятся в Post, prefetch лайков и комментов не нужен
+    queryset = Post.objects.all()
     serializer_class = PostSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    pagination_class = OptionalKeysetPagination
+    # На PostgreSQL поиск идет по tsvector + GIN, на SQLite — обычный icontains
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PostSearchFilter]
     filterset_fields = ['author', 'author__username']
 
     ordering_fields = ["created_at", "likes_count"]
     search_fields = ["content", "author__username"]
     ordering = ["-created_at"]
+    conditional_actions = ("list", "retrieve", "subscriptions", "trending")
+
+    @property
+    def keyset_field(self):
+        # Курсор trending-ленты идет по score, остальных — по времени создания
+        return "trending_score" if self.action == "trending" else "created_at"
+
+    def get_validators(self, request):
+        user_id = request.user.pk
+        # Тело зависит от ?fields=/expand/page/cursor, поэтому query string входит в ETag
+        path = request.get_full_path()
+        if self.action == "retrieve":
+            try:
+                pk = int(self.kwargs["pk"])
+            except ValueError:
+                return None, None
+            state = (
+                Post.objects.filter(pk=pk)
+                .values(
+                    "updated_at",
+                    "last_activity_at",
+                    "likes_count",
+                    "comments_count",
+                    "author_id",
+                )
+                .first()
+            )
+            if state is None:
+                return None, None  # 404 отдаст обычный обработчик
+            versions = get_versions(
+                f"user:{state['author_id']}", f"likes:{user_id}", f"follows:{user_id}"
+            )
+            etag = make_etag(pk, user_id, path, *state.values(), *versions.values())
+            last_modified = max(
+                state["updated_at"],
+                state["last_activity_at"] or state["updated_at"],
+                *map(version_to_datetime, versions.values()),
+            )
+            return etag, last_modified
+
+        # Авторы страницы заранее неизвестны, поэтому изменения профилей
+        # (user:<id>: профиль, username, счетчики подписок) поднимают и "posts"
+        names = ["posts", f"likes:{user_id}", f"follows:{user_id}"]
+        if self.action == "subscriptions":
+            names.append(f"timeline:{user_id}")
+        elif self.action == "trending":
+            names.append("trending")
+        versions = get_versions(*names)
+        etag = make_etag(self.action, user_id, path, *versions.values())
+        return etag, max(map(version_to_datetime, versions.values()))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # JOIN'им только то, что клиент запросил через ?fields=
+        if is_field_requested(self.request, "author.profile") or is_field_requested(
+            self.request, "author.avatar_url"
+        ):
+            return queryset.select_related("author__profile")
+        if is_field_requested(self.request, "author"):
+            return queryset.select_related("author")
+        return queryset
+
+    def is_cached_first_page(self, request):
+        # Только «голая» общая лента: любые фильтры, поиск, сортировка и курсор идут в БД
+        params = request.query_params
+        return set(params) <= {FIELDS_QUERY_PARAM, "page"} and params.get("page", "1") == "1"
+
+    def is_timeline_page(self, request):
+        return set(request.query_params) <= {
+            FIELDS_QUERY_PARAM,
+            KeysetPagination.cursor_query_param,
+            KeysetPagination.page_size_query_param,
+            OptionalKeysetPagination.mode_query_param,
+        }
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_cached_first_page(request):
+            return super().list(request, *args, **kwargs)
+
+        page_size = self.paginator.get_page_size(request)
+        key = first_page_key(page_size)
+        cached = cache.get(key)
+        if cached is None:
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            set_first_page(key, self.paginator.page.paginator.count, page)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        # Первая страница из кеша: id постов + фрагменты; из БД — только версии
+        # постов по первичному ключу и промахи фрагментов
+        serializer = self.get_serializer(many=True)
+        results = serializer.child.represent_many(
+            current_refs(cached["ids"]),
+            lambda post_ids: self.get_queryset().filter(pk__in=post_ids),
+        )
+        next_link = None
+        if cached["count"] > page_size:
+            next_link = replace_query_param(request.build_absolute_uri(), "page", 2)
+        return Response(
+            {
+                "count": cached["count"],
+                "next": next_link,
+                "previous": None,
+                "results": results,
+            }
+        )
 
     def get_permissions(self):
         if self.action == "create":
@@ -45,10 +167,21 @@ class PostViewSet(viewsets.ModelViewSet):
         detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated]
     )
     def subscriptions(self, request):
-        user = request.user
-        followed_users = user.following.values_list("followed_id", flat=True)
+        # Без фильтров, поиска и сортировки страница берется прямо из
+        # материализованной ленты по курсору, см. posts.timeline
+        if self.is_timeline_page(request):
+            paginator = KeysetPagination()
+            page = paginator.paginate_positions(
+                lambda limit, before: subscriptions_page(request.user, limit, before),
+                self.get_queryset(),
+                request,
+                self,
+            )
+            serializer = self.get_serializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         queryset = self.filter_queryset(
-            self.get_queryset().filter(author_id__in=followed_users)
+            self.get_queryset().filter(subscriptions_filter(request.user))
         )
 
         page = self.paginate_queryset(queryset)
@@ -58,3 +191,61 @@ class PostViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
+
+    @action(
+        detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated]
+    )
+    def trending(self, request):
+        # Score предрасчитан (posts.trending), топ читается по индексу
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(trending_score__gt=0)
+            .order_by("-trending_score", "-id")
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def get_batch_ids(self, request):
+        if request.method == "POST":
+            raw = request.data.get("ids", [])
+        else:
+            raw = request.query_params.get("ids", "").split(",")
+        if not isinstance(raw, list):
+            raise ValidationError({"ids": "Expected a list of post ids."})
+        try:
+            ids = [int(item) for item in raw if str(item).strip()]
+        except (TypeError, ValueError):
+            raise ValidationError({"ids": "Post ids must be integers."})
+        if not ids:
+            raise ValidationError({"ids": "This field is required."})
+        if len(ids) > BATCH_MAX_IDS:
+            raise ValidationError({"ids": f"At most {BATCH_MAX_IDS} ids per request."})
+        return ids
+
+    @action(
+        detail=False,
+        methods=["get", "post"],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def batch(self, request):
+        """
+        Несколько постов за один запрос: `?ids=3,1,2` или POST {"ids": [...]}
+        для длинных списков. Один запрос постов и один — лайков пользователя;
+        порядок ответа совпадает с порядком ids, на месте отсутствующих
+        постов — {"id": ..., "error": "not_found"}.
+        """
+        ids = self.get_batch_ids(request)
+        posts = {post.pk: post for post in self.get_queryset().filter(pk__in=ids)}
+        ordered = [posts[post_id] for post_id in dict.fromkeys(ids) if post_id in posts]
+        data = self.get_serializer(ordered, many=True).data
+        by_id = {post.pk: item for post, item in zip(ordered, data)}
+        results = [
+            by_id.get(post_id, {"id": post_id, "error": "not_found"}) for post_id in ids
+        ]
+        return Response({"results": results})
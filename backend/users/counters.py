@@ -0,0 +1,151 @@
+"""
+Счетчики подписчиков / подписок в Profile.
+
+Раньше ProfileSerializer считал их двумя COUNT на каждый сериализуемый
+профиль (автор каждого поста и комментария, обе стороны подписки). Теперь
+это поля профиля, которые сигналы Follow и batch-подписки сдвигают атомарным
+UPDATE ... SET count = count + delta.
+
+Подписки на популярного тренера приходят пачками и упирались бы в одну строку
+профиля, поэтому для профилей с shard_followers_count прирост пишется в
+случайную из FOLLOWERS_COUNTER_SHARDS строк FollowerCountShard и суммируется
+при чтении. Флаг включает команда recalculate_follow_counts (или админ),
+когда подписчиков становится больше FOLLOWERS_COUNTER_SHARD_THRESHOLD.
+
+Batch-подписки сдвигают счетчики на число строк из RETURNING. Полный
+пересчет по таблице (recount_follow_counts) — только для ночной сверки.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from interactions.models import Follow
+
+from .models import FollowerCountShard, Profile
+
+SHARD_SUM_CACHE_KEY = "followers:shards:{}"
+SHARD_SUM_CACHE_TIMEOUT = 5  # Страница постов одного автора читает сумму один раз
+
+
+def adjust_following_count(user_id, delta):
+    if delta:
+        Profile.objects.filter(user_id=user_id).update(
+            following_count=Greatest(F("following_count") + delta, 0)
+        )
+
+
+def adjust_followers_count(user_ids, delta):
+    """Один UPDATE для обычных профилей; шардированные — через FollowerCountShard."""
+    user_ids = list(user_ids)
+    if not user_ids or not delta:
+        return
+    updated = Profile.objects.filter(
+        user_id__in=user_ids, shard_followers_count=False
+    ).update(followers_count=Greatest(F("followers_count") + delta, 0))
+    if updated == len(user_ids):
+        return
+    sharded = Profile.objects.filter(
+        user_id__in=user_ids, shard_followers_count=True
+    ).values_list("user_id", flat=True)
+    for user_id in sharded:
+        increment_shard(user_id, delta)
+
+
+def increment_shard(user_id, delta):
+    shard = random.randrange(settings.FOLLOWERS_COUNTER_SHARDS)
+    rows = FollowerCountShard.objects.filter(user_id=user_id, shard=shard)
+    if not rows.update(delta=F("delta") + delta):
+        # Строки шарда еще нет: создаем пустую (параллельный запрос мог
+        # успеть раньше) и повторяем UPDATE
+        FollowerCountShard.objects.bulk_create(
+            [FollowerCountShard(user_id=user_id, shard=shard)], ignore_conflicts=True
+        )
+        rows.update(delta=F("delta") + delta)
+    cache.delete(SHARD_SUM_CACHE_KEY.format(user_id))
+
+
+def shard_sum(user_id):
+    return cache.get_or_set(
+        SHARD_SUM_CACHE_KEY.format(user_id),
+        lambda: FollowerCountShard.objects.filter(user_id=user_id).aggregate(
+            total=Sum("delta")
+        )["total"]
+        or 0,
+        SHARD_SUM_CACHE_TIMEOUT,
+    )
+
+
+def get_followers_count(profile):
+    if not profile.shard_followers_count:
+        return profile.followers_count
+    return max(profile.followers_count + shard_sum(profile.user_id), 0)
+
+
+def fold_shards(user_id):
+    """
+    Переносит сумму шардов в Profile.followers_count. Строки шардов
+    блокируются, поэтому параллельный прирост либо попадает в сумму, либо
+    (после удаления строки) создает новый шард — и не теряется.
+    """
+    with transaction.atomic():
+        shards = list(
+            FollowerCountShard.objects.select_for_update()
+            .filter(user_id=user_id)
+            .values_list("pk", "delta")
+        )
+        if not shards:
+            return
+        FollowerCountShard.objects.filter(pk__in=[pk for pk, _ in shards]).delete()
+        Profile.objects.filter(user_id=user_id).update(
+            followers_count=Greatest(
+                F("followers_count") + sum(delta for _, delta in shards), 0
+            )
+        )
+    cache.delete(SHARD_SUM_CACHE_KEY.format(user_id))
+
+
+def _count_subquery(queryset, field, aggregate):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("user_id")})
+            .order_by()
+            .values(field)
+            .annotate(total=aggregate)
+            .values("total")
+        ),
+        0,
+    )
+
+
+def recount_follow_counts(user_ids):
+    """
+    Пересчитывает followers_count / following_count профилей по таблице
+    подписок. Вызывается внутри transaction.atomic().
+
+    Строки профилей сначала блокируются, и только следующий запрос считает
+    COUNT: подписка, уже сдвинувшая счетчик профиля, к этому моменту
+    закоммичена и попадает в COUNT, а ждущая блокировку сдвинет уже новое
+    значение. База шардированного счетчика — COUNT минус сумма шардов в том
+    же запросе (подписка коммитит строку Follow и свой шард вместе).
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    list(
+        Profile.objects.select_for_update()
+        .filter(user_id__in=user_ids)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    Profile.objects.filter(user_id__in=user_ids).update(
+        followers_count=Greatest(
+            _count_subquery(Follow.objects, "followed_id", Count("pk"))
+            - _count_subquery(FollowerCountShard.objects, "user_id", Sum("delta")),
+            0,
+        ),
+        following_count=_count_subquery(Follow.objects, "follower_id", Count("pk")),
+    )
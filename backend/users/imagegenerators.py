@@ -0,0 +1,19 @@
+from imagekit import ImageSpec, register
+from imagekit.processors import ResizeToFit
+
+from core.images import RenditionSet
+
+
+class Avatar(ImageSpec):
+    """Аватар профиля; применяется в фоне, см. core.images."""
+
+    processors = [ResizeToFit(width=200, height=200)]
+    format = "JPEG"
+    options = {"quality": 85}
+
+
+register.generator("users:avatar", Avatar)
+
+
+# 40px — строки комментариев, 96px — карточки; полный размер — сам Avatar
+AVATAR_RENDITIONS = RenditionSet("users:avatar", widths=(40, 96), full_width=200)
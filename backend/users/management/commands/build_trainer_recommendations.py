@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.recommendations import build_trainer_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds "who to follow" trainer recommendations for every user '
+        'from the co-follow graph.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users, rows = build_trainer_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Trainer recommendations built: {users} users, {rows} rows '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
@@ -3,7 +3,9 @@ from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
+from django.db.models import Count, Q
 
+from core.conditional import bump_versions
 from users.models import Profile
 from interactions.models import Follow, PostLike, Comment
 from posts.models import Post  # Import for actual post count
@@ -23,6 +25,9 @@ RECENT_ENG_FACTOR_B = 2.0
 
 RECENT_DAYS = 30
 
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PROGRESS_EVERY = 500
+
 class Command(BaseCommand):
     help = 'Calculates and updates trainer level scores based on various metrics.'
 
@@ -40,69 +45,147 @@ class Command(BaseCommand):
         except (ValueError, ZeroDivisionError):
             return 0
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of profiles written per bulk_update (default {DEFAULT_BATCH_SIZE}).',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=DEFAULT_PROGRESS_EVERY,
+            help=(
+                f'Print a progress line every N trainers (default {DEFAULT_PROGRESS_EVERY}, '
+                '0 disables). With --verbosity 2 every trainer is printed.'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the trainers whose score would change without saving anything.',
+        )
+
+    def count_by_author(self, queryset, author_field, recent_threshold):
+        """{user_id: (всего, за последние RECENT_DAYS)} одним GROUP BY."""
+        rows = (
+            queryset.order_by()
+            .values(author_field)
+            .annotate(
+                total=Count('id'),
+                recent=Count('id', filter=Q(created_at__gte=recent_threshold)),
+            )
+        )
+        return {row[author_field]: (row['total'], row['recent']) for row in rows}
+
+    def save_batch(self, batch):
+        try:
+            with transaction.atomic():
+                Profile.objects.bulk_update(batch, ['level_score', 'levels_last_calculated_at'])
+        except Exception as e:
+            raise CommandError(f"Error saving trainer levels: {e}")
+        # bulk_update не вызывает сигналы профиля (users.signals)
+        bump_versions('trainers', 'posts', *(f'user:{profile.user_id}' for profile in batch))
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting trainer level calculation...'))
 
         now = timezone.now()
         recent_threshold = now - timedelta(days=RECENT_DAYS)
-
-        trainers = Profile.objects.filter(role=Profile.Role.TRAINER).select_related('user')
-        total = trainers.count()
+        verbosity = options['verbosity']
+        progress_every = options['progress_every']
+        dry_run = options['dry_run']
+
+        trainers = list(
+            Profile.objects.filter(role=Profile.Role.TRAINER)
+            .select_related('user')
+            .only('id', 'user__id', 'user__username', 'level_score', 'levels_last_calculated_at')
+        )
+        total = len(trainers)
         self.stdout.write(f'Found {total} trainers to process.')
 
+        # Все метрики — четырьмя GROUP BY по всем тренерам сразу
+        trainer_ids = Profile.objects.filter(role=Profile.Role.TRAINER).values('user_id')
+        subs = self.count_by_author(
+            Follow.objects.filter(followed_id__in=trainer_ids), 'followed_id', recent_threshold
+        )
+        likes = self.count_by_author(
+            PostLike.objects.filter(post__author_id__in=trainer_ids), 'post__author_id', recent_threshold
+        )
+        comments = self.count_by_author(
+            Comment.objects.filter(post__author_id__in=trainer_ids), 'post__author_id', recent_threshold
+        )
+        post_counts = dict(
+            Post.objects.filter(author_id__in=trainer_ids)
+            .order_by()
+            .values('author_id')
+            .annotate(total=Count('id'))
+            .values_list('author_id', 'total')
+        )
+
+        batch = []
+        changed = 0
         for idx, profile in enumerate(trainers, start=1):
             trainer = profile.user
-            self.stdout.write(f'[{idx}/{total}] Processing: {trainer.username} (ID {trainer.id})')
-
-            try:
-                # 1) Level from total subscribers
-                subs_total = Follow.objects.filter(followed=trainer).count()
-                lvl_subs = self.get_level_from_formula(subs_total, SUBSCRIBER_BASE_A, SUBSCRIBER_FACTOR_B)
-
-                # 2) Level from actual average engagement per post (all time)
-                total_likes_all = PostLike.objects.filter(post__author=trainer).count()
-                total_comments_all = Comment.objects.filter(post__author=trainer).count()
-                total_engagement_all = total_likes_all + total_comments_all
-                post_count = Post.objects.filter(author=trainer).count()
-                avg_engagement = (total_engagement_all / post_count) if post_count > 0 else 0
-                lvl_avg_eng = self.get_level_from_formula(avg_engagement, ENGAGEMENT_BASE_A, ENGAGEMENT_FACTOR_B)
-
-                # 3) Level from recent subscriber gain
-                subs_recent = Follow.objects.filter(
-                    followed=trainer,
-                    created_at__gte=recent_threshold
-                ).count()
-                lvl_recent_subs = self.get_level_from_formula(subs_recent, RECENT_SUB_BASE_A, RECENT_SUB_FACTOR_B)
-
-                # 4) Level from recent total engagement
-                likes_recent = PostLike.objects.filter(
-                    post__author=trainer,
-                    created_at__gte=recent_threshold
-                ).count()
-                comments_recent = Comment.objects.filter(
-                    post__author=trainer,
-                    created_at__gte=recent_threshold
-                ).count()
-                total_eng_recent = likes_recent + comments_recent
-                lvl_recent_eng = self.get_level_from_formula(total_eng_recent, RECENT_ENG_BASE_A, RECENT_ENG_FACTOR_B)
-
-                # Sum components for final score
-                final_score = lvl_subs + lvl_avg_eng + lvl_recent_subs + lvl_recent_eng
-
-                # Save atomically
-                with transaction.atomic():
-                    profile.level_score = final_score
-                    profile.levels_last_calculated_at = now
-                    profile.save(update_fields=['level_score', 'levels_last_calculated_at'])
+            if verbosity >= 2:
+                self.stdout.write(f'[{idx}/{total}] Processing: {trainer.username} (ID {trainer.id})')
+
+            # 1) Level from total subscribers
+            subs_total, subs_recent = subs.get(trainer.id, (0, 0))
+            lvl_subs = self.get_level_from_formula(subs_total, SUBSCRIBER_BASE_A, SUBSCRIBER_FACTOR_B)
+
+            # 2) Level from actual average engagement per post (all time)
+            total_likes_all, likes_recent = likes.get(trainer.id, (0, 0))
+            total_comments_all, comments_recent = comments.get(trainer.id, (0, 0))
+            total_engagement_all = total_likes_all + total_comments_all
+            post_count = post_counts.get(trainer.id, 0)
+            avg_engagement = (total_engagement_all / post_count) if post_count > 0 else 0
+            lvl_avg_eng = self.get_level_from_formula(avg_engagement, ENGAGEMENT_BASE_A, ENGAGEMENT_FACTOR_B)
 
+            # 3) Level from recent subscriber gain
+            lvl_recent_subs = self.get_level_from_formula(subs_recent, RECENT_SUB_BASE_A, RECENT_SUB_FACTOR_B)
+
+            # 4) Level from recent total engagement
+            total_eng_recent = likes_recent + comments_recent
+            lvl_recent_eng = self.get_level_from_formula(total_eng_recent, RECENT_ENG_BASE_A, RECENT_ENG_FACTOR_B)
+
+            # Sum components for final score
+            final_score = lvl_subs + lvl_avg_eng + lvl_recent_subs + lvl_recent_eng
+
+            if verbosity >= 2:
                 self.stdout.write(self.style.SUCCESS(
                     f"  -> subs_total={subs_total}(lvl {lvl_subs}), "
                     f"avg_engagement={avg_engagement:.2f}(lvl {lvl_avg_eng}), "
                     f"subs_recent={subs_recent}(lvl {lvl_recent_subs}), "
                     f"eng_recent={total_eng_recent}(lvl {lvl_recent_eng}) => score={final_score}"
                 ))
-
-            except Exception as e:
-                raise CommandError(f"Error processing {trainer.username}: {e}")
-
-        self.stdout.write(self.style.SUCCESS('Trainer level calculation finished.'))
\ No newline at end of file
+            elif progress_every and idx % progress_every == 0:
+                self.stdout.write(f'Processed {idx}/{total} trainers...')
+
+            if profile.level_score != final_score:
+                changed += 1
+                if dry_run:
+                    self.stdout.write(
+                        f'  {trainer.username} (ID {trainer.id}): '
+                        f'{profile.level_score} -> {final_score}'
+                    )
+            if dry_run:
+                continue
+
+            profile.level_score = final_score
+            profile.levels_last_calculated_at = now
+            batch.append(profile)
+            if len(batch) >= options['batch_size']:
+                self.save_batch(batch)
+                batch = []
+
+        if batch:
+            self.save_batch(batch)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Dry run: {changed} of {total} trainer scores would change, nothing saved.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS('Trainer level calculation finished.'))
@@ -0,0 +1,146 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from core.conditional import bump_versions
+from interactions.models import Follow
+from posts.tasks import backfill_followers_task
+from posts.timeline import FANOUT_ON_READ_CACHE_KEY
+from users.counters import fold_shards, recount_follow_counts
+from users.models import FollowerCountShard, Profile
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Repairs drift in Profile.followers_count / following_count and switches '
+        'sharded follower counters and fan-out-on-read timelines on or off for '
+        'popular trainers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of profiles checked per batch (default {DEFAULT_BATCH_SIZE}).',
+        )
+
+    def _count_by_user(self, field, user_ids):
+        rows = (
+            Follow.objects.filter(**{f'{field}__in': user_ids})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('id'))
+        )
+        return {row[field]: row['total'] for row in rows}
+
+    def _shard_sums(self, user_ids):
+        rows = (
+            FollowerCountShard.objects.filter(user_id__in=user_ids)
+            .order_by()
+            .values('user_id')
+            .annotate(total=Sum('delta'))
+        )
+        return {row['user_id']: row['total'] for row in rows}
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        threshold = settings.FOLLOWERS_COUNTER_SHARD_THRESHOLD
+        fanout_threshold = settings.TIMELINE_FANOUT_THRESHOLD
+        self.stdout.write(self.style.SUCCESS('Starting follow counters reconciliation...'))
+
+        checked = 0
+        fixed = 0
+        last_pk = 0
+        while True:
+            # Keyset по pk, как в recalculate_post_counters
+            batch = list(
+                Profile.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only(
+                    'id',
+                    'user_id',
+                    'followers_count',
+                    'following_count',
+                    'shard_followers_count',
+                    'fanout_on_read',
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            user_ids = [profile.user_id for profile in batch]
+
+            followers = self._count_by_user('followed_id', user_ids)
+            following = self._count_by_user('follower_id', user_ids)
+            shards = self._shard_sums(user_ids)
+
+            drifted = []
+            unsharded = []
+            fanned_out = []
+            for profile in batch:
+                actual_followers = followers.get(profile.user_id, 0)
+                actual_following = following.get(profile.user_id, 0)
+                # Гистерезис: тренер на границе порога не переключается туда-обратно
+                shard = (
+                    actual_followers >= threshold
+                    if not profile.shard_followers_count
+                    else actual_followers >= threshold // 2
+                )
+                fanout_on_read = (
+                    actual_followers >= fanout_threshold
+                    if not profile.fanout_on_read
+                    else actual_followers >= fanout_threshold // 2
+                )
+                # База шардированного счетчика — без суммы шардов, сами шарды не трогаем
+                base = max(actual_followers - shards.get(profile.user_id, 0), 0)
+                if profile.shard_followers_count and not shard:
+                    unsharded.append(profile.user_id)
+                if profile.fanout_on_read and not fanout_on_read:
+                    fanned_out.append(profile.user_id)
+                if (
+                    profile.followers_count != base
+                    or profile.following_count != actual_following
+                    or profile.shard_followers_count != shard
+                    or profile.fanout_on_read != fanout_on_read
+                ):
+                    profile.shard_followers_count = shard
+                    profile.fanout_on_read = fanout_on_read
+                    drifted.append(profile)
+
+            if drifted:
+                # Значения выше прочитаны без блокировок и служат только для
+                # поиска расхождений: записываются счетчики, пересчитанные под
+                # блокировкой строк, иначе подписки между COUNT и записью
+                # потерялись бы
+                with transaction.atomic():
+                    recount_follow_counts([profile.user_id for profile in drifted])
+                    Profile.objects.bulk_update(
+                        drifted, ['shard_followers_count', 'fanout_on_read']
+                    )
+                    # Множество fan-out-on-read авторов перечитывается из флагов
+                    transaction.on_commit(partial(cache.delete, FANOUT_ON_READ_CACHE_KEY))
+                    # Вернувшиеся к fan-out-on-write авторы раскладывают старые
+                    # посты по лентам подписчиков; новые уже идут через fan_out_post
+                    for user_id in fanned_out:
+                        transaction.on_commit(partial(backfill_followers_task.delay, user_id))
+                # bulk_update не вызывает сигналы профиля
+                bump_versions(
+                    'trainers',
+                    'posts',
+                    *(f'user:{profile.user_id}' for profile in drifted),
+                )
+            for user_id in unsharded:
+                fold_shards(user_id)
+            checked += len(batch)
+            fixed += len(drifted)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Follow counters reconciliation finished: checked {checked}, fixed {fixed}.'
+        ))
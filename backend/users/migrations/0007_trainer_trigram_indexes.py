@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:27
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from core.migration_operations import RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_verificationtoken"),
+    ]
+
+    operations = [
+        # TrigramExtension сам пропускает не-PostgreSQL базы
+        TrigramExtension(),
+        RunPostgresSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS users_username_trgm_idx "
+                "ON auth_user USING gin (username gin_trgm_ops)"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS users_username_trgm_idx",
+        ),
+        RunPostgresSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS users_profile_bio_trgm_idx "
+                "ON users_profile USING gin (bio gin_trgm_ops)"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS users_profile_bio_trgm_idx",
+        ),
+    ]
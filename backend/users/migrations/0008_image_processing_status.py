@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+def mark_existing_avatars_ready(apps, schema_editor):
+    # Загруженные раньше файлы уже обработаны ProcessedImageField
+    Profile = apps.get_model("users", "profile")
+    Profile.objects.exclude(avatar__isnull=True).exclude(avatar="").update(
+        avatar_status="ready"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_trainer_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="avatar_status",
+            field=models.CharField(
+                choices=[
+                    ("none", "Нет изображения"),
+                    ("processing", "Обрабатывается"),
+                    ("ready", "Готово"),
+                    ("failed", "Ошибка обработки"),
+                ],
+                default="none",
+                max_length=10,
+                verbose_name="Статус аватара",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="profile",
+            name="avatar",
+            field=models.ImageField(
+                blank=True, null=True, upload_to="avatars/", verbose_name="Аватар"
+            ),
+        ),
+        migrations.RunPython(mark_existing_avatars_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_follow_counts(apps, schema_editor):
+    Profile = apps.get_model("users", "Profile")
+    Follow = apps.get_model("interactions", "Follow")
+
+    def total(field):
+        rows = (
+            Follow.objects.filter(**{field: OuterRef("user")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        return Coalesce(Subquery(rows), 0)
+
+    Profile.objects.update(
+        followers_count=total("followed"),
+        following_count=total("follower"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0008_image_processing_status"),
+        ("interactions", "0003_keyset_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Подписчики"),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Подписки"),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="shard_followers_count",
+            field=models.BooleanField(
+                default=False, verbose_name="Шардированный счетчик подписчиков"
+            ),
+        ),
+        migrations.CreateModel(
+            name="FollowerCountShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("delta", models.IntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "shard"), name="unique_follower_count_shard"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
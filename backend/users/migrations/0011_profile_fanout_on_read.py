@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_fanout_on_read(apps, schema_editor):
+    # Тот же набор, что раньше считался агрегатом по interactions_follow
+    Profile = apps.get_model("users", "Profile")
+    Follow = apps.get_model("interactions", "Follow")
+    author_ids = (
+        Follow.objects.order_by()
+        .values("followed")
+        .annotate(total=Count("pk"))
+        .filter(total__gte=settings.TIMELINE_FANOUT_THRESHOLD)
+        .values_list("followed", flat=True)
+    )
+    Profile.objects.filter(user__in=list(author_ids)).update(fanout_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_trainer_recommendations"),
+        ("interactions", "0003_keyset_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="fanout_on_read",
+            field=models.BooleanField(
+                default=False, verbose_name="Посты подмешиваются в ленты при чтении"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="profile",
+            index=models.Index(
+                condition=models.Q(("fanout_on_read", True)),
+                fields=["user"],
+                name="profile_fanout_on_read_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_fanout_on_read, migrations.RunPython.noop),
+    ]
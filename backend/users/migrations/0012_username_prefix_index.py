@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from core.migration_operations import RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_profile_fanout_on_read"),
+    ]
+
+    operations = [
+        # istartswith на PostgreSQL — UPPER(username::text) LIKE UPPER('abc%'):
+        # с text_pattern_ops это диапазонный скан при любой локали БД
+        RunPostgresSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS users_username_upper_prefix_idx "
+                "ON auth_user (UPPER(username::text) text_pattern_ops)"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS users_username_upper_prefix_idx",
+        ),
+    ]
@@ -2,12 +2,11 @@ from django.contrib.auth.models import User
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from imagekit import ImageSpec, register
-from imagekit.models import ProcessedImageField
-from imagekit.processors import ResizeToFit
 from django.utils import timezone
 import uuid
 
+from core.images import ImageStatus
+
 
 
 class Profile(models.Model):
@@ -25,15 +24,33 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     role = models.CharField(max_length=10, choices=Role.choices, default=Role.USER)
     bio = models.TextField(blank=True, null=True, verbose_name="О себе")
-    avatar = ProcessedImageField(
+    # Сохраняется как есть, ресайз — в фоне (users.imagegenerators.Avatar)
+    avatar = models.ImageField(
         upload_to="avatars/",
-        processors=[ResizeToFit(width=200, height=200)],
-        format="JPEG",
-        options={"quality": 85},
         null=True,
         blank=True,
         verbose_name="Аватар",
     )
+    avatar_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.NONE,
+        verbose_name="Статус аватара",
+    )
+    # Денормализованные счетчики подписок, поддерживаются сигналами Follow
+    # (users.counters). У популярных тренеров прирост подписчиков пишется
+    # в FollowerCountShard, а followers_count — база, к которой он прибавляется.
+    followers_count = models.PositiveIntegerField(default=0, verbose_name="Подписчики")
+    following_count = models.PositiveIntegerField(default=0, verbose_name="Подписки")
+    shard_followers_count = models.BooleanField(
+        default=False, verbose_name="Шардированный счетчик подписчиков"
+    )
+    # Посты не раскладываются по лентам подписчиков, а подмешиваются при
+    # чтении (posts.timeline). Включает recalculate_follow_counts по
+    # TIMELINE_FANOUT_THRESHOLD
+    fanout_on_read = models.BooleanField(
+        default=False, verbose_name="Посты подмешиваются в ленты при чтении"
+    )
     is_blocked = models.BooleanField(default=False, verbose_name='Заблокирован')
     can_monetize_posts = models.BooleanField(default=False, verbose_name='Может монетизировать посты')
     level_score = models.IntegerField(default=0, verbose_name='Общий уровень/ранк')
@@ -60,9 +77,33 @@ class Profile(models.Model):
         verbose_name="Время последнего запроса верификации"
     )
 
+    COUNTER_FIELDS = ("followers_count", "following_count")
+
+    class Meta:
+        indexes = [
+            # Множество fan-out-on-read авторов читается без скана профилей
+            models.Index(
+                fields=["user"],
+                condition=models.Q(fanout_on_read=True),
+                name="profile_fanout_on_read_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} ({self.get_role_display()}) - Ver: {self.get_verification_status_display()}"
 
+    def save(self, *args, **kwargs):
+        # Счетчики меняются только атомарными UPDATE (users.counters); обычное
+        # сохранение профиля (в т.ч. при каждом сохранении User) не должно
+        # перезаписывать их значениями, прочитанными раньше
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def is_trainer(self):
         return self.role == self.Role.TRAINER
@@ -79,13 +120,68 @@ class Profile(models.Model):
                 return False
         return True
 
+# Поля User, которые видны в сериализованном профиле и авторе поста
+PROFILE_VISIBLE_USER_FIELDS = {"username", "email", "first_name", "last_name"}
+
+
 # Сигнал для автоматического создания/обновления профиля при создании/обновлении User
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+    # Частичное сохранение служебных полей (last_login при входе) профиль не
+    # трогает: иначе каждый вход поднимал бы версии профиля и всех постов
+    if update_fields is not None and not set(update_fields) & PROFILE_VISIBLE_USER_FIELDS:
+        return
     instance.profile.save()
 
+class FollowerCountShard(models.Model):
+    """
+    Часть счетчика подписчиков популярного тренера: параллельные подписки
+    обновляют случайную из FOLLOWERS_COUNTER_SHARDS строк вместо одной строки
+    профиля. Итог = Profile.followers_count + сумма delta.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    shard = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "shard"], name="unique_follower_count_shard"
+            )
+        ]
+
+
+class TrainerRecommendation(models.Model):
+    """
+    «Кого читать»: top-K тренеров для пользователя, посчитанные ночной
+    задачей по графу совместных подписок (users.recommendations).
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="trainer_recommendations"
+    )
+    trainer = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="recommended_to"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Он же индекс для выдачи: (user, rank) одним диапазоном
+            models.UniqueConstraint(
+                fields=["user", "rank"], name="unique_trainer_recommendation_rank"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["computed_at"], name="trainer_rec_computed_idx"),
+        ]
+
+
 class VerificationToken(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='verification_tokens')
     token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
@@ -0,0 +1,215 @@
+"""
+Рекомендации тренеров «кого читать» по графу совместных подписок.
+
+Ночная задача строит разреженную матрицу пользователь × тренер из
+interactions_follow (CSR-массивы NumPy, без ORM-объектов) и считает:
+
+  1. похожесть тренеров — косинус по совместным подписчикам:
+     |F(a) ∩ F(b)| / sqrt(|F(a)| * |F(b)|); для каждого тренера остаются
+     RECOMMENDATIONS_SIMILAR_TRAINERS ближайших;
+  2. оценку кандидата для пользователя — сумму похожестей кандидата на
+     тренеров, на которых пользователь уже подписан; в таблицу
+     TrainerRecommendation пишутся RECOMMENDATIONS_PER_USER лучших, без
+     уже читаемых тренеров и самого пользователя.
+
+Оба шага идут блоками: плотная часть (блок × все тренеры) не превышает
+RECOMMENDATIONS_BLOCK_CELLS ячеек, а раскрытие пар подписок —
+RECOMMENDATIONS_PAIR_BUDGET элементов, поэтому память ограничена при любом
+числе подписок. Пользователи, читающие больше
+RECOMMENDATIONS_MAX_FOLLOWS_PER_USER тренеров (боты, «подписаться на всех»),
+в похожести не учитываются.
+
+Выдача (TrainerRecommendationsView) — один запрос по индексу (user, rank);
+подписки, оформленные после расчета, отфильтровываются в нем же.
+"""
+from dataclasses import dataclass
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from interactions.models import Follow
+
+from .models import TrainerRecommendation
+
+FETCH_CHUNK_SIZE = 10000
+WRITE_BATCH_SIZE = 5000
+
+
+@dataclass
+class FollowMatrix:
+    """Матрица подписок в CSR-виде: строки — пользователи, столбцы — тренеры."""
+
+    user_ids: np.ndarray  # id пользователя по номеру строки
+    trainer_ids: np.ndarray  # id тренера по номеру столбца
+    columns: np.ndarray  # номера тренеров, подряд по пользователям
+    indptr: np.ndarray  # строка u — columns[indptr[u]:indptr[u + 1]]
+
+    @property
+    def degree(self):
+        return np.diff(self.indptr)
+
+
+def load_follow_matrix():
+    rows = (
+        Follow.objects.order_by()
+        .values_list("follower_id", "followed_id")
+        .iterator(chunk_size=FETCH_CHUNK_SIZE)
+    )
+    pairs = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+    user_ids, users = np.unique(pairs[:, 0], return_inverse=True)
+    trainer_ids, trainers = np.unique(pairs[:, 1], return_inverse=True)
+    order = np.lexsort((trainers, users))
+    indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(users, minlength=len(user_ids)), out=indptr[1:])
+    return FollowMatrix(user_ids, trainer_ids, trainers[order], indptr)
+
+
+def expand_rows(matrix, rows):
+    """
+    Для каждой строки из `rows` — все ее столбцы: (номер в rows, столбец).
+    Векторная замена цикла по подпискам каждого пользователя.
+    """
+    lengths = matrix.degree[rows]
+    owners = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return owners, matrix.columns[np.repeat(matrix.indptr[rows], lengths) + offsets]
+
+
+def chunks_by_budget(lengths, budget):
+    """Разбивает позиции на отрезки, в которых сумма lengths не больше budget."""
+    start, total = 0, 0
+    for position, length in enumerate(lengths.tolist()):
+        if position > start and total + length > budget:
+            yield start, position
+            start, total = position, 0
+        total += length
+    if start < len(lengths):
+        yield start, len(lengths)
+
+
+def similar_trainers(matrix):
+    """
+    (neighbors, similarities) формы (тренеры × N): ближайшие по совместным
+    подписчикам тренеры и косинус до них (0 — соседа нет).
+    """
+    trainer_count = len(matrix.trainer_ids)
+    # Не больше, чем других тренеров (вызывается при trainer_count >= 2)
+    top = min(settings.RECOMMENDATIONS_SIMILAR_TRAINERS, trainer_count - 1)
+    neighbors = np.zeros((trainer_count, top), dtype=np.int64)
+    similarities = np.zeros((trainer_count, top), dtype=np.float32)
+
+    # Подписки по тренерам: (пользователь, тренер), только «обычные» пользователи
+    users = np.repeat(np.arange(len(matrix.user_ids)), matrix.degree)
+    light = matrix.degree[users] <= settings.RECOMMENDATIONS_MAX_FOLLOWS_PER_USER
+    users, trainers = users[light], matrix.columns[light]
+    order = np.argsort(trainers, kind="stable")
+    users, trainers = users[order], trainers[order]
+    popularity = np.bincount(trainers, minlength=trainer_count).astype(np.float64)
+    trainer_ptr = np.searchsorted(trainers, np.arange(trainer_count + 1))
+
+    block = max(1, settings.RECOMMENDATIONS_BLOCK_CELLS // trainer_count)
+    for low in range(0, trainer_count, block):
+        high = min(low + block, trainer_count)
+        co_follows = np.zeros((high - low) * trainer_count, dtype=np.float64)
+        entries = np.arange(trainer_ptr[low], trainer_ptr[high])
+        lengths = matrix.degree[users[entries]]
+        for start, stop in chunks_by_budget(lengths, settings.RECOMMENDATIONS_PAIR_BUDGET):
+            part = entries[start:stop]
+            owners, columns = expand_rows(matrix, users[part])
+            keys = (trainers[part][owners] - low) * trainer_count + columns
+            co_follows += np.bincount(keys, minlength=len(co_follows))
+        co_follows = co_follows.reshape(high - low, trainer_count)
+        co_follows[np.arange(high - low), np.arange(low, high)] = 0
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosine = co_follows / np.sqrt(np.outer(popularity[low:high], popularity))
+        cosine = np.nan_to_num(cosine, nan=0.0, posinf=0.0).astype(np.float32)
+        nearest = np.argpartition(-cosine, top - 1, axis=1)[:, :top]
+        neighbors[low:high] = nearest
+        similarities[low:high] = np.take_along_axis(cosine, nearest, axis=1)
+    return neighbors, similarities
+
+
+def score_users(matrix, neighbors, similarities, low, high):
+    """Оценки кандидатов для пользователей-строк [low, high): (строки × тренеры)."""
+    trainer_count = len(matrix.trainer_ids)
+    rows, followed = expand_rows(matrix, np.arange(low, high))
+    keys = rows[:, None] * trainer_count + neighbors[followed]
+    scores = np.bincount(
+        keys.ravel(),
+        weights=similarities[followed].ravel(),
+        minlength=(high - low) * trainer_count,
+    ).reshape(high - low, trainer_count)
+    # Уже читаемые тренеры и сам пользователь (если он тоже тренер)
+    scores[rows, followed] = 0
+    user_ids = matrix.user_ids[low:high]
+    own = np.minimum(np.searchsorted(matrix.trainer_ids, user_ids), trainer_count - 1)
+    trainers = np.flatnonzero(matrix.trainer_ids[own] == user_ids)
+    scores[trainers, own[trainers]] = 0
+    return scores
+
+
+def user_blocks(matrix, top):
+    """
+    Отрезки строк-пользователей для score_users: не больше
+    RECOMMENDATIONS_BLOCK_CELLS оценок и RECOMMENDATIONS_PAIR_BUDGET пар
+    (подписка, сосед) на отрезок.
+    """
+    block = max(1, settings.RECOMMENDATIONS_BLOCK_CELLS // len(matrix.trainer_ids))
+    lengths = matrix.degree * top
+    for start, stop in chunks_by_budget(lengths, settings.RECOMMENDATIONS_PAIR_BUDGET):
+        for low in range(start, stop, block):
+            yield low, min(low + block, stop)
+
+
+def top_recommendations(scores, per_user):
+    """[(строка, столбцы по убыванию оценки)] без нулевых оценок."""
+    per_user = min(per_user, scores.shape[1])
+    best = np.argpartition(-scores, per_user - 1, axis=1)[:, :per_user]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    for row in range(len(scores)):
+        positive = best_scores[row] > 0
+        yield row, best[row][positive], best_scores[row][positive]
+
+
+def write_recommendations(matrix, low, rows, computed_at):
+    user_ids = [int(user_id) for user_id in matrix.user_ids[low:low + len(rows)]]
+    objects = [
+        TrainerRecommendation(
+            user_id=user_ids[row],
+            trainer_id=int(matrix.trainer_ids[column]),
+            rank=rank,
+            score=float(score),
+            computed_at=computed_at,
+        )
+        for row, columns, scores in rows
+        for rank, (column, score) in enumerate(zip(columns, scores))
+    ]
+    # Читатель видит либо старый, либо новый список пользователя. На модель
+    # нет ни сигналов, ни ссылок, поэтому delete() — один DELETE без загрузки строк
+    with transaction.atomic():
+        TrainerRecommendation.objects.filter(user_id__in=user_ids).delete()
+        TrainerRecommendation.objects.bulk_create(objects, batch_size=WRITE_BATCH_SIZE)
+    return len(objects)
+
+
+def build_trainer_recommendations():
+    """Пересчитывает таблицу целиком; возвращает (пользователей, строк)."""
+    computed_at = timezone.now()
+    matrix = load_follow_matrix()
+    written = 0
+    if len(matrix.trainer_ids) > 1:
+        neighbors, similarities = similar_trainers(matrix)
+        for low, high in user_blocks(matrix, neighbors.shape[1]):
+            scores = score_users(matrix, neighbors, similarities, low, high)
+            rows = list(top_recommendations(scores, settings.RECOMMENDATIONS_PER_USER))
+            written += write_recommendations(matrix, low, rows, computed_at)
+    # Пользователи, которые больше ни на кого не подписаны
+    TrainerRecommendation.objects.filter(computed_at__lt=computed_at).delete()
+    return len(matrix.user_ids), written
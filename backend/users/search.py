@@ -0,0 +1,105 @@
+"""
+Автодополнение тренеров для пикера в UI.
+
+Короткий префикс (до AUTOCOMPLETE_PREFIX_LENGTH символов) ищется только
+по началу username: у 1-3 символов почти нет триграмм, и similarity
+ранжирует их случайно. Это диапазонный скан индекса по UPPER(username)
+(text_pattern_ops, миграция users 0012), порядок — по level_score.
+
+Длинный запрос на PostgreSQL идет по pg_trgm (word similarity) с
+GIN-индексами на auth_user.username и users_profile.bio (миграция users
+0007): username и bio ищутся двумя отдельными запросами, каждый по своему
+индексу, и склеиваются UNION ALL. OR через JOIN двух таблиц ни один из
+индексов использовать не дает. На SQLite — istartswith/icontains.
+
+Запросы приходят на каждое нажатие клавиши, а первые 1-3 символа у всех
+одинаковые, так что короткие префиксы кешируются на несколько секунд.
+"""
+from urllib.parse import quote
+
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Q
+
+from .models import Profile
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_CACHE_TTL = 30  # секунд
+AUTOCOMPLETE_PREFIX_LENGTH = 3  # Короткие префиксы: только username, с кешем
+ROW_FIELDS = ("id", "username", "profile__avatar", "profile__level_score")
+
+
+def _trainers():
+    return User.objects.filter(profile__role=Profile.Role.TRAINER, is_active=True)
+
+
+def _similar(field, term, limit):
+    lookup = {f"{field}__trigram_word_similar": term}
+    return (
+        _trainers()
+        .filter(**lookup)
+        .annotate(similarity=TrigramWordSimilarity(term, field))
+        .values(*ROW_FIELDS, "similarity")
+        .order_by("-similarity", "-profile__level_score", "id")[:limit]
+    )
+
+
+def _search(term, limit):
+    queryset = _trainers()
+    if len(term) <= AUTOCOMPLETE_PREFIX_LENGTH:
+        rows = (
+            queryset.filter(username__istartswith=term)
+            .order_by("-profile__level_score", "id")
+            .values(*ROW_FIELDS)[:limit]
+        )
+    elif connections[queryset.db].vendor == "postgresql":
+        rows = _similar("username", term, limit).union(
+            _similar("profile__bio", term, limit), all=True
+        )
+        # Тренер, найденный и по имени, и по bio, остается с лучшей оценкой
+        best = {}
+        for row in sorted(
+            rows, key=lambda row: (-row["similarity"], -row["profile__level_score"], row["id"])
+        ):
+            best.setdefault(row["id"], row)
+        rows = list(best.values())
+    else:
+        rows = queryset.filter(
+            Q(username__istartswith=term) | Q(profile__bio__icontains=term)
+        ).order_by("-profile__level_score", "id").values(*ROW_FIELDS)
+
+    return [
+        {
+            "id": row["id"],
+            "username": row["username"],
+            "avatar_url": default_storage.url(row["profile__avatar"])
+            if row["profile__avatar"]
+            else None,
+            "level_score": row["profile__level_score"],
+        }
+        for row in rows[:limit]
+    ]
+
+
+def autocomplete_trainers(term, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Возвращает компактный список тренеров (id, username, avatar_url,
+    level_score) — без сериализаторов и без JOIN'ов на подписки.
+    avatar_url здесь относительный или None; абсолютный URL строит view.
+    """
+    term = term.strip()
+    if not term:
+        return []
+    if len(term) > AUTOCOMPLETE_PREFIX_LENGTH:
+        return _search(term, limit)
+
+    key = f"trainers:autocomplete:{limit}:{quote(term.lower())}"
+    results = cache.get(key)
+    if results is None:
+        results = _search(term, limit)
+        cache.set(key, results, AUTOCOMPLETE_CACHE_TTL)
+    return results
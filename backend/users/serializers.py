@@ -1,16 +1,46 @@
 # users/serializers.py
+from functools import partial
+
 from django.contrib.auth.models import User
+from django.db import models
 from rest_framework import serializers
+
+from core.images import ImageStatus
+from core.loaders import MembershipLoader, get_context_loader
+from core.serializers import DynamicFieldsMixin
+from core.uploads import confirm_upload
+
+from .counters import get_followers_count
+from .imagegenerators import AVATAR_RENDITIONS
 from .models import Profile
 
+DEFAULT_AVATAR_URL = "https://fitness-platform-media.s3.eu-north-1.amazonaws.com/media/default/default-avatar-icon.jpg"
+
+
+def build_avatar_url(profile, request):
+    if profile.avatar and hasattr(profile.avatar, "url") and request:
+        try:
+            return request.build_absolute_uri(profile.avatar.url)
+        except ValueError:
+            return profile.avatar.url
+    return DEFAULT_AVATAR_URL
+
+
+def build_avatar_renditions(profile, request):
+    """{"jpeg": {"40w": url, ...}, "webp": {...}} или None, пока аватар не готов."""
+    if not profile.avatar or profile.avatar_status != ImageStatus.READY:
+        return None
+    return AVATAR_RENDITIONS.urls(
+        profile.avatar, request.build_absolute_uri if request else None
+    )
+
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(source="user.username", read_only=True)
     email = serializers.EmailField(source="user.email", read_only=True)  # Добавлено email
     role_display = serializers.CharField(source="get_role_display", read_only=True)
     avatar_url = serializers.SerializerMethodField()
     followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField() 
     verification_status_display = serializers.CharField(source='get_verification_status_display', read_only=True)
     can_request_verification_status = serializers.BooleanField(source='can_request_verification', read_only=True)
 
@@ -22,6 +52,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             'role_display',
             'bio', 'avatar',
             'avatar_url',
+            'avatar_status',
             'is_blocked',
             'can_monetize_posts',
             'level_score',
@@ -39,6 +70,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             'role_display',
             'is_blocked',
             'avatar_url',
+            'avatar_status',
             'followers_count',
             'following_count',
             'verification_status',
@@ -50,31 +82,97 @@ class ProfileSerializer(serializers.ModelSerializer):
         extra_kwargs = {"avatar": {"write_only": True}}
 
     def get_avatar_url(self, obj):
-        request = self.context.get("request")
-        if obj.avatar and hasattr(obj.avatar, "url") and request:
-            try:
-                return request.build_absolute_uri(obj.avatar.url)
-            except ValueError:
-                return obj.avatar.url
-        return "https://fitness-platform-media.s3.eu-north-1.amazonaws.com/media/default/default-avatar-icon.jpg"
+        return build_avatar_url(obj, self.context.get("request"))
     
     def get_followers_count(self, obj):
-        if hasattr(obj.user, 'followers'):
-            return obj.user.followers.count()
-        return 0
+        # Хранится в профиле (users.counters), у популярных тренеров + шарды
+        return get_followers_count(obj)
+
+
+def get_followed_users_loader(context):
+    """
+    Общий на запрос загрузчик «подписан ли текущий пользователь на X»
+    (граф подписок, interactions.follow_graph). None для анонима.
+    """
+    from interactions.follow_graph import following_among
+
+    request = context.get("request")
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return None
+    return get_context_loader(
+        context,
+        "followed_users",
+        lambda: MembershipLoader(partial(following_among, user.pk)),
+    )
+
+
+def prime_followed_users(serializer, user_ids):
+    """
+    Проверяет подписку на всех `user_ids` одним обращением к графу.
+    `serializer` — UserSerializer (в т.ч. вложенный), для которого они
+    будут сериализованы; если ?fields= исключает is_followed_by_me, ничего не делает.
+    """
+    if serializer is None or "is_followed_by_me" not in serializer.fields:
+        return
+    loader = get_followed_users_loader(serializer.context)
+    if loader is not None:
+        loader.prime(user_ids)
+
+
+class UserListSerializer(serializers.ListSerializer):
+    """Список пользователей: is_followed_by_me для всей страницы одним обращением."""
 
-    def get_following_count(self, obj):
-        if hasattr(obj.user, 'following'):
-            return obj.user.following.count()
-        return 0
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        prime_followed_users(self.child, [user.pk for user in users])
+        return super().to_representation(users)
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
+    # Для компактного автора: ?fields=author.id,author.username,author.avatar_url
+    avatar_url = serializers.SerializerMethodField()
+    # Уменьшенные копии аватара только здесь: пользователь встраивается в
+    # посты и списки, а вложенный профиль повторял бы те же URL
+    avatar_renditions = serializers.SerializerMethodField()
+    # Для кнопки Follow/Unfollow; зависит от пользователя запроса
+    is_followed_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'first_name', 'last_name', 'email', 'profile']
+        fields = ['id', 'username', 'first_name', 'last_name', 'email', 'avatar_url', 'avatar_renditions', 'is_followed_by_me', 'profile']
         read_only_fields = ['id', 'username', 'email'] # Email тоже лучше сделать read_only здесь
+        list_serializer_class = UserListSerializer
+
+    def get_avatar_url(self, obj):
+        profile = getattr(obj, 'profile', None)
+        if profile is None:
+            return DEFAULT_AVATAR_URL
+        return build_avatar_url(profile, self.context.get("request"))
+
+    def get_avatar_renditions(self, obj):
+        profile = getattr(obj, 'profile', None)
+        if profile is None:
+            return None
+        return build_avatar_renditions(profile, self.context.get("request"))
+
+    def get_is_followed_by_me(self, obj):
+        # Для списков загрузчик уже заполнен (UserListSerializer, посты, подписки)
+        loader = get_followed_users_loader(self.context)
+        if loader is None:
+            return False
+        return loader.contains(obj.pk)
+
+
+class CompactUserSerializer(UserSerializer):
+    """Пользователь в длинных списках (подписчики, подписки): без профиля."""
+
+    profile = None
+
+    class Meta(UserSerializer.Meta):
+        fields = ['id', 'username', 'avatar_url', 'avatar_renditions', 'is_followed_by_me']
+
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -127,18 +225,33 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
     
 class TrainerVerificationRequestSerializer(serializers.ModelSerializer):
+    # Документ можно передать файлом (multipart) или ключом прямой загрузки
+    # в storage (см. core.uploads) — тогда файл не проходит через Django
+    identity_document_key = serializers.CharField(write_only=True, required=False)
+    qualification_document_key = serializers.CharField(write_only=True, required=False)
+
     class Meta:
         model = Profile
-        fields = ['identity_document', 'qualification_document']
+        fields = [
+            'identity_document', 'qualification_document',
+            'identity_document_key', 'qualification_document_key',
+        ]
         # Можно добавить валидацию на типы файлов, размер и т.д.
         # например, serializers.FileField(validators=[...])
 
+    def validate_identity_document_key(self, value):
+        return confirm_upload(self.context['request'].user, 'identity_document', value)
+
+    def validate_qualification_document_key(self, value):
+        return confirm_upload(self.context['request'].user, 'qualification_document', value)
+
     def validate(self, attrs):
         user = self.context['request'].user
         if not user.profile.can_request_verification:
             raise serializers.ValidationError("Вы не можете подать заявку на верификацию в данный момент.")
-        if not attrs.get('identity_document'):
-            raise serializers.ValidationError({"identity_document": "Это поле обязательно."})
-        if not attrs.get('qualification_document'):
-            raise serializers.ValidationError({"qualification_document": "Это поле обязательно."})
+        for field in ('identity_document', 'qualification_document'):
+            document = attrs.pop(f'{field}_key', None) or attrs.get(field)
+            if not document:
+                raise serializers.ValidationError({field: "Это поле обязательно."})
+            attrs[field] = document
         return attrs
\ No newline at end of file
@@ -0,0 +1,34 @@
+# users/signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.conditional import bump_versions
+from core.images import mark_image_upload
+
+from .models import Profile
+from .tasks import process_avatar_task
+
+
+@receiver(pre_save, sender=Profile)
+def avatar_uploaded(sender, instance, **kwargs):
+    instance._avatar_uploaded = mark_image_upload(instance, "avatar", "avatar_status")
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    # Сохранение User пересохраняет профиль (кроме частичных сохранений
+    # служебных полей, см. users.models), так что здесь ловятся и изменения
+    # username/email. Профиль автора виден в постах.
+    bump_versions(f"user:{instance.user_id}", "trainers", "posts")
+
+
+
+@receiver(post_save, sender=Profile)
+def process_uploaded_avatar(sender, instance, **kwargs):
+    if getattr(instance, "_avatar_uploaded", False):
+        instance._avatar_uploaded = False
+        transaction.on_commit(partial(process_avatar_task.delay, instance.pk))
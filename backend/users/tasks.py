@@ -27,4 +27,53 @@ def generate_daily_activity_task():
         call_command('generate_daily_activity')
         logger.info("Successfully finished daily activity generation.")
     except Exception as e:
-        logger.error(f"Error during scheduled daily activity generation: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Error during scheduled daily activity generation: {e}", exc_info=True)
+
+
+@shared_task(name="build_trainer_recommendations")
+def build_trainer_recommendations_task():
+    """
+    Celery задача для запуска build_trainer_recommendations.
+    """
+    try:
+        logger.info("Starting scheduled trainer recommendations build...")
+        call_command('build_trainer_recommendations')
+        logger.info("Successfully finished trainer recommendations build.")
+    except Exception as e:
+        logger.error(f"Error during trainer recommendations build: {e}", exc_info=True)
+
+
+@shared_task(name="recalculate_follow_counts")
+def recalculate_follow_counts_task():
+    """
+    Celery задача для запуска recalculate_follow_counts.
+    """
+    try:
+        logger.info("Starting scheduled follow counters reconciliation...")
+        call_command('recalculate_follow_counts')
+        logger.info("Successfully finished follow counters reconciliation.")
+    except Exception as e:
+        logger.error(f"Error during follow counters reconciliation: {e}", exc_info=True)
+
+
+@shared_task(name="process_avatar")
+def process_avatar_task(profile_id):
+    """
+    Ресайз загруженного аватара и атомарная подмена файла.
+    """
+    from core.conditional import bump_versions
+    from core.images import process_image
+
+    from .imagegenerators import AVATAR_RENDITIONS
+    from .models import Profile
+
+    if process_image(
+        Profile,
+        profile_id,
+        "avatar",
+        "avatar_status",
+        "users.imagegenerators.Avatar",
+        renditions=AVATAR_RENDITIONS,
+    ):
+        user_id = Profile.objects.filter(pk=profile_id).values_list("user_id", flat=True).first()
+        bump_versions(f"user:{user_id}", "trainers", "posts")
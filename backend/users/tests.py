@@ -1,9 +1,27 @@
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from .models import Profile
+from interactions.models import Comment, Follow, PostLike
+from posts.models import Post
+from posts.timeline import get_fanout_on_read_author_ids
+
+from .counters import adjust_followers_count, get_followers_count
+from .models import FollowerCountShard, Profile, TrainerRecommendation
+from .recommendations import build_trainer_recommendations
 
 
 class UserAuthTests(APITestCase):
@@ -184,3 +202,438 @@ class ProfileViewTests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["username"], self.user1.username)
+
+
+class TrainerListQueryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        for i in range(3):
+            trainer = User.objects.create_user(
+                username=f"trainer{i}", password="password123"
+            )
+            trainer.profile.role = Profile.Role.TRAINER
+            trainer.profile.save()
+            Follow.objects.create(follower=self.user, followed=trainer)
+        self.client.force_authenticate(user=self.user)
+
+    def test_follow_counts_are_stored(self):
+        url = reverse("all-trainers-list")
+        # COUNT для пагинации + сама страница + подписки пользователя для
+        # is_followed_by_me (один раз на страницу)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data["results"]:
+            self.assertEqual(item["profile"]["followers_count"], 1)
+            self.assertEqual(item["profile"]["following_count"], 0)
+            self.assertTrue(item["is_followed_by_me"])
+
+    def test_followed_flag_uses_follow_graph(self):
+        url = reverse("top-trainers-list") + "?fields=username,is_followed_by_me"
+        with self.assertNumQueries(3):  # COUNT + страница + подписки пользователя
+            self.client.get(url)
+        with self.assertNumQueries(2):  # Подписки уже в графе
+            self.client.get(url)
+
+        Follow.objects.filter(follower=self.user, followed__username="trainer0").delete()
+        response = self.client.get(url)
+        self.assertEqual(
+            {
+                item["username"]: item["is_followed_by_me"]
+                for item in response.data["results"]
+            },
+            {"trainer0": False, "trainer1": True, "trainer2": True},
+        )
+
+    def test_compact_fields(self):
+        url = reverse("all-trainers-list") + "?fields=id,username,avatar_url"
+        response = self.client.get(url)
+        self.assertEqual(
+            set(response.data["results"][0]), {"id", "username", "avatar_url"}
+        )
+
+
+class FollowCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainer = User.objects.create_user(username="trainer", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.users = [
+            User.objects.create_user(username=f"user{i}", password="password123")
+            for i in range(3)
+        ]
+
+    def counts(self, user):
+        profile = Profile.objects.get(user=user)
+        return get_followers_count(profile), profile.following_count
+
+    def test_follow_and_unfollow_update_counts(self):
+        for user in self.users:
+            Follow.objects.create(follower=user, followed=self.trainer)
+        self.assertEqual(self.counts(self.trainer), (3, 0))
+        self.assertEqual(self.counts(self.users[0]), (0, 1))
+
+        Follow.objects.filter(follower=self.users[0]).delete()
+        self.assertEqual(self.counts(self.trainer), (2, 0))
+        self.assertEqual(self.counts(self.users[0]), (0, 0))
+
+    def test_profile_save_keeps_counters(self):
+        profile = self.trainer.profile  # Загружен до подписки
+        Follow.objects.create(follower=self.users[0], followed=self.trainer)
+        profile.bio = "Новое описание"
+        profile.save()
+        self.assertEqual(self.counts(self.trainer), (1, 0))
+
+    @patch("posts.tasks.backfill_timeline_task.delay")
+    def test_batch_follow_counts_only_inserted_rows(self, backfill):
+        from interactions import batch
+
+        user = self.users[0]
+        original = batch.insert_follows
+
+        def follow_concurrently(user_id, followed_ids):
+            # Одиночная подписка закоммичена между проверкой и INSERT'ом пачки
+            Follow.objects.create(follower=user, followed=self.trainer)
+            return original(user_id, followed_ids)
+
+        self.client.force_authenticate(user=user)
+        with patch.object(batch, "insert_follows", side_effect=follow_concurrently):
+            response = self.client.post(
+                reverse("follow-batch"), {"follow": [self.trainer.pk]}, format="json"
+            )
+        self.assertEqual(response.data["results"][0]["status"], "followed")
+        self.assertEqual(self.counts(self.trainer), (1, 0))
+        self.assertEqual(self.counts(user), (0, 1))
+
+    @patch("posts.tasks.backfill_timeline_task.delay")
+    @patch("posts.tasks.remove_author_from_timeline_task.delay")
+    def test_batch_follow_of_sharded_trainer_goes_to_shards(self, remove, backfill):
+        Profile.objects.filter(user=self.trainer).update(shard_followers_count=True)
+        user = self.users[0]
+        self.client.force_authenticate(user=user)
+        url = reverse("follow-batch")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {"follow": [self.trainer.pk]}, format="json")
+        self.assertFalse(any("FOR UPDATE" in query["sql"] for query in queries))
+        self.assertEqual(Profile.objects.get(user=self.trainer).followers_count, 0)
+        self.assertEqual(self.counts(self.trainer), (1, 0))
+
+        self.client.post(url, {"unfollow": [self.trainer.pk]}, format="json")
+        self.assertEqual(self.counts(self.trainer), (0, 0))
+        self.assertEqual(self.counts(user), (0, 0))
+
+    @override_settings(FOLLOWERS_COUNTER_SHARDS=4)
+    def test_sharded_counter_is_summed_on_read(self):
+        Profile.objects.filter(user=self.trainer).update(
+            shard_followers_count=True, followers_count=10
+        )
+        for user in self.users:
+            Follow.objects.create(follower=user, followed=self.trainer)
+        adjust_followers_count([self.trainer.pk], -1)
+
+        profile = Profile.objects.get(user=self.trainer)
+        self.assertEqual(profile.followers_count, 10)
+        self.assertEqual(get_followers_count(profile), 12)
+        self.assertTrue(FollowerCountShard.objects.filter(user=self.trainer).exists())
+
+    @override_settings(FOLLOWERS_COUNTER_SHARD_THRESHOLD=2)
+    def test_reconcile_command_fixes_drift_and_enables_sharding(self):
+        for user in self.users:
+            Follow.objects.create(follower=user, followed=self.trainer)
+        Profile.objects.filter(user=self.trainer).update(followers_count=100)
+        Profile.objects.filter(user=self.users[0]).update(following_count=7)
+
+        out = StringIO()
+        call_command("recalculate_follow_counts", stdout=out)
+        self.assertIn("fixed 2", out.getvalue())
+
+        profile = Profile.objects.get(user=self.trainer)
+        self.assertTrue(profile.shard_followers_count)
+        self.assertEqual(get_followers_count(profile), 3)
+        self.assertEqual(self.counts(self.users[0]), (0, 1))
+
+        # Прирост идет в шарды, сумма сходится после повторной сверки
+        Follow.objects.filter(follower=self.users[0]).delete()
+        call_command("recalculate_follow_counts", stdout=StringIO())
+        self.assertEqual(self.counts(self.trainer), (2, 0))
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=3)
+    @patch("posts.tasks.backfill_followers_task.delay")
+    def test_reconcile_command_switches_fanout_on_read(self, backfill):
+        for user in self.users:
+            Follow.objects.create(follower=user, followed=self.trainer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("recalculate_follow_counts", stdout=StringIO())
+        self.assertTrue(Profile.objects.get(user=self.trainer).fanout_on_read)
+        self.assertEqual(get_fanout_on_read_author_ids(), {self.trainer.pk})
+
+        # Гистерезис: ниже порога, но не ниже половины — режим не меняется
+        Follow.objects.filter(follower=self.users[0]).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("recalculate_follow_counts", stdout=StringIO())
+        self.assertTrue(Profile.objects.get(user=self.trainer).fanout_on_read)
+
+        Follow.objects.filter(follower__in=self.users[1:]).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("recalculate_follow_counts", stdout=StringIO())
+        self.assertFalse(Profile.objects.get(user=self.trainer).fanout_on_read)
+        self.assertEqual(get_fanout_on_read_author_ids(), set())
+        backfill.assert_called_once_with(self.trainer.pk)
+
+
+class TrainerRecommendationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.trainers = []
+        for i in range(4):
+            trainer = User.objects.create_user(username=f"trainer{i}", password="password123")
+            trainer.profile.role = Profile.Role.TRAINER
+            trainer.profile.save()
+            self.trainers.append(trainer)
+        t0, t1, t2, _ = self.trainers
+        self.ann, self.bob, self.cat = (
+            User.objects.create_user(username=name, password="password123")
+            for name in ("ann", "bob", "cat")
+        )
+        for user, followed in (
+            (self.ann, [t0, t1]),
+            (self.bob, [t0, t1, t2]),
+            (self.cat, [t0]),
+        ):
+            for trainer in followed:
+                Follow.objects.create(follower=user, followed=trainer)
+
+    def recommended(self, user):
+        return list(
+            TrainerRecommendation.objects.filter(user=user)
+            .order_by("rank")
+            .values_list("trainer__username", flat=True)
+        )
+
+    def test_co_followed_trainers_are_ranked(self):
+        self.assertEqual(build_trainer_recommendations(), (3, 3))
+        # t1 чаще читают вместе с t0, чем t2
+        self.assertEqual(self.recommended(self.cat), ["trainer1", "trainer2"])
+        self.assertEqual(self.recommended(self.ann), ["trainer2"])
+        self.assertEqual(self.recommended(self.bob), [])
+
+    @override_settings(RECOMMENDATIONS_BLOCK_CELLS=4, RECOMMENDATIONS_PAIR_BUDGET=3)
+    def test_small_blocks_give_same_result(self):
+        build_trainer_recommendations()
+        self.assertEqual(self.recommended(self.cat), ["trainer1", "trainer2"])
+        self.assertEqual(self.recommended(self.ann), ["trainer2"])
+
+    def test_rebuild_drops_users_without_follows(self):
+        build_trainer_recommendations()
+        Follow.objects.filter(follower=self.cat).delete()
+        build_trainer_recommendations()
+        self.assertEqual(self.recommended(self.cat), [])
+
+    def test_endpoint_skips_trainers_followed_since_build(self):
+        call_command("build_trainer_recommendations", stdout=StringIO())
+        Follow.objects.create(follower=self.cat, followed=self.trainers[1])
+        self.client.force_authenticate(user=self.cat)
+        url = reverse("trainer-recommendations") + "?fields=id,username"
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["username"] for item in response.data], ["trainer2"])
+
+
+class CalculateTrainerLevelsTests(APITestCase):
+    def setUp(self):
+        self.trainer = self.make_trainer("trainer")
+        fans = [
+            User.objects.create_user(username=f"fan{i}", password="password123")
+            for i in range(9)
+        ]
+        first, second = (
+            Post.objects.create(author=self.trainer, content=f"Post {i}") for i in range(2)
+        )
+        for fan in fans[:5]:
+            Follow.objects.create(follower=fan, followed=self.trainer)
+            PostLike.objects.create(user=fan, post=first)
+        for fan in fans[5:]:
+            PostLike.objects.create(user=fan, post=second)
+        Comment.objects.create(author=fans[0], post=first, content="Отлично")
+        Follow.objects.filter(follower=fans[0]).update(
+            created_at=timezone.now() - timedelta(days=60)
+        )
+
+    def make_trainer(self, username):
+        trainer = User.objects.create_user(username=username, password="password123")
+        trainer.profile.role = Profile.Role.TRAINER
+        trainer.profile.save()
+        return trainer
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("calculate_trainer_levels", *args, stdout=out)
+        return out.getvalue()
+
+    def test_scores_are_computed_with_aggregates(self):
+        # subs_total=5 (0) + avg_engagement=5.00 (1) + subs_recent=4 (1) + eng_recent=10 (2)
+        out = self.run_command("--verbosity", "2")
+        self.assertIn(
+            "subs_total=5(lvl 0), avg_engagement=5.00(lvl 1), "
+            "subs_recent=4(lvl 1), eng_recent=10(lvl 2) => score=4",
+            out,
+        )
+        profile = Profile.objects.get(user=self.trainer)
+        self.assertEqual(profile.level_score, 4)
+        self.assertIsNotNone(profile.levels_last_calculated_at)
+
+    def test_query_count_does_not_grow_with_trainers(self):
+        with CaptureQueriesContext(connection) as one_trainer:
+            self.run_command()
+        for i in range(3):
+            self.make_trainer(f"extra{i}")
+        with CaptureQueriesContext(connection) as four_trainers:
+            self.run_command()
+        self.assertEqual(len(one_trainer), len(four_trainers))
+
+    def test_dry_run_prints_diff_without_saving(self):
+        out = self.run_command("--dry-run")
+        self.assertIn("trainer (ID %d): 0 -> 4" % self.trainer.pk, out)
+        self.assertIn("Dry run: 1 of 1 trainer scores would change", out)
+        profile = Profile.objects.get(user=self.trainer)
+        self.assertEqual(profile.level_score, 0)
+        self.assertIsNone(profile.levels_last_calculated_at)
+
+
+class TrainerAutocompleteTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.anna = User.objects.create_user(username="anna_fit", password="password123")
+        self.andrew = User.objects.create_user(username="andrew", password="password123")
+        for trainer, score in ((self.anna, 10), (self.andrew, 30)):
+            trainer.profile.role = Profile.Role.TRAINER
+            trainer.profile.level_score = score
+            trainer.profile.save()
+        User.objects.create_user(username="anton", password="password123")  # не тренер
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("trainer-autocomplete")
+
+    def test_returns_compact_trainer_payload(self):
+        response = self.client.get(self.url, {"q": "an"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["username"] for item in response.data], ["andrew", "anna_fit"])
+        self.assertEqual(
+            set(response.data[0]), {"id", "username", "avatar_url", "level_score"}
+        )
+
+    def test_short_prefixes_are_cached(self):
+        self.client.get(self.url, {"q": "an"})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"q": "AN"})
+        self.assertEqual(len(response.data), 2)
+
+    def test_empty_query(self):
+        response = self.client.get(self.url, {"q": " "})
+        self.assertEqual(response.data, [])
+
+    def test_short_prefix_matches_username_start_only(self):
+        self.andrew.profile.bio = "Bench press and deadlift"
+        self.andrew.profile.save()
+        response = self.client.get(self.url, {"q": "fit"})
+        self.assertEqual(response.data, [])
+        response = self.client.get(self.url, {"q": "be"})
+        self.assertEqual(response.data, [])
+
+
+@override_settings(CONDITIONAL_GET_ENABLED=True)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.trainer = User.objects.create_user(username="trainer1", password="password123")
+        self.trainer.profile.role = Profile.Role.TRAINER
+        self.trainer.profile.save()
+        self.client.force_authenticate(user=self.user)
+
+    def test_me_not_modified_until_profile_changes(self):
+        url = reverse("current-user-detail")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.user.profile.bio = "Updated"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["profile"]["bio"], "Updated")
+
+    @patch("posts.tasks.backfill_timeline_task.delay")
+    def test_top_trainers_invalidated_by_follow(self, backfill):
+        url = reverse("top-trainers-list")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.user, followed=self.trainer)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(
+    DIRECT_UPLOAD_BACKEND="core.uploads.FileSystemUploadBackend",
+    STORAGES={
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tempfile.mkdtemp(), "base_url": "/media/"},
+        },
+    },
+)
+class VerificationDirectUploadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user1", password="password123")
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, target):
+        response = self.client.post(
+            reverse("direct-upload-presign"),
+            {"target": target, "content_type": "application/pdf", "size": 9},
+            format="json",
+        )
+        upload = response.data["upload"]
+        self.client.generic(
+            upload["method"], upload["url"], b"%PDF-1.4\n", content_type="application/pdf"
+        )
+        return response.data["key"]
+
+    def test_request_verification_with_uploaded_keys(self):
+        identity = self.upload("identity_document")
+        qualification = self.upload("qualification_document")
+        response = self.client.post(
+            reverse("request-trainer-verification"),
+            {"identity_document_key": identity, "qualification_document_key": qualification},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.identity_document.name, identity)
+        self.assertEqual(self.user.profile.qualification_document.name, qualification)
+        self.assertEqual(
+            self.user.profile.verification_status, Profile.VerificationStatus.PENDING
+        )
+
+    def test_upload_must_match_signed_content_type(self):
+        response = self.client.post(
+            reverse("direct-upload-presign"),
+            {"target": "identity_document", "content_type": "application/pdf", "size": 9},
+            format="json",
+        )
+        upload = response.data["upload"]
+        put = self.client.generic(
+            upload["method"], upload["url"], b"<html>", content_type="text/html"
+        )
+        self.assertEqual(put.status_code, status.HTTP_400_BAD_REQUEST)
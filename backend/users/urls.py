@@ -10,6 +10,8 @@ from .views import (
     TopTrainersListView,
     CurrentUserDetailView,
     AllTrainersListView,
+    TrainerRecommendationsView,
+    TrainerAutocompleteView,
     RequestTrainerVerificationView,
     AdminVerifyTrainerView,
     ProcessTrainerVerificationView,
@@ -27,6 +29,8 @@ urlpatterns = [
     path("", include(router.urls)),
     path('trainers/top/', TopTrainersListView.as_view(), name='top-trainers-list'),
     path('trainers/all/', AllTrainersListView.as_view(), name='all-trainers-list'),
+    path('trainers/recommended/', TrainerRecommendationsView.as_view(), name='trainer-recommendations'),
+    path('trainers/autocomplete/', TrainerAutocompleteView.as_view(), name='trainer-autocomplete'),
     # Admin actions
     path("<int:pk>/block/", AdminUserBlockView.as_view(), name="admin-user-block"),
     path("<int:pk>/unblock/", AdminUserUnblockView.as_view(), name="admin-user-unblock"),
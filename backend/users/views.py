@@ -18,15 +18,18 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.shortcuts import render, get_object_or_404
 
+from core.conditional import ConditionalGetMixin, get_versions, make_etag, version_to_datetime
 from core.permissions import IsAdminUser, IsProfileOwnerOrAdmin
 
 from .models import Profile, VerificationToken
-from .serializers import ProfileSerializer, RegisterSerializer, UserSerializer, TrainerVerificationRequestSerializer
+from .search import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, autocomplete_trainers
+from .serializers import DEFAULT_AVATAR_URL, ProfileSerializer, RegisterSerializer, UserSerializer, TrainerVerificationRequestSerializer
 
-from django.db.models import Count
 from datetime import timedelta
+from django.db.models import Exists, OuterRef
 from interactions.models import Follow
 
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
@@ -55,13 +58,23 @@ class UserProfileUpdateView(generics.UpdateAPIView): # <-- Базовый кла
         except Profile.DoesNotExist:
             raise Http404("Профиль для этого пользователя не найден.")
         
-class CurrentUserDetailView(generics.RetrieveAPIView): # Или MeView, как было у коллеги
+class CurrentUserDetailView(ConditionalGetMixin, generics.RetrieveAPIView): # Или MeView, как было у коллеги
     """
     Возвращает полную информацию (User + Profile) для текущего аутентифицированного пользователя.
     """
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_validators(self, request):
+        # Профиль все равно понадобится сериализатору, лишнего запроса нет
+        calculated_at = request.user.profile.levels_last_calculated_at
+        version = get_versions(f"user:{request.user.pk}")[f"user:{request.user.pk}"]
+        etag = make_etag(request.user.pk, request.get_full_path(), version, calculated_at)
+        last_modified = version_to_datetime(version)
+        if calculated_at:
+            last_modified = max(last_modified, calculated_at)
+        return etag, last_modified
+
     def get_object(self):
         return self.request.user
 
@@ -70,23 +83,51 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all().select_related("profile")
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
-    
+
 
     
-class TopTrainersListView(generics.ListAPIView):
+class TopTrainersListView(ConditionalGetMixin, generics.ListAPIView):
     """
     Возвращает список топ-10 тренеров, отсортированных по их level_score.
     """
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_validators(self, request):
+        # "trainers" поднимается при изменении профилей (в т.ч. пересчете уровней) и подписок
+        version = get_versions("trainers")["trainers"]
+        etag = make_etag(request.user.pk, request.get_full_path(), version)
+        return etag, version_to_datetime(version)
+
     def get_queryset(self):
         queryset = User.objects.filter(profile__role=Profile.Role.TRAINER)\
                                .select_related('profile')\
-                               .order_by('-profile__level_score')[:10]
-        return queryset
+                               .order_by('-profile__level_score')
+        return queryset[:10]
     
     
+class TrainerRecommendationsView(generics.ListAPIView):
+    """
+    «Кого читать»: тренеры из ночного расчета (users.recommendations) по
+    убыванию оценки, без тех, на кого пользователь уже подписан. Один
+    запрос по индексу (user, rank).
+    """
+    serializer_class = UserSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None  # Не больше RECOMMENDATIONS_PER_USER
+
+    def get_queryset(self):
+        user = self.request.user
+        already_following = Follow.objects.filter(follower=user, followed=OuterRef('pk'))
+        return (
+            User.objects
+                .filter(recommended_to__user=user, profile__role=Profile.Role.TRAINER)
+                .exclude(Exists(already_following))
+                .select_related('profile')
+                .order_by('recommended_to__rank')
+        )
+
+
 class AllTrainersListView(generics.ListAPIView):
     """
     List all users with role TRAINER, with pagination, search & ordering.
@@ -111,6 +152,30 @@ class AllTrainersListView(generics.ListAPIView):
         )
 
 
+class TrainerAutocompleteView(APIView):
+    """
+    Быстрый поиск тренеров для пикера: `?q=ann&limit=10`.
+    Отдает только id, username, avatar_url и level_score.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get("limit", AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = AUTOCOMPLETE_LIMIT
+        limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+
+        results = autocomplete_trainers(request.query_params.get("q", ""), limit)
+        for item in results:
+            item["avatar_url"] = (
+                request.build_absolute_uri(item["avatar_url"])
+                if item["avatar_url"]
+                else DEFAULT_AVATAR_URL
+            )
+        return Response(results)
+
+
 # --- Admin Actions ---
 class AdminUserBlockView(generics.GenericAPIView):
     permission_classes = [IsAdminUser]